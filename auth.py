@@ -1,12 +1,14 @@
 # /home/ubuntu/flowvault_backend_fastapi/auth.py
 
-from fastapi import Depends, HTTPException, Request, status
+from fastapi import Cookie, Depends, HTTPException, Query, Request, WebSocketException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 from jwt.exceptions import PyJWTError
 import os
+from typing import Optional
 from sqlalchemy.orm import Session
 from models import User, SessionLocal # Assuming User model might still be used for structure
+from db_routing import read_session
 import logging
 
 # Configure logging
@@ -25,6 +27,9 @@ EXAMPLE_KEY_REPLACE_WITH_REAL_ONE_IN_PRODUCTION
 
 # Security scheme for Swagger UI
 security = HTTPBearer()
+CLERK_SESSION_COOKIE = "__session" # Clerk's session token cookie (same-site frontends)
+
+ADMIN_EMAIL_DOMAIN = "@flowvaultadmin.com" # Example admin email domain (see get_admin_user)
 
 def get_db():
     """Get database session."""
@@ -34,10 +39,7 @@ def get_db():
     finally:
         db.close()
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+def user_from_token(token: str, db: Session) -> User:
     """
     Validate JWT token from Clerk and return the corresponding user.
     Creates user in database if they don't exist yet.
@@ -49,9 +51,6 @@ async def get_current_user(
     )
     
     try:
-        # Extract token
-        token = credentials.credentials
-        
         # Verify and decode JWT
         # In production, use the actual Clerk public key
         # You would also set your correct audience and ensure verify_signature is True
@@ -68,6 +67,7 @@ async def get_current_user(
         if user_id is None:
             logger.error("User ID (sub) not found in token payload.")
             raise credentials_exception
+        db.info["user_id"] = user_id # Writes in this request give the user read-your-writes on replicas
         
         # Get user from database or create if not exists
         user = db.query(User).filter(User.id == user_id).first()
@@ -89,6 +89,8 @@ async def get_current_user(
             db.commit()
             db.refresh(user)
             logger.info(f"Created new user: {user_id}")
+        elif user.deleted_at is not None:
+            raise credentials_exception # Deleted account; its data is being purged (purge.py)
         
         return user
         
@@ -99,6 +101,37 @@ async def get_current_user(
         logger.error(f"An unexpected error occurred during user authentication: {e}")
         raise credentials_exception
 
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    return user_from_token(credentials.credentials, db)
+
+async def get_websocket_user(
+    token: Optional[str] = Query(None),
+    session_cookie: Optional[str] = Cookie(None, alias=CLERK_SESSION_COOKIE),
+    db: Session = Depends(get_db)
+) -> User:
+    """The user of a WebSocket connection. Browsers can't set headers on one, so the Clerk
+    token comes in the `token` query parameter or Clerk's session cookie; closes with 1008 otherwise."""
+    if not (token or session_cookie):
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Not authenticated")
+    try:
+        return user_from_token(token or session_cookie, db)
+    except HTTPException:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+
+def get_read_db(current_user: User = Depends(get_current_user)):
+    """Read-only session for the request: a caught-up replica when one is configured, else the primary.
+
+    Endpoints that write must use get_db; flushing changes through this session raises.
+    """
+    db = read_session(current_user.id)
+    try:
+        yield db
+    finally:
+        db.close()
+
 async def get_admin_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -109,7 +142,7 @@ async def get_admin_user(
     # or if they have an 'admin' role set in Clerk custom claims.
     # For now, let's assume an admin email for demo purposes.
     # IMPORTANT: Replace this with actual admin role checking in production.
-    if not current_user.email or not current_user.email.endswith("@flowvaultadmin.com"): # Example admin email domain
+    if not current_user.email or not current_user.email.endswith(ADMIN_EMAIL_DOMAIN):
         logger.warning(f"Admin access denied for user: {current_user.email}")
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,160 @@
+"""
+Celery message and result-backend footprint benchmark.
+
+Compares the previous configuration (JSON messages, every capture result kept in the Redis
+result backend, including the full screenshots list) with the current one (msgpack messages,
+capture results ignored, result_expires set). For each it measures against a local Redis:
+
+  - enqueue throughput: send_task calls per second, with the trace headers the API adds
+  - queue memory: MEMORY USAGE of the queue list per message, and the raw message size
+  - result backend memory per finished task, and whether those keys expire
+
+Messages and results go to a dedicated Redis database that is flushed before each run, so
+only local hosts are accepted.
+
+Usage:
+    python benchmarks/celery_messages.py --redis-url redis://localhost:6379/15
+    python benchmarks/celery_messages.py --messages 20000 --save benchmarks/results/celery_messages.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+from urllib.parse import urlparse
+
+import redis
+from celery import Celery
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from celery_client import GENERATE_SCREENSHOTS_TASK, CELERY_RESULT_EXPIRES_SECONDS # noqa: E402
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "redis"}
+QUEUE = "celery"
+
+CONFIGS = {
+    # Celery defaults as shipped before: JSON, results stored (default expiry: 1 day)
+    "before": {"serializer": "json", "ignore_result": False, "result_expires": 24 * 60 * 60},
+    "after": {"serializer": "msgpack", "ignore_result": True, "result_expires": CELERY_RESULT_EXPIRES_SECONDS},
+}
+
+
+def make_app(redis_url: str, serializer: str, ignore_result: bool, result_expires: int) -> Celery:
+    app = Celery("bench", broker=redis_url, backend=redis_url)
+    app.conf.update(
+        task_serializer=serializer,
+        result_serializer=serializer,
+        accept_content=["msgpack", "json"],
+        task_ignore_result=ignore_result,
+        result_expires=result_expires,
+    )
+    return app
+
+
+def capture_kwargs(i: int) -> dict:
+    return {"target_url": f"https://www.example-{i % 997}.com/pricing?utm_source=newsletter&plan=team", "mcp_job_id": str(uuid.uuid4())}
+
+
+def trace_headers() -> dict:
+    # What tracing.before_task_publish adds to every message
+    return {"traceparent": f"00-{uuid.uuid4().hex}-{uuid.uuid4().hex[:16]}-01", "flowvault_enqueued_at": time.time()}
+
+
+def legacy_result(mcp_job_id: str, screens: int = 6) -> dict:
+    """The return value capture tasks used to store: status plus the whole screenshots list."""
+    target_url = "https://www.example.com/pricing"
+    return {
+        "status": "completed", "mcp_job_id": mcp_job_id, "swipe_file_id": f"sf_{mcp_job_id[:8]}",
+        "screenshots": [
+            {"order_index": i, "image_url": f"https://your-s3-bucket-for-flowvault.s3.us-east-1.amazonaws.com/mcp_jobs/{mcp_job_id}/screen_{i + 1}.png",
+             "alt_text": f"Screenshot {i + 1} for {target_url}"}
+            for i in range(screens)
+        ],
+        "message": f"Screenshots for {target_url} generated.",
+    }
+
+
+def used_memory(client: redis.Redis) -> int:
+    return client.info("memory")["used_memory"]
+
+
+def run(name: str, config: dict, redis_url: str, messages: int) -> dict:
+    client = redis.Redis.from_url(redis_url)
+    client.flushdb()
+    app = make_app(redis_url, **config)
+    baseline_memory = used_memory(client)
+
+    # Enqueue throughput (includes serialization and the broker round trip)
+    task_ids = []
+    started = time.perf_counter()
+    for i in range(messages):
+        result = app.send_task(GENERATE_SCREENSHOTS_TASK, kwargs=capture_kwargs(i), headers=trace_headers())
+        task_ids.append(result.id)
+    enqueue_seconds = time.perf_counter() - started
+
+    queue_bytes = client.memory_usage(QUEUE, samples=0) or 0
+    sample_message = client.lindex(QUEUE, 0) or b""
+    queued_memory = used_memory(client)
+
+    # Result backend: what finished capture tasks leave behind
+    if not config["ignore_result"]:
+        for task_id in task_ids:
+            app.backend.store_result(task_id, legacy_result(task_id), "SUCCESS")
+    result_keys = list(client.scan_iter(match="celery-task-meta-*", count=1000))
+    result_bytes = sum(client.memory_usage(key, samples=0) or 0 for key in result_keys)
+    result_ttl = client.ttl(result_keys[0]) if result_keys else None
+    final_memory = used_memory(client)
+
+    client.flushdb()
+    app.close()
+    return {
+        "config": name,
+        "serializer": config["serializer"],
+        "messages": messages,
+        "enqueue_per_second": round(messages / enqueue_seconds, 1),
+        "message_bytes": len(sample_message),
+        "queue_bytes_per_message": round(queue_bytes / messages, 1),
+        "result_keys": len(result_keys),
+        "result_bytes_per_task": round(result_bytes / messages, 1),
+        "result_ttl_seconds": result_ttl,
+        "used_memory_delta_bytes": final_memory - baseline_memory,
+        "queue_used_memory_delta_bytes": queued_memory - baseline_memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default=os.environ.get("BENCH_REDIS_URL", "redis://localhost:6379/15"))
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--save", help="Write results as JSON")
+    args = parser.parse_args()
+
+    if urlparse(args.redis_url).hostname not in LOCAL_HOSTS:
+        raise SystemExit(f"Refusing to flush a non-local Redis: {args.redis_url}")
+
+    results = [run(name, config, args.redis_url, args.messages) for name, config in CONFIGS.items()]
+
+    columns = [
+        ("enqueue/s", "enqueue_per_second"), ("msg bytes", "message_bytes"), ("queue B/msg", "queue_bytes_per_message"),
+        ("result B/task", "result_bytes_per_task"), ("result TTL", "result_ttl_seconds"), ("Redis delta", "used_memory_delta_bytes"),
+    ]
+    print(f"{args.messages} capture messages per configuration\n")
+    print(f"{'config':8} {'serializer':10} " + " ".join(f"{label:>14}" for label, _ in columns))
+    for result in results:
+        print(f"{result['config']:8} {result['serializer']:10} " + " ".join(f"{str(result[key]):>14}" for _, key in columns))
+
+    before, after = results
+    if before["used_memory_delta_bytes"]:
+        print(f"\nRedis memory: {after['used_memory_delta_bytes'] / before['used_memory_delta_bytes']:.1%} of before; "
+              f"enqueue throughput: {after['enqueue_per_second'] / before['enqueue_per_second']:.2f}x")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({"messages": args.messages, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
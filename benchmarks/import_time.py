@@ -0,0 +1,101 @@
+"""
+API cold-start import benchmark (python -X importtime).
+
+Imports the API entrypoint (main) in a fresh interpreter, reports total and top cumulative
+import times, and fails (exit code 1) when:
+  - a module that must stay out of web processes is imported (Playwright, task code, boto3), or
+  - the total import time exceeds --budget-ms, or
+  - with --baseline, the total regresses by more than --tolerance versus a saved run.
+
+Runs best-of-N to smooth out disk cache noise. No services need to be running: importing
+main does not connect to Postgres or Redis.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --save benchmarks/results/import_time.json
+    python benchmarks/import_time.py --baseline benchmarks/results/import_time.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Top-level packages the API process must never import at startup
+FORBIDDEN_MODULES = ("playwright", "tasks", "boto3", "botocore", "PIL")
+
+
+def run_importtime(module: str) -> dict:
+    """Returns {module_name: (self_us, cumulative_us)} for one cold interpreter."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit(f"Importing {module} failed")
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_TIME_BUDGET_MS", "1500")))
+    parser.add_argument("--baseline", help="JSON from a previous --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed regression vs. baseline (fraction)")
+    parser.add_argument("--save", help="Write this run's results as JSON")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [run_importtime(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda timings: timings[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    print(f"import {args.module}: {total_ms:.1f} ms (best of {args.runs}), {len(best)} modules")
+    print(f"\nTop {args.top} by cumulative time:")
+    top_level = sorted(
+        ((name, cumulative) for name, (_, cumulative) in best.items() if "." not in name and name != args.module),
+        key=lambda item: item[1], reverse=True,
+    )
+    for name, cumulative in top_level[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failures = []
+    leaked = sorted({name.split(".")[0] for name in best} & set(FORBIDDEN_MODULES))
+    if leaked:
+        failures.append(f"forbidden modules imported by {args.module}: {', '.join(leaked)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"import time {total_ms:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline_ms = json.load(f)["total_ms"]
+        change = (total_ms - baseline_ms) / baseline_ms
+        print(f"\nBaseline: {baseline_ms:.1f} ms ({change:+.1%})")
+        if change > args.tolerance:
+            failures.append(f"import time regressed {change:+.1%} vs. baseline (tolerance {args.tolerance:.0%})")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({"module": args.module, "total_ms": total_ms, "modules": len(best),
+                       "top": [{"module": name, "cumulative_ms": cumulative / 1000} for name, cumulative in top_level[:args.top]]}, f, indent=2)
+
+    if failures:
+        print("\nFAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Micro-benchmark: default FastAPI list serialization vs. the fast_json path.
+
+Default path (what FastAPI does for `response_model=List[Model]` + JSONResponse):
+    validate every item through pydantic -> dump to JSON-compatible Python -> json.dumps
+Fast path (fast_json.fast_list_response):
+    project each item onto the model's fields -> orjson.dumps
+
+Both paths are run over the same synthetic items (dicts shaped like the admin user listing,
+and tuples/Rows shaped like an ORM query result) and their outputs are checked to decode to
+the same JSON.
+
+Usage:
+    python benchmarks/json_serialization.py --items 10000 --repeat 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from collections import namedtuple
+from typing import List, Optional
+
+from pydantic import BaseModel, TypeAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_json import FastJSONResponse, project # noqa: E402
+
+
+class AdminUserResponse(BaseModel): # Same shape as routers/admin_router.AdminUserResponse
+    id: str
+    email: str
+    name: Optional[str] = None
+    role: str
+    createdAt: str
+    swipeFilesCount: int
+    is_active: bool
+
+
+class _RowLike(namedtuple("_RowLike", list(AdminUserResponse.model_fields))):
+    """Stands in for a SQLAlchemy Row (exposes _mapping like the real thing)."""
+
+    @property
+    def _mapping(self):
+        return self._asdict()
+
+
+def make_items(n: int) -> list:
+    return [
+        {"id": f"u{i}", "email": f"user{i}@example.com", "name": f"User {i}", "role": "user" if i % 10 else "admin",
+         "createdAt": "2024-02-15T11:00:00Z", "swipeFilesCount": i % 97, "is_active": bool(i % 7)}
+        for i in range(n)
+    ]
+
+
+def default_path(items, adapter) -> bytes:
+    validated = adapter.validate_python(items)
+    return json.dumps(adapter.dump_python(validated, mode="json"), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(items) -> bytes:
+    return FastJSONResponse(content=project(items, AdminUserResponse)).body
+
+
+def bench(fn, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(List[AdminUserResponse])
+    dict_items = make_items(args.items)
+    row_items = [_RowLike(**item) for item in dict_items]
+
+    assert json.loads(default_path(dict_items, adapter)) == json.loads(fast_path(dict_items)) == json.loads(fast_path(row_items))
+
+    cases = {
+        "default (pydantic + json), dicts": lambda: default_path(dict_items, adapter),
+        "fast (project + orjson), dicts": lambda: fast_path(dict_items),
+        "fast (project + orjson), rows": lambda: fast_path(row_items),
+    }
+    results = {name: bench(fn, args.repeat) for name, fn in cases.items()}
+
+    baseline = statistics.median(results["default (pydantic + json), dicts"])
+    print(f"{args.items} items, {args.repeat} runs each\n")
+    print(f"{'path':40} {'p50':>9} {'min':>9} {'speedup':>8}")
+    for name, timings in results.items():
+        p50 = statistics.median(timings)
+        print(f"{name:40} {p50:7.2f}ms {min(timings):7.2f}ms {baseline / p50:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
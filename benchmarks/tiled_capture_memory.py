@@ -0,0 +1,184 @@
+"""
+Full-page capture memory benchmark: one full_page screenshot vs tiled capture.
+
+Serves synthetic tall pages (gradient bands, text, images and a fixed header) from a local
+HTTP server and captures each one twice with Chromium:
+
+  - single: page.screenshot(full_page=True), as every capture used to be taken
+  - tiled:  page_capture.capture_full_page with tiling forced on (threshold 0)
+
+A background thread samples the resident memory of this process plus its Chromium children
+from /proc, so the peak covers both the browser's rasterization and the Python side holding
+the PNG bytes. Uploads go to a temporary directory (the tiled path writes and drops one tile
+at a time, like the worker does with S3).
+
+Linux only (reads /proc). Needs Playwright's Chromium: `playwright install chromium`.
+
+Usage:
+    python benchmarks/tiled_capture_memory.py
+    python benchmarks/tiled_capture_memory.py --heights 5000 20000 40000 --save benchmarks/results/tiled_capture.json
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from playwright.sync_api import sync_playwright
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_capture import capture_full_page, CAPTURE_TILE_HEIGHT_PX # noqa: E402
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def synthetic_page(height: int) -> bytes:
+    sections = []
+    for n, y in enumerate(range(0, height, 1000)):
+        band = min(1000, height - y)
+        hue = (n * 37) % 360
+        sections.append(
+            f'<section style="height:{band}px;background:linear-gradient(hsl({hue},70%,85%),hsl({(hue + 60) % 360},70%,60%))">'
+            f'<h2>Section {n + 1}</h2><p>{"Pricing, testimonials and feature grids. " * 40}</p>'
+            f'<svg width="600" height="300"><circle cx="{150 + n * 13 % 300}" cy="150" r="120" fill="hsl({hue},60%,40%)"/></svg>'
+            f'</section>'
+        )
+    return (
+        '<!doctype html><html><head><style>body{margin:0;font:16px sans-serif}section{padding:24px;box-sizing:border-box;overflow:hidden}'
+        'header{position:fixed;top:0;left:0;right:0;height:64px;background:#111;color:#fff;z-index:9}</style></head>'
+        f'<body><header>Fixed header</header>{"".join(sections)}</body></html>'
+    ).encode()
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        height = int(parse_qs(urlparse(self.path).query).get("height", ["5000"])[0])
+        body = synthetic_page(height)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def tree_rss_bytes(root_pid: int) -> int:
+    """Resident memory of a process and all of its descendants."""
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except OSError:
+            continue # Exited between listing and reading
+        stack.extend(_children(pid))
+    return total
+
+
+class PeakSampler:
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, tree_rss_bytes(os.getpid()))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.baseline = tree_rss_bytes(os.getpid())
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def measure(browser, url: str, mode: str, tile_height: int, workdir: str) -> dict:
+    uploaded = []
+
+    def upload(key, data, content_type):
+        path = os.path.join(workdir, key.replace("/", "_"))
+        with open(path, "wb") as f:
+            f.write(data)
+        uploaded.append(len(data))
+        return path
+
+    # A fresh context per run so earlier captures don't inflate the renderer's baseline
+    context = browser.new_context(viewport={"width": 1440, "height": 900})
+    page = context.new_page()
+    page.goto(url, wait_until="networkidle")
+    try:
+        with PeakSampler() as sampler:
+            started = time.perf_counter()
+            if mode == "single":
+                upload("single.png", page.screenshot(full_page=True), "image/png")
+            else:
+                capture_full_page(page, "tiled.png", upload, threshold=0, tile_height=tile_height)
+            seconds = time.perf_counter() - started
+    finally:
+        context.close()
+    return {
+        "mode": mode,
+        "seconds": round(seconds, 3),
+        "peak_rss_mb": round(sampler.peak / 2**20, 1),
+        "peak_over_baseline_mb": round((sampler.peak - sampler.baseline) / 2**20, 1),
+        "objects": len(uploaded),
+        "bytes": sum(uploaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--heights", type=int, nargs="+", default=[5000, 20000, 40000], help="Page heights in CSS px")
+    parser.add_argument("--tile-height", type=int, default=CAPTURE_TILE_HEIGHT_PX)
+    parser.add_argument("--save", help="Write results as JSON")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, sync_playwright() as p:
+        browser = p.chromium.launch(args=["--no-sandbox", "--disable-dev-shm-usage"])
+        try:
+            for height in args.heights:
+                for mode in ("single", "tiled"):
+                    result = measure(browser, f"{base_url}?height={height}", mode, args.tile_height, workdir)
+                    result["height"] = height
+                    results.append(result)
+                    print(f"{height:>7}px {mode:7} {result['seconds']:>7.2f}s  peak {result['peak_rss_mb']:>8.1f} MB "
+                          f"(+{result['peak_over_baseline_mb']:.1f})  {result['objects']:>3} objects  {result['bytes'] / 2**20:.1f} MB")
+        finally:
+            browser.close()
+            server.shutdown()
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({"tile_height": args.tile_height, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
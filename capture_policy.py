@@ -0,0 +1,230 @@
+"""
+Failure handling policy for capture tasks.
+
+- An error taxonomy deciding whether a capture failure is worth retrying.
+- Exponential backoff with jitter for retryable failures.
+- A per-domain circuit breaker (state in Redis, shared by all workers) that short-circuits
+  jobs to hosts that keep failing, so one dead site can't soak up worker capacity.
+
+Playwright exceptions are classified by name and message so this module can be imported
+without loading Playwright.
+"""
+import os
+import time
+import random
+import logging
+from typing import NamedTuple
+from urllib.parse import urlparse
+import redis
+
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RETRY_BACKOFF_BASE_SECONDS = float(os.environ.get("RETRY_BACKOFF_BASE_SECONDS", "10"))
+RETRY_BACKOFF_MAX_SECONDS = float(os.environ.get("RETRY_BACKOFF_MAX_SECONDS", "300"))
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))  # host failures within the window
+CIRCUIT_FAILURE_WINDOW_SECONDS = int(os.environ.get("CIRCUIT_FAILURE_WINDOW_SECONDS", "600"))
+CIRCUIT_COOLDOWN_SECONDS = int(os.environ.get("CIRCUIT_COOLDOWN_SECONDS", "900"))
+CIRCUIT_PROBE_TIMEOUT_SECONDS = int(os.environ.get("CIRCUIT_PROBE_TIMEOUT_SECONDS", "900")) # A probe silent for longer is presumed dead
+# An open circuit only closes on its probe's success; the state is forgotten only for hosts nobody captured for this long
+CIRCUIT_STATE_TTL_SECONDS = max(int(os.environ.get("CIRCUIT_STATE_TTL_SECONDS", str(7 * 24 * 60 * 60))),
+                                CIRCUIT_COOLDOWN_SECONDS + CIRCUIT_PROBE_TIMEOUT_SECONDS)
+CIRCUIT_KEY_PREFIX = "flowvault:circuit:" # hash: opened_until
+CIRCUIT_FAILURES_KEY_PREFIX = "flowvault:circuit_failures:" # sorted set of failure times
+CIRCUIT_PROBE_KEY_PREFIX = "flowvault:circuit_probe:" # holder of the half-open probe
+
+# Chromium network errors that mean the target will not become reachable by retrying soon
+PERMANENT_NET_ERRORS = {
+    "ERR_NAME_NOT_RESOLVED": "dns",
+    "ERR_NAME_RESOLUTION_FAILED": "dns",
+    "ERR_ADDRESS_UNREACHABLE": "unreachable",
+    "ERR_CERT_": "tls",
+    "ERR_SSL_PROTOCOL_ERROR": "tls",
+    "ERR_INVALID_URL": "invalid_url",
+    "ERR_UNSAFE_PORT": "invalid_url",
+    "ERR_TOO_MANY_REDIRECTS": "redirect_loop",
+}
+RETRYABLE_NET_ERRORS = {
+    "ERR_CONNECTION_RESET": "connection",
+    "ERR_CONNECTION_REFUSED": "connection",
+    "ERR_CONNECTION_CLOSED": "connection",
+    "ERR_CONNECTION_TIMED_OUT": "timeout",
+    "ERR_TIMED_OUT": "timeout",
+    "ERR_NETWORK_CHANGED": "connection",
+    "ERR_EMPTY_RESPONSE": "connection",
+}
+BOT_PROTECTION_TITLE_MARKERS = ("just a moment", "attention required", "access denied", "are you a robot", "verify you are human")
+
+
+class CaptureError(Exception):
+    """Base class for capture failures raised by the task itself (as opposed to library errors)."""
+
+
+class HttpStatusError(CaptureError):
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+
+class BotProtectionError(CaptureError):
+    """The target served a bot challenge/block page instead of content."""
+
+
+class CircuitOpenError(CaptureError):
+    """The target host's circuit breaker is open; the job was not attempted."""
+
+
+class HostBusyError(CaptureError):
+    """The target host stayed at its concurrency limit for longer than the deferral budget."""
+
+
+class Classification(NamedTuple):
+    retryable: bool
+    reason: str
+    host_fault: bool # Counts toward the target host's circuit breaker
+
+
+def classify_capture_error(exc: Exception) -> Classification:
+    if isinstance(exc, CircuitOpenError):
+        return Classification(False, "circuit_open", False)
+    if isinstance(exc, HostBusyError):
+        return Classification(True, "host_busy", False)
+    if isinstance(exc, BotProtectionError):
+        return Classification(False, "bot_protection", True)
+    if isinstance(exc, HttpStatusError):
+        if exc.status in (408, 425, 429) or exc.status >= 500:
+            return Classification(True, f"http_{exc.status}", True)
+        return Classification(False, f"http_{exc.status}", False) # The URL is wrong, not the host
+
+    module = type(exc).__module__ or ""
+    if module.startswith("playwright"):
+        message = str(exc)
+        if type(exc).__name__ == "TimeoutError":
+            return Classification(True, "timeout", True)
+        for marker, reason in PERMANENT_NET_ERRORS.items():
+            if marker in message:
+                return Classification(False, reason, True)
+        for marker, reason in RETRYABLE_NET_ERRORS.items():
+            if marker in message:
+                return Classification(True, reason, True)
+        if "Target page, context or browser has been closed" in message or "Browser closed" in message:
+            return Classification(True, "browser_crash", False)
+        return Classification(True, "browser_error", False)
+
+    if module.startswith(("sqlalchemy", "botocore", "boto3", "redis")):
+        return Classification(True, "infrastructure", False) # Our side; never the target's fault
+    if isinstance(exc, ValueError):
+        return Classification(False, "invalid_job", False)
+    return Classification(True, "unknown", False)
+
+
+def check_navigation(response, page, url: str):
+    """Raise a classified error when navigation 'succeeded' but did not yield real content."""
+    if response is None:
+        return # Same-document navigation (e.g., hash change)
+    status = response.status
+    headers = response.headers
+    if headers.get("cf-mitigated") == "challenge":
+        raise BotProtectionError(f"Bot challenge served for {url}")
+    if status in (403, 503):
+        title = (page.title() or "").lower()
+        if any(marker in title for marker in BOT_PROTECTION_TITLE_MARKERS):
+            raise BotProtectionError(f"Bot protection page ({status}, '{title}') for {url}")
+    if status >= 400:
+        raise HttpStatusError(status, url)
+
+
+def backoff_delay(retries: int) -> float:
+    """Exponential backoff with equal jitter: half fixed, half random, capped."""
+    delay = min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_BASE_SECONDS * (2 ** retries))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def target_host(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+class DomainCircuitBreaker:
+    """Redis-backed circuit breaker keyed by target host.
+
+    closed    -> failure times are kept in a sorted set trimmed to the last CIRCUIT_FAILURE_WINDOW_SECONDS
+    open      -> after CIRCUIT_FAILURE_THRESHOLD host failures; jobs short-circuit until the cooldown ends
+    half-open -> after the cooldown a single job (the probe holder) is let through; its success
+                 closes the circuit, any host failure re-opens it for another cooldown. A probe that
+                 reports nothing within CIRCUIT_PROBE_TIMEOUT_SECONDS is replaced by the next job.
+    Callers pass a holder that is stable across a job's deferrals and retries (e.g. the job id):
+    successes from other jobs, such as ones started before the circuit opened, don't close it.
+    Redis errors fail open (allow the capture) so a Redis blip never blocks all captures.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_redis()
+
+    def allow(self, host: str, holder: str) -> bool:
+        key = f"{CIRCUIT_KEY_PREFIX}{host}"
+        probe_key = f"{CIRCUIT_PROBE_KEY_PREFIX}{host}"
+        try:
+            opened_until = self.client.hget(key, "opened_until")
+            if opened_until is None:
+                return True
+            if time.time() < float(opened_until):
+                return False
+            # Half-open: exactly one probe at a time, which may come back after a deferral
+            probe = self.client.get(probe_key)
+            if probe is not None:
+                return probe.decode() == holder
+            if not self.client.set(probe_key, holder, nx=True, ex=CIRCUIT_PROBE_TIMEOUT_SECONDS):
+                return False
+            self.client.expire(key, CIRCUIT_STATE_TTL_SECONDS) # Outlives the probe
+            return True
+        except redis.RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {host}, allowing capture: {e}")
+            return True
+
+    def record_failure(self, host: str):
+        key = f"{CIRCUIT_KEY_PREFIX}{host}"
+        failures_key = f"{CIRCUIT_FAILURES_KEY_PREFIX}{host}"
+        now = time.time()
+        try:
+            pipe = self.client.pipeline()
+            pipe.zremrangebyscore(failures_key, "-inf", now - CIRCUIT_FAILURE_WINDOW_SECONDS)
+            pipe.zadd(failures_key, {f"{now}:{random.getrandbits(32)}": now}) # Unique member per failure
+            pipe.zcard(failures_key)
+            pipe.expire(failures_key, CIRCUIT_FAILURE_WINDOW_SECONDS)
+            pipe.hget(key, "opened_until")
+            _, _, failures, _, opened_until = pipe.execute()
+            half_open = opened_until is not None and now >= float(opened_until)
+            if failures >= CIRCUIT_FAILURE_THRESHOLD or half_open:
+                pipe = self.client.pipeline()
+                pipe.hset(key, "opened_until", now + CIRCUIT_COOLDOWN_SECONDS)
+                pipe.expire(key, CIRCUIT_STATE_TTL_SECONDS)
+                pipe.delete(failures_key, f"{CIRCUIT_PROBE_KEY_PREFIX}{host}") # A new window starts after the cooldown
+                pipe.execute()
+                logger.warning(f"Circuit opened for {host} after {failures} failures (cooldown {CIRCUIT_COOLDOWN_SECONDS}s).")
+        except redis.RedisError as e:
+            logger.warning(f"Could not record failure for {host}: {e}")
+
+    def record_success(self, host: str, holder: str):
+        key = f"{CIRCUIT_KEY_PREFIX}{host}"
+        failures_key = f"{CIRCUIT_FAILURES_KEY_PREFIX}{host}"
+        probe_key = f"{CIRCUIT_PROBE_KEY_PREFIX}{host}"
+        try:
+            if self.client.hget(key, "opened_until") is None:
+                self.client.delete(failures_key) # Closed: the host is answering again
+                return
+            probe = self.client.get(probe_key)
+            if probe is None or probe.decode() != holder:
+                return # Not the probe: a job that started before the circuit opened
+            self.client.delete(key, failures_key, probe_key)
+            logger.info(f"Circuit closed for {host}: the probe succeeded.")
+        except redis.RedisError as e:
+            logger.warning(f"Could not reset circuit for {host}: {e}")
+
+
+circuit_breaker = DomainCircuitBreaker()
@@ -0,0 +1,101 @@
+"""
+Celery app configuration and task-dispatch client shared by the API and the workers.
+
+The API only needs to put messages on the broker, so it imports this module instead of
+tasks.py: dispatch is by task name (send_task), and no task code, Playwright or storage
+clients are imported into web processes. tasks.py registers the task implementations on
+this same app under the names defined here.
+"""
+import os
+from celery import Celery
+from kombu import Queue
+
+# Celery Configuration
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+CELERY_TASK_SERIALIZER = os.environ.get("CELERY_TASK_SERIALIZER", "msgpack")
+CELERY_RESULT_EXPIRES_SECONDS = int(os.environ.get("CELERY_RESULT_EXPIRES_SECONDS", "3600"))
+RECAPTURE_SCHEDULER_TICK_SECONDS = int(os.environ.get("RECAPTURE_SCHEDULER_TICK_SECONDS", "60"))
+
+celery_app = Celery(
+    "tasks",
+    broker=CELERY_BROKER_URL,
+    backend=CELERY_RESULT_BACKEND,
+    # Add task_acks_late = True for more robust error handling if needed
+    # task_reject_on_worker_lost = True
+)
+
+celery_app.conf.update(
+    # msgpack: smaller payloads and faster (de)serialization than JSON for task messages.
+    # JSON stays accepted so messages enqueued before a deploy are still consumed.
+    task_serializer=CELERY_TASK_SERIALIZER,
+    result_serializer=CELERY_TASK_SERIALIZER,
+    accept_content=["msgpack", "json"],
+    # Job state lives in McpJob (and the job event snapshot), not in task results: capture and
+    # export tasks ignore their results, and anything else stored expires instead of piling up.
+    task_ignore_result=True,
+    result_expires=CELERY_RESULT_EXPIRES_SECONDS,
+    timezone='UTC',
+    enable_utc=True,
+    # task_track_started=True, # To get more detailed task status
+)
+
+# Task names: the contract between send_* helpers below and the implementations in tasks.py
+GENERATE_SCREENSHOTS_TASK = "generate_screenshots_task"
+EXPORT_COLLECTION_TASK = "export_collection_task"
+STITCH_SCREEN_TASK = "stitch_screen_task"
+RECAPTURE_SWIPE_FILE_TASK = "recapture_swipe_file_task"
+SCHEDULE_RECAPTURES_TASK = "schedule_recaptures_task"
+PURGE_DELETED_TASK = "purge_deleted_task"
+
+# Slow background housekeeping (purges of deleted data) goes to its own queue so it never sits
+# in front of captures; workers consume CELERY_WORKER_QUEUES (see entrypoint.sh). Every queue
+# is declared in task_queues, which the readiness probe reads to report queue depths.
+DEFAULT_QUEUE = "celery"
+MAINTENANCE_QUEUE = "maintenance"
+celery_app.conf.task_default_queue = DEFAULT_QUEUE
+celery_app.conf.task_queues = (Queue(DEFAULT_QUEUE), Queue(MAINTENANCE_QUEUE))
+celery_app.conf.task_routes = {
+    PURGE_DELETED_TASK: {"queue": MAINTENANCE_QUEUE},
+}
+
+# Celery beat (`celery -A tasks.celery_app beat`, one instance) drives monitoring: each tick
+# dispatches the tracked swipe files due before the next one (see monitoring.py)
+celery_app.conf.beat_schedule = {
+    "schedule-recaptures": {"task": SCHEDULE_RECAPTURES_TASK, "schedule": RECAPTURE_SCHEDULER_TICK_SECONDS},
+}
+
+# Redis key prefix under which workers advertise browser capacity (read by the readiness probe)
+BROWSER_POOL_KEY_PREFIX = "flowvault:browser_pool:"
+
+
+def send_generate_screenshots(target_url: str, mcp_job_id: str, viewports: list = None, **options):
+    """Enqueue generate_screenshots_task(target_url, mcp_job_id) without importing tasks.py."""
+    kwargs = {"target_url": target_url, "mcp_job_id": mcp_job_id}
+    if viewports:
+        kwargs["viewports"] = viewports
+    return celery_app.send_task(GENERATE_SCREENSHOTS_TASK, kwargs=kwargs, **options)
+
+
+def send_stitch_screen(screen_id: str, **options):
+    """Enqueue stitch_screen_task: joins a tiled capture's tiles into one PNG, off the capture path."""
+    return celery_app.send_task(STITCH_SCREEN_TASK, kwargs={"screen_id": screen_id}, **options)
+
+
+def send_recapture_swipe_file(swipe_file_id: str, **options):
+    """Enqueue recapture_swipe_file_task for a tracked swipe file (countdown= places it in its slot)."""
+    return celery_app.send_task(RECAPTURE_SWIPE_FILE_TASK, kwargs={"swipe_file_id": swipe_file_id}, **options)
+
+
+def send_purge_deleted(purge_job_id: str, **options):
+    """Enqueue purge_deleted_task: removes a soft-deleted user, team or collection in batches (purge.py)."""
+    return celery_app.send_task(PURGE_DELETED_TASK, kwargs={"purge_job_id": purge_job_id}, **options)
+
+
+def send_export_collection(export_id: str, collection_id: str, export_format: str, swipe_file_id: str = None, **options):
+    """Enqueue export_collection_task (large ZIP/PDF exports written to object storage)."""
+    return celery_app.send_task(
+        EXPORT_COLLECTION_TASK,
+        kwargs={"export_id": export_id, "collection_id": collection_id, "export_format": export_format, "swipe_file_id": swipe_file_id},
+        **options,
+    )
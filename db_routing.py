@@ -0,0 +1,253 @@
+"""
+Database engines and read-replica routing.
+
+Writes, and anything that must see the latest data, use the primary (`models.SessionLocal`,
+`auth.get_db`). Read-only scopes (`read_session`, `auth.get_read_db`) go to one of the replicas
+in DATABASE_REPLICA_URLS, round robin, when it is healthy and caught up enough:
+
+  - A daemon thread per process checks each replica's replay lag every
+    REPLICA_HEALTH_CHECK_SECONDS; requests only read its last result. A replica is skipped while
+    the lag exceeds REPLICA_MAX_LAG_SECONDS, while it is unreachable, and when its last check is
+    too old to trust (the thread is stuck or dead).
+  - Read-your-writes: when a session that wrote on behalf of a user commits, the primary's WAL
+    position (read on the committing connection) is stored in Redis for READ_YOUR_WRITES_SECONDS.
+    That user's reads only go to a replica that had replayed past it at its last check; otherwise
+    (or if Redis can't tell) they use the primary. Reads never wait on a check in progress.
+
+Everything here also works behind PgBouncer / Supavisor in transaction pooling mode, where a
+server connection is only ours for one transaction (point DATABASE_URL at the pooler to run
+many more API workers than Postgres has connection slots). So nothing relies on session state:
+no server-side prepared statements (psycopg2 never prepares; psycopg 3 is told not to), no
+startup `options` (the statement timeout is applied with SET LOCAL in each transaction), and no
+session-level SET/LISTEN/advisory locks anywhere in the app. Server-side cursors (yield_per)
+are fine: they live inside their transaction.
+"""
+import os
+import time
+import logging
+import threading
+from itertools import count
+from typing import Optional
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+if not DATABASE_URL:
+    raise RuntimeError("DATABASE_URL is not set")
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "0")) # 0 = server default
+
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_HEALTH_CHECK_SECONDS = float(os.environ.get("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+REPLICA_CONNECT_TIMEOUT_SECONDS = int(os.environ.get("REPLICA_CONNECT_TIMEOUT_SECONDS", "3"))
+REPLICA_CHECK_STALE_SECONDS = 3 * REPLICA_HEALTH_CHECK_SECONDS # Older results take the replica out of rotation
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("READ_YOUR_WRITES_SECONDS", "30")) # Longer than replicas are allowed to lag
+WRITE_LSN_KEY_PREFIX = "flowvault:db:write_lsn:"
+
+# Lag is 0 while everything received has been replayed, so an idle primary doesn't look like lag
+REPLICA_STATUS_SQL = text("""
+SELECT pg_is_in_recovery() AS in_recovery,
+       pg_last_wal_replay_lsn()::text AS replay_lsn,
+       CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) END AS lag_seconds
+""")
+
+
+def make_engine(url: str, pool_name: str, connect_timeout: Optional[int] = None, **pool_args):
+    """An engine set up for transaction pooling; pool_args override the pool settings."""
+    connect_args = {}
+    if url.startswith("postgresql+psycopg:"):
+        connect_args["prepare_threshold"] = None # psycopg 3: never prepare server-side (breaks under transaction pooling)
+    if connect_timeout:
+        connect_args["connect_timeout"] = connect_timeout # Whole seconds; libpq treats anything below 2 as 2
+    pool_settings = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": True, # Poolers and failovers close idle server connections
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        **pool_args,
+    }
+    return create_engine(url, pool_logging_name=pool_name, connect_args=connect_args, **pool_settings)
+
+
+def parse_lsn(lsn: Optional[str]) -> int:
+    """'16/B374D848' -> integer WAL position."""
+    if not lsn:
+        return 0
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+primary_engine = make_engine(DATABASE_URL, "primary")
+
+
+def apply_transaction_settings(session_factory: sessionmaker):
+    """Per-transaction settings (SET LOCAL), the only kind that survives transaction pooling."""
+    if DB_STATEMENT_TIMEOUT_MS:
+        @event.listens_for(session_factory, "after_begin")
+        def _set_statement_timeout(session, transaction, connection):
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+
+# --- Read-your-writes --- #
+
+def record_user_write(user_id: str, connection):
+    """Remember the primary's WAL position after a commit made for this user, read on the connection that committed."""
+    if not _replicas:
+        return
+    try:
+        lsn = connection.exec_driver_sql("SELECT pg_current_wal_lsn()::text").scalar()
+        get_redis().set(f"{WRITE_LSN_KEY_PREFIX}{user_id}", lsn, ex=READ_YOUR_WRITES_SECONDS)
+    except Exception as e: # Worst case the user briefly reads their own stale data
+        logger.warning(f"Could not record write position for user {user_id}: {e}")
+
+
+def track_user_writes(session_factory: sessionmaker):
+    """Sessions with info["user_id"] set record that user's write position when they commit writes."""
+    @event.listens_for(session_factory, "after_flush")
+    def _mark_written(session, flush_context):
+        if _replicas and session.info.get("user_id"):
+            session.info["write_connection"] = session.connection() # Still checked out in after_commit
+
+    @event.listens_for(session_factory, "after_commit")
+    def _record_write(session):
+        connection = session.info.pop("write_connection", None)
+        if connection is not None and session.info.get("user_id"):
+            record_user_write(session.info["user_id"], connection)
+
+    @event.listens_for(session_factory, "after_rollback")
+    def _forget_write(session):
+        session.info.pop("write_connection", None)
+
+
+def _required_lsn(user_id: Optional[str]) -> Optional[int]:
+    """WAL position a replica must have replayed for this user; None if unknown (use the primary)."""
+    if user_id is None:
+        return 0
+    try:
+        lsn = get_redis().get(f"{WRITE_LSN_KEY_PREFIX}{user_id}")
+    except Exception as e:
+        logger.warning(f"Could not read write position for user {user_id}, reading from the primary: {e}")
+        return None
+    return parse_lsn(lsn.decode()) if lsn else 0
+
+
+# --- Replicas --- #
+
+class Replica:
+    def __init__(self, url: str, index: int):
+        # An unreachable replica fails its check (and any read) quickly instead of after TCP's timeout
+        self.engine = make_engine(url, f"replica{index}", connect_timeout=REPLICA_CONNECT_TIMEOUT_SECONDS)
+        self.name = f"replica{index}"
+        self.healthy = False
+        self.replay_lsn = 0
+        self.lag_seconds = None
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Re-checks the replica (the monitor thread, or the readiness probe)."""
+        with self._lock:
+            self._check()
+
+    def _check(self):
+        try:
+            with self.engine.connect() as conn:
+                # A replica that accepts connections but doesn't answer mustn't stall the other checks
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {REPLICA_CONNECT_TIMEOUT_SECONDS * 1000}")
+                row = conn.execute(REPLICA_STATUS_SQL).one()
+            # Not in recovery: pointed at a primary, so it is never behind
+            self.replay_lsn = parse_lsn(row.replay_lsn) if row.in_recovery else float("inf")
+            self.lag_seconds = float(row.lag_seconds or 0)
+            healthy = self.lag_seconds <= REPLICA_MAX_LAG_SECONDS
+            if healthy != self.healthy:
+                logger.info(f"{self.name} is {'back in rotation' if healthy else 'out of rotation'} (lag {self.lag_seconds:.1f}s).")
+            self.healthy = healthy
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"{self.name} is out of rotation: {e}")
+            self.healthy = False
+        finally:
+            self.checked_at = time.monotonic()
+
+    def usable(self, required_lsn: int) -> bool:
+        # No I/O: the last check's result (never checked, or not recently: the primary). A replica
+        # behind the user's write as of that check serves them again after the next one.
+        if time.monotonic() - self.checked_at > REPLICA_CHECK_STALE_SECONDS:
+            return False
+        return self.healthy and self.replay_lsn >= required_lsn
+
+    def status(self) -> dict:
+        return {"name": self.name, "healthy": self.healthy, "lag_seconds": self.lag_seconds}
+
+
+_replicas = [Replica(url, index) for index, url in enumerate(DATABASE_REPLICA_URLS, start=1)]
+_next_replica = count()
+_monitor_pid = None
+_monitor_lock = threading.Lock()
+
+
+def _monitor_replicas():
+    while True:
+        for replica in _replicas:
+            replica.refresh()
+        time.sleep(REPLICA_HEALTH_CHECK_SECONDS)
+
+
+def start_replica_monitor():
+    """Starts this process's replica checks (idempotent; again in a forked child, which has no threads)."""
+    global _monitor_pid
+    with _monitor_lock:
+        if _monitor_pid == os.getpid():
+            return
+        _monitor_pid = os.getpid()
+        threading.Thread(target=_monitor_replicas, name="replica-monitor", daemon=True).start()
+
+
+def read_engine(user_id: Optional[str] = None):
+    """The engine a read-only scope should use: a usable replica, else the primary."""
+    if not _replicas:
+        return primary_engine
+    if _monitor_pid != os.getpid():
+        start_replica_monitor() # First read in this process: replicas serve once their first check is in
+    required_lsn = _required_lsn(user_id)
+    if required_lsn is None:
+        return primary_engine
+    start = next(_next_replica)
+    for offset in range(len(_replicas)):
+        replica = _replicas[(start + offset) % len(_replicas)]
+        if replica.usable(required_lsn):
+            return replica.engine
+    return primary_engine
+
+
+def refresh_replicas() -> list:
+    """Re-checks every replica now (readiness probe) and returns their status."""
+    for replica in _replicas:
+        replica.refresh()
+    return [replica.status() for replica in _replicas]
+
+
+class ReadOnlySession(Session):
+    """Session for read-only scopes: it may be bound to a replica, so flushing is an error."""
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise RuntimeError("Read-only session: use the primary session (get_db / SessionLocal) to write")
+        super().flush(objects)
+
+
+ReadSessionLocal = sessionmaker(class_=ReadOnlySession, autocommit=False, autoflush=False)
+apply_transaction_settings(ReadSessionLocal)
+
+
+def read_session(user_id: Optional[str] = None) -> Session:
+    """A read-only session on a replica when one is usable (for `user_id`'s reads), else the primary."""
+    return ReadSessionLocal(bind=read_engine(user_id))
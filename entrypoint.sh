@@ -3,16 +3,27 @@
 # Exit immediately if a command exits with a non-zero status.
 set -e
 
+# A command given to the container (e.g. the pre-deploy `alembic upgrade head`) runs as is
+if [ "$#" -gt 0 ]; then
+  exec "$@"
+fi
+
 # Check the RENDER_SERVICE_TYPE environment variable
 if [ "$RENDER_SERVICE_TYPE" = "api" ]; then
   echo "Starting FastAPI API service..."
   exec uvicorn main:app --host 0.0.0.0 --port "$PORT"
 elif [ "$RENDER_SERVICE_TYPE" = "worker" ]; then
   echo "Starting Celery worker service..."
-  exec celery -A tasks.celery_app worker -l info
+  # Captures go to the default "celery" queue, purges of deleted data to "maintenance"; set
+  # CELERY_WORKER_QUEUES=maintenance (or celery) to run dedicated workers for either
+  exec celery -A tasks.celery_app worker -l info -Q "${CELERY_WORKER_QUEUES:-celery,maintenance}"
+elif [ "$RENDER_SERVICE_TYPE" = "beat" ]; then
+  # Exactly one beat instance: it schedules recaptures of tracked swipe files
+  echo "Starting Celery beat service..."
+  exec celery -A tasks.celery_app beat -l info
 else
   echo "Error: RENDER_SERVICE_TYPE environment variable not set or invalid."
-  echo "Set RENDER_SERVICE_TYPE to 'api' or 'worker'."
+  echo "Set RENDER_SERVICE_TYPE to 'api', 'worker' or 'beat'."
   exit 1
 fi
 
@@ -0,0 +1,269 @@
+"""
+Collection and swipe file exports: a ZIP of the screenshots, or one combined PDF.
+
+Archives are built incrementally. Screenshots stored by the capture tasks are read from the
+bucket by key; other image URLs are downloaded over HTTP. Either way they go through a small
+ordered window of concurrent fetches (at most EXPORT_FETCH_CONCURRENCY images held at once),
+each image is written to the archive as soon as its turn comes, and the archive bytes are
+handed out as they are produced. The same generator feeds the streaming HTTP response and the background export
+task (which pipes it into an S3 multipart upload), so memory stays flat however large the
+collection is.
+
+Exports with more than EXPORT_STREAM_MAX_SCREENS screens run as a background task; their
+progress lives in Redis under flowvault:export:<id>.
+"""
+import io
+import os
+import re
+import json
+import time
+import zipfile
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, NamedTuple, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import select, func
+
+from models import CollectionSwipeFile, SwipeFile, Screen
+from redis_client import get_redis
+from storage import get_object_bytes, object_key
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FETCH_CONCURRENCY = int(os.environ.get("EXPORT_FETCH_CONCURRENCY", "4"))
+EXPORT_FETCH_TIMEOUT_SECONDS = float(os.environ.get("EXPORT_FETCH_TIMEOUT_SECONDS", "30"))
+EXPORT_STREAM_MAX_SCREENS = int(os.environ.get("EXPORT_STREAM_MAX_SCREENS", "200")) # Larger exports go to a background job
+EXPORT_LINK_EXPIRES_SECONDS = int(os.environ.get("EXPORT_LINK_EXPIRES_SECONDS", str(24 * 60 * 60)))
+EXPORT_PDF_JPEG_QUALITY = int(os.environ.get("EXPORT_PDF_JPEG_QUALITY", "85"))
+
+EXPORT_MEDIA_TYPES = {"zip": "application/zip", "pdf": "application/pdf"}
+EXPORT_STATE_KEY_PREFIX = "flowvault:export:"
+
+PDF_POINTS_PER_PIXEL = 0.75 # 96 dpi screenshots -> 72 pt/inch
+PDF_MAX_PAGE_POINTS = 14400 # Page size limit most readers enforce (200 inches)
+
+
+class ExportItem(NamedTuple):
+    name: str # Path inside the archive
+    image_url: str
+
+
+def slugify(value: str, fallback: str = "export") -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", (value or "").lower()).strip("-")[:60]
+    return slug or fallback
+
+
+def _export_query(collection_id: str, swipe_file_id: Optional[str] = None):
+    query = (
+        select(SwipeFile.id, SwipeFile.title, Screen.order_index, Screen.image_url, Screen.screen_metadata)
+        .join(CollectionSwipeFile, CollectionSwipeFile.swipe_file_id == SwipeFile.id)
+        .join(Screen, Screen.swipe_file_id == SwipeFile.id)
+        .where(CollectionSwipeFile.collection_id == collection_id)
+    )
+    if swipe_file_id:
+        query = query.where(SwipeFile.id == swipe_file_id)
+    return query
+
+
+def count_export_screens(db, collection_id: str, swipe_file_id: Optional[str] = None) -> int:
+    return db.scalar(select(func.count()).select_from(_export_query(collection_id, swipe_file_id).subquery()))
+
+
+def iter_export_items(db, collection_id: str, swipe_file_id: Optional[str] = None) -> Iterator[ExportItem]:
+    """Screens in collection order (swipe files by time added, screens by capture order), streamed from the DB."""
+    query = _export_query(collection_id, swipe_file_id).order_by(
+        CollectionSwipeFile.added_at, SwipeFile.id, Screen.order_index, Screen.id,
+    ).execution_options(yield_per=500)
+    folder_index, last_swipe_file_id = 0, None
+    for sf_id, title, order_index, image_url, metadata in db.execute(query):
+        if sf_id != last_swipe_file_id:
+            folder_index, last_swipe_file_id = folder_index + 1, sf_id
+        folder = "" if swipe_file_id else f"{folder_index:03d}-{slugify(title, sf_id)}/"
+        viewport = ((metadata or {}).get("viewport") or {}).get("name")
+        suffix = f"_{viewport}" if viewport and viewport != "desktop" else "" # One screen per breakpoint per step
+        tiles = (metadata or {}).get("tiles")
+        if tiles and not tiles.get("stitched"):
+            # Tall page captured in tiles and not stitched yet: export the tiles in order
+            for n, tile in enumerate(tiles["tiles"]):
+                yield ExportItem(name=f"{folder}screen_{order_index + 1:03d}{suffix}_tile_{n + 1:02d}.png", image_url=tile["url"])
+            continue
+        yield ExportItem(name=f"{folder}screen_{order_index + 1:03d}{suffix}.png", image_url=image_url)
+
+
+def _fetch(http: requests.Session, url: str) -> bytes:
+    key = object_key(url)
+    if key is not None:
+        return get_object_bytes(key) # Our own screenshot: read from the bucket, not through the CDN
+    response = http.get(url, timeout=EXPORT_FETCH_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.content
+
+
+def iter_fetched(items: Iterable[ExportItem], transform=None, concurrency: int = EXPORT_FETCH_CONCURRENCY):
+    """Yields (item, data or None on failure) in item order, downloading up to `concurrency` images ahead.
+
+    `transform` (e.g. PNG -> JPEG for PDFs) runs in the fetch threads so CPU work overlaps with I/O.
+    """
+    def load(item):
+        try:
+            data = _fetch(http, item.image_url)
+            return transform(data) if transform else data
+        except Exception as e:
+            logger.warning(f"Export: skipping {item.image_url}: {e}")
+            return None
+
+    http = requests.Session()
+    http.mount("https://", HTTPAdapter(pool_maxsize=concurrency))
+    http.mount("http://", HTTPAdapter(pool_maxsize=concurrency))
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="export-fetch")
+    window = deque()
+    try:
+        for item in items:
+            window.append((item, pool.submit(load, item)))
+            if len(window) >= concurrency:
+                done_item, future = window.popleft()
+                yield done_item, future.result()
+        while window:
+            done_item, future = window.popleft()
+            yield done_item, future.result()
+    finally:
+        # Reached early when the client disconnects: drop queued downloads, let in-flight ones finish
+        pool.shutdown(wait=True, cancel_futures=True)
+        http.close()
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object collecting output until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(items: Iterable[ExportItem]) -> Iterator[bytes]:
+    """ZIP archive bytes, one image at a time.
+
+    The sink is not seekable, so zipfile writes sizes in data descriptors after each entry
+    instead of seeking back. PNGs are already compressed, so entries are stored as-is.
+    """
+    sink = _ChunkSink()
+    failed = []
+    date_time = time.gmtime()[:6]
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for item, data in iter_fetched(items):
+            if data is None:
+                failed.append(item.image_url)
+                continue
+            info = zipfile.ZipInfo(item.name, date_time=date_time)
+            info.external_attr = 0o644 << 16
+            archive.writestr(info, data)
+            yield sink.drain()
+        if failed:
+            archive.writestr(zipfile.ZipInfo("export_errors.txt", date_time=date_time), "Could not fetch:\n" + "\n".join(failed) + "\n")
+    yield sink.drain()
+
+
+def _to_jpeg(data: bytes):
+    """PNG screenshot -> (JPEG bytes, width, height); PDFs embed JPEG (DCTDecode) directly."""
+    from PIL import Image # Only needed for PDF exports
+    with Image.open(io.BytesIO(data)) as image:
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            flattened = Image.new("RGB", image.size, (255, 255, 255))
+            flattened.paste(image, mask=image.getchannel("A"))
+            image = flattened
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=EXPORT_PDF_JPEG_QUALITY)
+        return output.getvalue(), image.width, image.height
+
+
+def iter_pdf(items: Iterable[ExportItem]) -> Iterator[bytes]:
+    """A PDF with one page per screenshot, written page by page.
+
+    Object 1 is the catalog and object 2 the page tree; the page tree is written last, once
+    all page references are known, followed by the cross-reference table.
+    """
+    position = 0
+    offsets = {} # object number -> byte offset, for the xref table
+    page_refs = []
+
+    def emit(data: bytes) -> bytes:
+        nonlocal position
+        position += len(data)
+        return data
+
+    def obj(number: int, body: bytes) -> bytes:
+        offsets[number] = position
+        return emit(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    yield emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    yield obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    next_number = 3
+    for item, converted in iter_fetched(items, transform=_to_jpeg):
+        if converted is None:
+            continue
+        jpeg, width, height = converted
+        scale = min(PDF_POINTS_PER_PIXEL, PDF_MAX_PAGE_POINTS / max(width, height))
+        page_width, page_height = round(width * scale, 2), round(height * scale, 2)
+        image_number, content_number, page_number = next_number, next_number + 1, next_number + 2
+        next_number += 3
+
+        yield obj(image_number, (
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+            b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n" % (width, height, len(jpeg))
+        ) + jpeg + b"\nendstream")
+        content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (page_width, page_height)
+        yield obj(content_number, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        yield obj(page_number, (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+        ) % (page_width, page_height, image_number, content_number))
+        page_refs.append(b"%d 0 R" % page_number)
+
+    yield obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(page_refs), len(page_refs)))
+    xref_offset = position
+    xref = [b"xref\n0 %d\n" % next_number, b"0000000000 65535 f \n"]
+    xref += [b"%010d 00000 n \n" % offsets[number] for number in range(1, next_number)]
+    yield emit(b"".join(xref) + b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (next_number, xref_offset))
+
+
+def iter_export(items: Iterable[ExportItem], export_format: str) -> Iterator[bytes]:
+    builder = iter_pdf if export_format == "pdf" else iter_zip
+    for chunk in builder(items):
+        if chunk:
+            yield chunk
+
+
+# --- Background export state (Redis) ---
+
+def set_export_state(export_id: str, **fields):
+    key = f"{EXPORT_STATE_KEY_PREFIX}{export_id}"
+    client = get_redis()
+    state = json.loads(client.get(key) or "{}")
+    state.update(fields, export_id=export_id, updated_at=time.time())
+    client.set(key, json.dumps(state), ex=EXPORT_LINK_EXPIRES_SECONDS)
+
+
+def get_export_state(export_id: str) -> Optional[dict]:
+    raw = get_redis().get(f"{EXPORT_STATE_KEY_PREFIX}{export_id}")
+    return json.loads(raw) if raw else None
@@ -0,0 +1,131 @@
+"""
+Cluster-wide per-host concurrency limiting for capture workers.
+
+A distributed semaphore per target host is held in Redis as a sorted set of leases
+(member = lease token, score = expiry time). Leases expire on their own if a worker dies,
+and are renewed between capture steps. A second key per host spaces out navigations so
+requests to the same site are at least HOST_MIN_REQUEST_INTERVAL_SECONDS apart across the
+whole fleet.
+
+Tasks that can't get a slot are deferred (re-enqueued with a countdown) instead of blocking
+a worker slot while they wait.
+
+The limit and spacing can be changed at runtime (capture_host_concurrency and
+capture_host_min_interval_seconds in runtime_settings.py); the environment values apply
+while those are unset.
+"""
+import os
+import time
+import uuid
+import random
+import logging
+import redis
+
+from redis_client import get_redis
+from runtime_settings import runtime_settings
+
+logger = logging.getLogger(__name__)
+
+HOST_CONCURRENCY_LIMIT = int(os.environ.get("HOST_CONCURRENCY_LIMIT", "2"))
+HOST_MIN_REQUEST_INTERVAL_SECONDS = float(os.environ.get("HOST_MIN_REQUEST_INTERVAL_SECONDS", "1.0"))
+HOST_LEASE_SECONDS = int(os.environ.get("HOST_LEASE_SECONDS", "180"))
+HOST_DEFER_BASE_SECONDS = float(os.environ.get("HOST_DEFER_BASE_SECONDS", "5"))
+HOST_DEFER_MAX_SECONDS = float(os.environ.get("HOST_DEFER_MAX_SECONDS", "60"))
+
+HOST_SLOTS_KEY_PREFIX = "flowvault:host_slots:"
+HOST_NEXT_REQUEST_KEY_PREFIX = "flowvault:host_next_request:"
+
+# KEYS[1] = slots zset; ARGV = now, lease expiry, limit, token
+# Returns 1 when the lease was granted, 0 when the host is at its limit.
+_ACQUIRE_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2]) - tonumber(ARGV[1])) + 60)
+    return 1
+end
+return 0
+"""
+
+# KEYS[1] = next-request timestamp; ARGV = now, min interval
+# Reserves the next request time for this host and returns how long the caller must wait.
+_RESERVE_TURN_LUA = """
+local now = tonumber(ARGV[1])
+local next_at = tonumber(redis.call('GET', KEYS[1]) or '0')
+local turn = math.max(now, next_at)
+redis.call('SET', KEYS[1], tostring(turn + tonumber(ARGV[2])), 'EX', math.ceil(tonumber(ARGV[2])) + 60)
+return tostring(turn - now)
+"""
+
+
+class HostLimiter:
+    def __init__(self, limit: int = HOST_CONCURRENCY_LIMIT, min_interval: float = HOST_MIN_REQUEST_INTERVAL_SECONDS):
+        self.limit = limit
+        self.min_interval = min_interval
+        self._acquire_script = None
+        self._reserve_script = None
+
+    def current_limit(self) -> int:
+        return runtime_settings.get("capture_host_concurrency") or self.limit
+
+    def current_min_interval(self) -> float:
+        min_interval = runtime_settings.get("capture_host_min_interval_seconds")
+        return self.min_interval if min_interval is None else min_interval
+
+    def _scripts(self):
+        if self._acquire_script is None:
+            client = get_redis()
+            self._acquire_script = client.register_script(_ACQUIRE_LUA)
+            self._reserve_script = client.register_script(_RESERVE_TURN_LUA)
+        return self._acquire_script, self._reserve_script
+
+    def try_acquire(self, host: str, limit: int = None):
+        """Returns a lease token, or None if the host already has `limit` captures in flight.
+
+        Redis errors fail open (a synthetic token) so captures continue without limiting.
+        """
+        token = uuid.uuid4().hex
+        now = time.time()
+        try:
+            acquire, _ = self._scripts()
+            granted = acquire(keys=[f"{HOST_SLOTS_KEY_PREFIX}{host}"], args=[now, now + HOST_LEASE_SECONDS, limit or self.current_limit(), token])
+        except redis.RedisError as e:
+            logger.warning(f"Host limiter unavailable for {host}, proceeding without a lease: {e}")
+            return token
+        return token if granted else None
+
+    def renew(self, host: str, token: str):
+        """Extend a held lease; call between capture steps so long flows don't lose their slot."""
+        try:
+            get_redis().zadd(f"{HOST_SLOTS_KEY_PREFIX}{host}", {token: time.time() + HOST_LEASE_SECONDS}, xx=True)
+        except redis.RedisError as e:
+            logger.warning(f"Could not renew host lease for {host}: {e}")
+
+    def release(self, host: str, token: str):
+        try:
+            get_redis().zrem(f"{HOST_SLOTS_KEY_PREFIX}{host}", token)
+        except redis.RedisError as e:
+            logger.warning(f"Could not release host lease for {host}: {e}")
+
+    def wait_for_turn(self, host: str):
+        """Block until this worker may send its next request to the host (fleet-wide spacing)."""
+        min_interval = self.current_min_interval()
+        if min_interval <= 0:
+            return
+        try:
+            _, reserve = self._scripts()
+            wait = float(reserve(keys=[f"{HOST_NEXT_REQUEST_KEY_PREFIX}{host}"], args=[time.time(), min_interval]))
+        except redis.RedisError as e:
+            logger.warning(f"Host request spacing unavailable for {host}: {e}")
+            return
+        if wait > 0:
+            time.sleep(wait)
+
+    @staticmethod
+    def defer_delay(deferrals: int) -> float:
+        """Countdown before a contended task is tried again: grows with contention, jittered to avoid herds."""
+        delay = min(HOST_DEFER_MAX_SECONDS, HOST_DEFER_BASE_SECONDS * (1.5 ** deferrals))
+        return delay * random.uniform(0.5, 1.0)
+
+
+host_limiter = HostLimiter()
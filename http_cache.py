@@ -0,0 +1,133 @@
+"""
+Conditional GET (ETag / If-None-Match) and the shared response cache for public collections.
+
+ETags are built from a resource's version counter (the `version` column on Collection, Team
+and SwipeFile, incremented by models.bump_version on every write), so answering a revalidation
+only needs that one integer: when the client's If-None-Match matches we return 304 without loading
+or serializing the resource.
+
+Public (is_private=False) collections are also cached in Redis as serialized response bodies,
+shared by every API instance. Writes invalidate by raising the entry's minimum version, so a
+reader that loaded the old row before the write can't put it back into the cache afterwards.
+Redis errors fail open: the endpoint just serves from the database. Reads go through the asyncio
+client (GET endpoints); invalidation is synchronous, called by the (sync) endpoints and jobs that
+write, after they commit.
+"""
+import os
+import logging
+from typing import Optional, Tuple
+import redis
+from fastapi import Request, Response
+
+from redis_client import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_COLLECTION_CACHE_TTL_SECONDS = int(os.environ.get("PUBLIC_COLLECTION_CACHE_TTL_SECONDS", "300"))
+PUBLIC_COLLECTION_CACHE_KEY_PREFIX = "flowvault:http_cache:collection:"
+
+# Version recorded for a deleted collection: no earlier load may re-populate the cache
+DELETED_VERSION = 2 ** 53
+
+# KEYS[1] = cache hash; ARGV = version, etag, body, ttl
+# Stores the body unless a newer version (or a deletion) has already been recorded.
+_CACHE_SET_LUA = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+if tonumber(ARGV[1]) < current then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'version', ARGV[1], 'etag', ARGV[2], 'body', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+# KEYS[1] = cache hash; ARGV = minimum version, ttl
+# Drops the cached body and remembers the version a replacement must have.
+_CACHE_INVALIDATE_LUA = """
+redis.call('HDEL', KEYS[1], 'etag', 'body')
+local current = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+if tonumber(ARGV[1]) > current then
+    redis.call('HSET', KEYS[1], 'version', ARGV[1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+_cache_set_script = None
+_cache_invalidate_script = None
+
+
+def _cache_set():
+    global _cache_set_script
+    if _cache_set_script is None:
+        _cache_set_script = get_async_redis().register_script(_CACHE_SET_LUA)
+    return _cache_set_script
+
+
+def _cache_invalidate():
+    global _cache_invalidate_script
+    if _cache_invalidate_script is None:
+        _cache_invalidate_script = get_redis().register_script(_CACHE_INVALIDATE_LUA)
+    return _cache_invalidate_script
+
+
+def make_etag(kind: str, resource_id: str, version) -> str:
+    # Weak: the representation is semantically stable per version, but may be re-compressed by proxies
+    return f'W/"{kind}-{resource_id}-{version}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the request's If-None-Match covers `etag` (weak comparison, as RFC 9110 requires for GET)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def cache_headers(etag: str, public: bool = False) -> dict:
+    # no-cache: clients may store the response but must revalidate (cheap 304) before reuse
+    return {"ETag": etag, "Cache-Control": f"{'public' if public else 'private'}, no-cache"}
+
+
+def not_modified(etag: str, public: bool = False) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, public))
+
+
+async def get_cached_public_collection(collection_id: str) -> Optional[Tuple[str, bytes]]:
+    """Returns (etag, JSON body) for a cached public collection, or None on a miss."""
+    try:
+        etag, body = await get_async_redis().hmget(f"{PUBLIC_COLLECTION_CACHE_KEY_PREFIX}{collection_id}", "etag", "body")
+    except redis.RedisError as e:
+        logger.warning(f"Public collection cache unavailable for {collection_id}: {e}")
+        return None
+    if etag is None or body is None:
+        return None
+    return etag.decode(), body
+
+
+async def cache_public_collection(collection_id: str, version: int, etag: str, body: bytes):
+    try:
+        await _cache_set()(
+            keys=[f"{PUBLIC_COLLECTION_CACHE_KEY_PREFIX}{collection_id}"],
+            args=[version, etag, body, PUBLIC_COLLECTION_CACHE_TTL_SECONDS],
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Could not cache public collection {collection_id}: {e}")
+
+
+def invalidate_collection(collection_id: str, version: int = DELETED_VERSION):
+    """Call after committing every write to a collection (or its swipe files) with the new version, or with no version on delete.
+
+    Safe for private collections too: a collection made private must stop being served from the shared cache.
+    """
+    try:
+        _cache_invalidate()(
+            keys=[f"{PUBLIC_COLLECTION_CACHE_KEY_PREFIX}{collection_id}"],
+            args=[version, PUBLIC_COLLECTION_CACHE_TTL_SECONDS],
+        )
+    except redis.RedisError as e:
+        # The stale entry can survive until its TTL; say so loudly
+        logger.error(f"Could not invalidate cached collection {collection_id}: {e}")
@@ -0,0 +1,181 @@
+"""
+Job progress events: published by capture workers, pushed to clients over SSE/WebSocket.
+
+Workers publish each event to a per-job Redis pub/sub channel and also keep a short-lived
+snapshot (latest status + screens captured so far) so clients that connect mid-job catch up.
+Every event carries a per-job sequence number so clients can drop duplicates between the
+snapshot and the live stream.
+
+Each API process holds a single Redis pub/sub connection (JobEventHub) and fans events out
+to its local subscribers, subscribing to a job's channel only while someone is listening.
+"""
+import json
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import redis
+
+from redis_client import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS_CHANNEL_PREFIX = "flowvault:job_events:"
+JOB_STATE_KEY_PREFIX = "flowvault:job_state:"     # latest status event (JSON)
+JOB_SCREENS_KEY_PREFIX = "flowvault:job_screens:" # list of screen events (JSON)
+JOB_SEQ_KEY_PREFIX = "flowvault:job_seq:"         # per-job event counter
+JOB_EVENTS_TTL_SECONDS = 24 * 60 * 60
+TERMINAL_STATUSES = {"completed", "failed"}
+
+_HUB_CONTROL_CHANNEL = f"{JOB_EVENTS_CHANNEL_PREFIX}_hub" # keeps the pub/sub connection in subscribed mode
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def publish_job_event(mcp_job_id: str, event_type: str, **data):
+    """Publish a progress event from a worker. Never raises: progress push is best effort."""
+    try:
+        client = get_redis()
+        seq = client.incr(f"{JOB_SEQ_KEY_PREFIX}{mcp_job_id}")
+        event = {"type": event_type, "mcp_job_id": mcp_job_id, "seq": seq, "ts": time.time(), **data}
+        payload = json.dumps(event)
+
+        pipe = client.pipeline()
+        if event_type == "screen":
+            pipe.rpush(f"{JOB_SCREENS_KEY_PREFIX}{mcp_job_id}", payload)
+            pipe.expire(f"{JOB_SCREENS_KEY_PREFIX}{mcp_job_id}", JOB_EVENTS_TTL_SECONDS)
+        else:
+            pipe.set(f"{JOB_STATE_KEY_PREFIX}{mcp_job_id}", payload, ex=JOB_EVENTS_TTL_SECONDS)
+        pipe.expire(f"{JOB_SEQ_KEY_PREFIX}{mcp_job_id}", JOB_EVENTS_TTL_SECONDS)
+        pipe.publish(f"{JOB_EVENTS_CHANNEL_PREFIX}{mcp_job_id}", payload)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"[MCP Job {mcp_job_id}] Could not publish '{event_type}' event: {e}")
+
+
+async def get_job_snapshot(mcp_job_id: str) -> list:
+    """Events needed to rebuild the current job state: screens so far, then the latest status."""
+    client = get_async_redis()
+    pipe = client.pipeline()
+    pipe.lrange(f"{JOB_SCREENS_KEY_PREFIX}{mcp_job_id}", 0, -1)
+    pipe.get(f"{JOB_STATE_KEY_PREFIX}{mcp_job_id}")
+    screens, state = await pipe.execute()
+    events = [json.loads(raw) for raw in screens]
+    if state is not None:
+        events.append(json.loads(state))
+    return sorted(events, key=lambda event: event["seq"])
+
+
+async def get_job_seq(mcp_job_id: str):
+    """Sequence number of the job's latest event (None if no events): a cheap version for job status ETags."""
+    seq = await get_async_redis().get(f"{JOB_SEQ_KEY_PREFIX}{mcp_job_id}")
+    return int(seq) if seq is not None else None
+
+
+class JobEventHub:
+    """One Redis pub/sub connection per API process, fanned out to in-process subscriber queues."""
+
+    def __init__(self):
+        self._subscribers = {} # mcp_job_id -> set of asyncio.Queue
+        self._pubsub = None
+        self._reader_task = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        """Connects at startup. Never raises: while Redis is down, the first subscriber connects instead."""
+        try:
+            await self._connect()
+        except redis.RedisError as e:
+            logger.warning(f"Job event hub could not connect to Redis, connecting on first use: {e}")
+
+    async def _connect(self):
+        if self._pubsub is not None:
+            return
+        pubsub = get_async_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(_HUB_CONTROL_CHANNEL)
+        except redis.RedisError:
+            await pubsub.close()
+            raise
+        self._pubsub = pubsub
+        self._reader_task = asyncio.create_task(self._read_loop())
+        logger.info("Job event hub started.")
+
+    async def stop(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        self._pubsub, self._reader_task = None, None
+
+    async def _read_loop(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job event hub read failed, retrying: {e}")
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            channel = message["channel"].decode()
+            mcp_job_id = channel[len(JOB_EVENTS_CHANNEL_PREFIX):]
+            event = json.loads(message["data"])
+            for queue in list(self._subscribers.get(mcp_job_id, ())):
+                if queue.full():
+                    # A slow client loses its oldest event rather than stalling the hub
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+    @asynccontextmanager
+    async def subscribe(self, mcp_job_id: str):
+        """Yields a queue receiving live events for the job until the context exits."""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        async with self._lock:
+            await self._connect() # Raises redis.RedisError while Redis is still unreachable
+            listeners = self._subscribers.setdefault(mcp_job_id, set())
+            if not listeners:
+                await self._pubsub.subscribe(f"{JOB_EVENTS_CHANNEL_PREFIX}{mcp_job_id}")
+            listeners.add(queue)
+        try:
+            yield queue
+        finally:
+            async with self._lock:
+                listeners = self._subscribers.get(mcp_job_id, set())
+                listeners.discard(queue)
+                if not listeners:
+                    self._subscribers.pop(mcp_job_id, None)
+                    await self._pubsub.unsubscribe(f"{JOB_EVENTS_CHANNEL_PREFIX}{mcp_job_id}")
+
+    async def stream(self, mcp_job_id: str, heartbeat_seconds: float = 15.0):
+        """Async generator of job events: the snapshot first, then live events until the job ends.
+
+        Yields None when no event arrived within heartbeat_seconds so transports can send keep-alives.
+        """
+        async with self.subscribe(mcp_job_id) as queue:
+            last_seq = 0
+            for event in await get_job_snapshot(mcp_job_id):
+                last_seq = event["seq"]
+                yield event
+                if event["type"] in TERMINAL_STATUSES:
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["seq"] <= last_seq:
+                    continue # Already delivered in the snapshot
+                last_seq = event["seq"]
+                yield event
+                if event["type"] in TERMINAL_STATUSES:
+                    return
+
+
+job_event_hub = JobEventHub()
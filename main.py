@@ -2,12 +2,28 @@
 Main FastAPI application for FlowVault MCP Server.
 """
 import os
+import json
 import logging
 import uuid
-from fastapi import FastAPI, BackgroundTasks, HTTPException
-from pydantic import BaseModel
-from tasks import celery_app, generate_screenshots_task # Import from tasks.py
-from routers import collections_router, teams_router, admin_router, stripe_router # Import collections, teams, admin, and stripe routers
+import asyncio
+import redis
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, WebSocketException
+from starlette.status import WS_1008_POLICY_VIOLATION
+from fastapi.responses import JSONResponse, StreamingResponse
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from typing import List, Optional
+from pydantic import BaseModel, field_validator
+from celery_client import celery_app, send_generate_screenshots # Dispatch by task name; task code stays out of the API process
+from tracing import setup_tracing, tracing_middleware, tracer
+from job_events import job_event_hub, get_job_snapshot, get_job_seq
+from http_cache import make_etag, etag_matches, cache_headers, not_modified
+from sqlalchemy.orm import Session
+from auth import get_current_user, get_db, get_read_db, get_websocket_user
+from models import McpJob, User
+from viewports import normalize_viewports
+from runtime_settings import runtime_settings, user_tier
+from routers import collections_router, teams_router, admin_router, stripe_router, health_router, search_router, monitoring_router # Import collections, teams, admin, stripe, health, search, and monitoring routers
 
 # Configure logging first
 logging.basicConfig(level=logging.INFO)
@@ -19,34 +35,98 @@ app = FastAPI(
     version="0.1.0"
 )
 
+# Tracing: one server span per request, propagated into Celery via message headers
+setup_tracing("flowvault-api")
+app.middleware("http")(tracing_middleware)
+
+# Health probes, admin (to switch it back off) and Stripe webhooks keep working during maintenance
+MAINTENANCE_EXEMPT_PREFIXES = ("/api/v1/health", "/api/v1/admin", "/api/v1/stripe/webhook")
+MAINTENANCE_RETRY_AFTER_SECONDS = os.environ.get("MAINTENANCE_RETRY_AFTER_SECONDS", "60")
+
+@app.middleware("http")
+async def maintenance_mode(request: Request, call_next):
+    # A local dict lookup; changes arrive by pub/sub (runtime_settings.py)
+    if runtime_settings.get("maintenance_mode") and not request.url.path.startswith(MAINTENANCE_EXEMPT_PREFIXES):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": runtime_settings.get("maintenance_message"), "maintenance_mode": True},
+            headers={"Retry-After": MAINTENANCE_RETRY_AFTER_SECONDS},
+        )
+    return await call_next(request)
+
 # Include routers
 app.include_router(collections_router.router)
 app.include_router(teams_router.router)
 app.include_router(admin_router.router)
 app.include_router(stripe_router.router)
+app.include_router(health_router.router)
+app.include_router(search_router.router)
+app.include_router(monitoring_router.router)
+
+@app.on_event("startup")
+async def start_job_event_hub():
+    await job_event_hub.start()
+
+@app.on_event("startup")
+def start_runtime_settings():
+    runtime_settings.start() # Load before the first request instead of during it
+
+@app.on_event("shutdown")
+async def stop_job_event_hub():
+    await job_event_hub.stop()
 
 class ScreenshotRequest(BaseModel):
     url: str
+    # Breakpoints to shoot each step at ("desktop", "tablet", "mobile"); each step is still loaded once
+    viewports: Optional[List[str]] = None
     # user_id: str # To associate the job with a user, will be fetched from auth context later
 
+    @field_validator("viewports")
+    @classmethod
+    def check_viewports(cls, viewports):
+        return normalize_viewports(viewports) if viewports is not None else None
+
 @app.post("/api/v1/generate-swipe", status_code=202)
-async def request_swipe_generation(request: ScreenshotRequest, background_tasks: BackgroundTasks):
+async def request_swipe_generation(
+    request: ScreenshotRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
     """Endpoint to submit a URL for swipe file generation.
 
     This will create an MCP job and queue it for processing.
     """
-    # 1. Create an mcp_job record in the database (status: 'queued', target_url: request.url, submitted_by_user_id: ...)
-    # For now, let's generate a placeholder job ID
+    captures_per_day = runtime_settings.quota(user_tier(current_user), "captures_per_day")
+    if captures_per_day is not None:
+        # Lock the user's row until the job is committed: concurrent submissions by the same user
+        # count one at a time, so they can't all pass the check before any job row exists
+        db.query(User.id).filter(User.id == current_user.id).with_for_update().one()
+        since = datetime.now(timezone.utc) - timedelta(days=1)
+        captures_today = (
+            db.query(func.count(McpJob.id))
+            .filter(McpJob.submitted_by_user_id == current_user.id, McpJob.created_at >= since)
+            .scalar()
+        )
+        if captures_today >= captures_per_day:
+            raise HTTPException(status_code=429, detail=f"Daily capture limit reached ({captures_per_day} per 24 hours on your plan)")
+
     mcp_job_id = str(uuid.uuid4())
     logger.info(f"[MCP Job {mcp_job_id}] Received request to generate swipe for URL: {request.url}")
-    
-    # In a real app, you'd save this job_id to your database (e.g., mcp_jobs table)
-    # with status 'queued' before dispatching the Celery task.
 
-    # Dispatch the task to Celery
-    # Using .delay() is a shortcut for .send_task().
-    task_info = generate_screenshots_task.delay(target_url=request.url, mcp_job_id=mcp_job_id)
+    # The job row must exist before dispatch: the worker checkpoints its progress on it.
+    job = McpJob(id=mcp_job_id, target_url=request.url, status="queued", submitted_by_user_id=current_user.id)
+    db.add(job)
+    db.commit()
+
+    # Dispatch the task to Celery by name (send_task), so the API never imports tasks.py.
+    # The enqueue span is the parent of the worker's queue_wait and run spans.
+    with tracer.start_as_current_span("celery.enqueue generate_screenshots_task") as span:
+        span.set_attribute("mcp_job_id", mcp_job_id)
+        task_info = send_generate_screenshots(target_url=request.url, mcp_job_id=mcp_job_id, viewports=request.viewports)
     
+    job.celery_task_id = task_info.id
+    db.commit()
     logger.info(f"[MCP Job {mcp_job_id}] Task enqueued with Celery ID: {task_info.id}")
     
     return {
@@ -55,20 +135,111 @@ async def request_swipe_generation(request: ScreenshotRequest, background_tasks:
         "celery_task_id": task_info.id # This is the Celery task ID for tracking
     }
 
+def _get_own_job(db: Session, mcp_job_id: str, user_id: str) -> McpJob:
+    """The job if `user_id` submitted it; 404 otherwise, as if it didn't exist."""
+    job = db.get(McpJob, mcp_job_id)
+    if job is None or job.submitted_by_user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.get("/api/v1/job-status/{mcp_job_id}")
-async def get_job_status(mcp_job_id: str):
-    """Endpoint to check the status of a screenshot generation job.
+async def get_job_status(
+    mcp_job_id: str,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """Endpoint to check the status of a screenshot generation job (only its submitter may).
 
-    In a real app, this would query the `mcp_jobs` table.
-    For Celery task status, you'd use the celery_task_id.
+    Answers from the progress snapshot the worker publishes while it is there, else from the
+    job row. (Celery task results are not stored: capture tasks run with ignore_result.)
     """
-    # Placeholder: In a real app, query your database for the job status using mcp_job_id
-    # For Celery task status itself (if you want to expose it):
-    # task_result = celery_app.AsyncResult(celery_task_id_from_db)
-    # return {"mcp_job_id": mcp_job_id, "status": task_result.status, "result": task_result.result}
-    logger.info(f"Request for job status: {mcp_job_id}")
-    # This is a mock response. You'd fetch actual status from your DB.
-    return {"mcp_job_id": mcp_job_id, "status": "processing", "progress_percentage": 50, "message": "Fetching actual status from DB is not yet implemented."}
+    job = await asyncio.to_thread(_get_own_job, db, mcp_job_id, current_user.id)
+    # Every job event bumps the job's sequence number, so it versions the status response:
+    # pollers that already have the latest state get a 304 without the snapshot being read.
+    try:
+        seq = await get_job_seq(mcp_job_id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read the event sequence of job {mcp_job_id}, answering without an ETag: {e}")
+        seq = None
+    if seq is not None:
+        etag = make_etag("job", mcp_job_id, seq)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers.update(cache_headers(etag))
+    # Prefer the progress snapshot published by the worker (a single Redis round trip).
+    # Clients should subscribe to /api/v1/job-events/{mcp_job_id} instead of polling this.
+    try:
+        events = await get_job_snapshot(mcp_job_id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read the event snapshot of job {mcp_job_id}, answering from the database: {e}")
+        events = None
+    if events:
+        screens = [event for event in events if event["type"] == "screen"]
+        status_events = [event for event in events if event["type"] != "screen"]
+        status = status_events[-1]["type"] if status_events else "processing"
+        return {"mcp_job_id": mcp_job_id, "status": status, "screens": screens}
+    # Snapshot expired (JOB_EVENTS_TTL_SECONDS) or unavailable: the job row's checkpoint
+    return {
+        "mcp_job_id": mcp_job_id,
+        "status": job.status,
+        "completed_steps": job.completed_steps,
+        "error_message": job.error_message,
+    }
+
+@app.get("/api/v1/job-events/{mcp_job_id}")
+async def stream_job_events(
+    mcp_job_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """Server-Sent Events stream of job progress (only for the job's submitter).
+
+    Sends the events so far (screens captured, latest status), then live events as the worker
+    publishes them, and closes once the job completes or fails.
+    """
+    await asyncio.to_thread(_get_own_job, db, mcp_job_id, current_user.id)
+
+    async def event_source():
+        async for event in job_event_hub.stream(mcp_job_id):
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # Disable proxy buffering
+    )
+
+@app.websocket("/api/v1/ws/job-events/{mcp_job_id}")
+async def job_events_websocket(
+    websocket: WebSocket,
+    mcp_job_id: str,
+    current_user: User = Depends(get_websocket_user), # ?token=<Clerk session token>, or Clerk's cookie
+    db: Session = Depends(get_db),
+):
+    """WebSocket variant of the job progress stream (same events and access as the SSE endpoint)."""
+    try:
+        await asyncio.to_thread(_get_own_job, db, mcp_job_id, current_user.id)
+    except HTTPException:
+        raise WebSocketException(code=WS_1008_POLICY_VIOLATION, reason="Job not found")
+    db.close() # Nothing else to read; don't hold a connection for the life of the socket
+    await websocket.accept()
+    try:
+        async for event in job_event_hub.stream(mcp_job_id):
+            if event is None:
+                await websocket.send_json({"type": "keep-alive"})
+                continue
+            await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket client for job {mcp_job_id} disconnected.")
 
 
 @app.get("/")
@@ -0,0 +1,41 @@
+"""
+Alembic environment for FlowVault.
+
+Uses sqlalchemy.url when it is set on the Alembic config (e.g., by the query benchmark),
+otherwise DATABASE_URL from models.py.
+"""
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from models import Base, DATABASE_URL
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def get_url():
+    return config.get_main_option("sqlalchemy.url") or DATABASE_URL
+
+
+def run_migrations_offline():
+    context.configure(url=get_url(), target_metadata=target_metadata, literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(get_url(), poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,126 @@
+"""Baseline schema (tables as created by models.create_db_tables before migrations existed)
+
+Existing databases created with create_db_tables() should be stamped at this revision
+(`alembic stamp 0001`) and then upgraded.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("stripe_customer_id", sa.String(), nullable=True, unique=True),
+        sa.Column("stripe_subscription_id", sa.String(), nullable=True, unique=True),
+        sa.Column("subscription_status", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "teams",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("owner_user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_teams_id", "teams", ["id"])
+
+    op.create_table(
+        "team_members",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("team_id", sa.String(), sa.ForeignKey("teams.id"), nullable=False),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("role", sa.String(), nullable=False),
+        sa.Column("joined_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_team_members_id", "team_members", ["id"])
+
+    op.create_table(
+        "collections",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("owner_user_id", sa.String(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("team_id", sa.String(), sa.ForeignKey("teams.id"), nullable=True),
+        sa.Column("is_private", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_collections_id", "collections", ["id"])
+
+    # mcp_jobs and swipe_files reference each other; the mcp_jobs -> swipe_files key is added last
+    op.create_table(
+        "mcp_jobs",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("target_url", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("celery_task_id", sa.String(), nullable=True),
+        sa.Column("submitted_by_user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("swipe_file_id", sa.String(), nullable=True),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_mcp_jobs_id", "mcp_jobs", ["id"])
+    op.create_index("ix_mcp_jobs_celery_task_id", "mcp_jobs", ["celery_task_id"])
+
+    op.create_table(
+        "swipe_files",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("original_url", sa.String(), nullable=False),
+        sa.Column("owner_user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("mcp_job_id", sa.String(), sa.ForeignKey("mcp_jobs.id"), nullable=True, unique=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_swipe_files_id", "swipe_files", ["id"])
+    op.create_foreign_key("mcp_jobs_swipe_file_id_fkey", "mcp_jobs", "swipe_files", ["swipe_file_id"], ["id"])
+
+    op.create_table(
+        "screens",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("swipe_file_id", sa.String(), sa.ForeignKey("swipe_files.id"), nullable=False),
+        sa.Column("image_url", sa.String(), nullable=False),
+        sa.Column("thumbnail_url", sa.String(), nullable=True),
+        sa.Column("order_index", sa.Integer(), nullable=False),
+        sa.Column("alt_text", sa.String(), nullable=True),
+        sa.Column("metadata", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_screens_id", "screens", ["id"])
+
+    op.create_table(
+        "collection_swipe_files",
+        sa.Column("collection_id", sa.String(), sa.ForeignKey("collections.id"), primary_key=True),
+        sa.Column("swipe_file_id", sa.String(), sa.ForeignKey("swipe_files.id"), primary_key=True),
+        sa.Column("added_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("collection_swipe_files")
+    op.drop_table("screens")
+    op.drop_constraint("mcp_jobs_swipe_file_id_fkey", "mcp_jobs", type_="foreignkey")
+    op.drop_table("swipe_files")
+    op.drop_table("mcp_jobs")
+    op.drop_table("collections")
+    op.drop_table("team_members")
+    op.drop_table("teams")
+    op.drop_table("users")
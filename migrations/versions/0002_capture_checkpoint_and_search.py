@@ -0,0 +1,113 @@
+"""Capture checkpoint columns on mcp_jobs; extracted page text and search indexes
+
+The search vectors are plain nullable columns kept current by triggers, not generated
+columns: adding a stored generated column rewrites the whole table under an ACCESS EXCLUSIVE
+lock. Existing rows are backfilled in committed batches and the GIN indexes are built
+CONCURRENTLY afterwards, so the migration can run against a live database.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+# {row} is "NEW." in the triggers and "" in the backfill
+SWIPE_FILE_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('simple', regexp_replace({row}original_url, '[/.:?=&_-]+', ' ', 'g')), 'B')"
+)
+SCREEN_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({row}page_title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({row}page_headings, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce({row}alt_text, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce({row}page_text, '')), 'D')"
+)
+
+# (table, columns the vector is built from, expression)
+SEARCH_VECTORS = [
+    ("swipe_files", ["title", "original_url"], SWIPE_FILE_SEARCH_VECTOR),
+    ("screens", ["page_title", "page_headings", "alt_text", "page_text"], SCREEN_SEARCH_VECTOR),
+]
+
+# (name, table, column, operator class)
+INDEXES = [
+    ("ix_swipe_files_search_vector", "swipe_files", "search_vector", None),
+    ("ix_swipe_files_title_trgm", "swipe_files", "title", "gin_trgm_ops"),
+    ("ix_swipe_files_original_url_trgm", "swipe_files", "original_url", "gin_trgm_ops"),
+    ("ix_screens_search_vector", "screens", "search_vector", None),
+]
+
+
+def upgrade():
+    op.add_column("mcp_jobs", sa.Column("capture_plan", sa.JSON(), nullable=True))
+    op.add_column("mcp_jobs", sa.Column("completed_steps", sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column("screens", sa.Column("page_title", sa.String(), nullable=True))
+    op.add_column("screens", sa.Column("page_headings", sa.Text(), nullable=True))
+    op.add_column("screens", sa.Column("page_text", sa.Text(), nullable=True))
+    for table, columns, expression in SEARCH_VECTORS:
+        op.add_column(table, sa.Column("search_vector", TSVECTOR(), nullable=True))
+        op.execute(f"""
+            CREATE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {expression.format(row="NEW.")};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_search_vector_update
+            BEFORE INSERT OR UPDATE OF {", ".join(columns)} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()
+        """)
+
+    # The triggers cover rows written from here on; existing rows are filled in primary key
+    # order, committing each batch so no lock is held for long
+    with op.get_context().autocommit_block():
+        for table, _, expression in SEARCH_VECTORS:
+            op.execute(f"""
+                DO $$
+                DECLARE
+                    last_id varchar := '';
+                    batch_last_id varchar;
+                BEGIN
+                    LOOP
+                        SELECT max(id) INTO batch_last_id
+                        FROM (SELECT id FROM {table} WHERE id > last_id ORDER BY id LIMIT {BACKFILL_BATCH_SIZE}) batch;
+                        EXIT WHEN batch_last_id IS NULL;
+                        UPDATE {table} SET search_vector = {expression.format(row="")}
+                        WHERE id > last_id AND id <= batch_last_id AND search_vector IS NULL;
+                        last_id := batch_last_id;
+                        COMMIT;
+                    END LOOP;
+                END
+                $$
+            """)
+        for name, table, column, ops in INDEXES:
+            op.create_index(name, table, [column], postgresql_using="gin", postgresql_ops={column: ops} if ops else {},
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    for table, _, _ in reversed(SEARCH_VECTORS):
+        op.execute(f"DROP TRIGGER {table}_search_vector_update ON {table}")
+        op.execute(f"DROP FUNCTION {table}_search_vector_update()")
+        op.drop_column(table, "search_vector")
+    op.drop_column("screens", "page_text")
+    op.drop_column("screens", "page_headings")
+    op.drop_column("screens", "page_title")
+    op.drop_column("mcp_jobs", "completed_steps")
+    op.drop_column("mcp_jobs", "capture_plan")
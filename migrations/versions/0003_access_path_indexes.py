@@ -0,0 +1,48 @@
+"""Composite and unique indexes for the access paths the routers use
+
+All indexes are built CONCURRENTLY so the migration can run against a live database
+without blocking writes. Duplicate team memberships are removed (keeping the earliest)
+before the unique constraint is added.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# (name, table, columns)
+INDEXES = [
+    ("ix_team_members_user_id", "team_members", ["user_id"]),
+    ("ix_teams_owner_user_id", "teams", ["owner_user_id"]),
+    ("ix_collections_owner_user_id", "collections", ["owner_user_id"]),
+    ("ix_collections_team_id", "collections", ["team_id"]),
+    ("ix_collection_swipe_files_swipe_file_id", "collection_swipe_files", ["swipe_file_id"]),
+    ("ix_swipe_files_owner_created", "swipe_files", ["owner_user_id", "created_at"]),
+    ("ix_screens_swipe_file_order", "screens", ["swipe_file_id", "order_index"]),
+    ("ix_mcp_jobs_submitter_status_created", "mcp_jobs", ["submitted_by_user_id", "status", "created_at"]),
+]
+
+
+def upgrade():
+    op.execute("""
+        DELETE FROM team_members tm
+        USING team_members dup
+        WHERE tm.team_id = dup.team_id AND tm.user_id = dup.user_id AND tm.id > dup.id
+    """)
+    with op.get_context().autocommit_block():
+        op.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_team_members_team_id_user_id ON team_members (team_id, user_id)")
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+    op.execute("ALTER TABLE team_members ADD CONSTRAINT uq_team_members_team_id_user_id UNIQUE USING INDEX uq_team_members_team_id_user_id")
+
+
+def downgrade():
+    op.drop_constraint("uq_team_members_team_id_user_id", "team_members", type_="unique")
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,26 @@
+"""Version counters on teams, collections and swipe_files (ETags, response cache invalidation)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ("teams", "collections", "swipe_files")
+
+
+def upgrade():
+    # Constant server default: Postgres adds the column without rewriting the table
+    for table in VERSIONED_TABLES:
+        op.add_column(table, sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    for table in VERSIONED_TABLES:
+        op.drop_column(table, "version")
@@ -0,0 +1,57 @@
+"""Tracked swipe files: recapture schedule columns and the swipe_file_versions history
+
+The new swipe_files columns are nullable or have constant defaults, so they are added without
+a table rewrite; the scheduler's partial index is built CONCURRENTLY.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+SWIPE_FILE_COLUMNS = [
+    sa.Column("is_tracked", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+    sa.Column("recapture_interval_hours", sa.Integer(), nullable=True),
+    sa.Column("next_recapture_at", sa.DateTime(timezone=True), nullable=True),
+    sa.Column("last_recaptured_at", sa.DateTime(timezone=True), nullable=True),
+    sa.Column("last_changed_at", sa.DateTime(timezone=True), nullable=True),
+    sa.Column("capture_version", sa.Integer(), nullable=False, server_default="1"),
+]
+
+
+def upgrade():
+    for column in SWIPE_FILE_COLUMNS:
+        op.add_column("swipe_files", column)
+
+    op.create_table(
+        "swipe_file_versions",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("swipe_file_id", sa.String(), sa.ForeignKey("swipe_files.id"), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("screens", sa.JSON(), nullable=False),
+        sa.Column("changes", sa.JSON(), nullable=True),
+        sa.Column("superseded_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("swipe_file_id", "version", name="uq_swipe_file_versions_swipe_file_id_version"),
+    )
+    op.create_index("ix_swipe_file_versions_id", "swipe_file_versions", ["id"])
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_swipe_files_next_recapture_at", "swipe_files", ["next_recapture_at"],
+            postgresql_where=sa.text("is_tracked"), postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_swipe_files_next_recapture_at", table_name="swipe_files", postgresql_concurrently=True, if_exists=True)
+    op.drop_index("ix_swipe_file_versions_id", table_name="swipe_file_versions")
+    op.drop_table("swipe_file_versions")
+    for column in reversed(SWIPE_FILE_COLUMNS):
+        op.drop_column("swipe_files", column.name)
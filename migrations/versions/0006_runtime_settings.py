@@ -0,0 +1,27 @@
+"""Runtime settings table (maintenance mode, feature flags, capture limits, tier quotas)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "runtime_settings",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("value", sa.JSON(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_by", sa.String(), sa.ForeignKey("users.id"), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table("runtime_settings")
@@ -0,0 +1,47 @@
+"""Soft delete (deleted_at) for users, teams and collections, and the purge_jobs table
+
+The deleted_at columns are nullable without a default, so adding them is a catalog-only change.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+SOFT_DELETE_TABLES = ["users", "teams", "collections"]
+
+
+def upgrade():
+    for table in SOFT_DELETE_TABLES:
+        op.add_column(table, sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True))
+
+    op.create_table(
+        "purge_jobs",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("entity_type", sa.String(), nullable=False),
+        sa.Column("entity_id", sa.String(), nullable=False),
+        sa.Column("requested_by_user_id", sa.String(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False, server_default="pending"),
+        sa.Column("completed_steps", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("progress", sa.JSON(), nullable=False, server_default="{}"),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_purge_jobs_id", "purge_jobs", ["id"])
+    op.create_index("ix_purge_jobs_status_created", "purge_jobs", ["status", "created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_purge_jobs_status_created", table_name="purge_jobs")
+    op.drop_index("ix_purge_jobs_id", table_name="purge_jobs")
+    op.drop_table("purge_jobs")
+    for table in reversed(SOFT_DELETE_TABLES):
+        op.drop_column(table, "deleted_at")
@@ -0,0 +1,227 @@
+"""
+Tracked swipe files: scheduled recapture and visual change detection.
+
+Scheduling: every tracked swipe file gets a fixed phase inside its recapture interval, derived
+from its id, so a week's worth of weekly recaptures is spread evenly over the week instead of
+all landing at midnight. Celery beat runs the scheduler every RECAPTURE_SCHEDULER_TICK_SECONDS;
+it dispatches the files due within the next tick, each with a countdown to its exact slot.
+
+Change detection, per screenshot (or per tile of a tiled capture), cheapest check first:
+  1. identical PNG bytes (sha256) -> unchanged, nothing decoded
+  2. different dimensions, or a perceptual hash (dHash) too far from the previous one -> changed
+  3. otherwise a pixel diff against the stored image; changed if at least PIXEL_DIFF_MIN_PIXELS
+     pixels moved by more than PIXEL_DIFF_TOLERANCE (anti-aliasing noise). An absolute count,
+     not a ratio: a changed price on a 20k px page is a tiny fraction of it.
+
+Captures are spooled (RecaptureSpool) while they are compared and only uploaded when the
+screen changed, so an unchanged run costs one capture and no storage. Stored images are read
+back from the bucket by key, never through their public URL (private buckets, CDN outages).
+"""
+import io
+import os
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from tempfile import SpooledTemporaryFile
+from typing import Callable, List, Optional
+
+from page_capture import png_size
+from storage import public_url, object_key, get_object_bytes
+
+logger = logging.getLogger(__name__)
+
+RECAPTURE_DEFAULT_INTERVAL_HOURS = int(os.environ.get("RECAPTURE_DEFAULT_INTERVAL_HOURS", str(7 * 24)))
+RECAPTURE_MIN_INTERVAL_HOURS = int(os.environ.get("RECAPTURE_MIN_INTERVAL_HOURS", "24"))
+RECAPTURE_MAX_PER_TICK = int(os.environ.get("RECAPTURE_MAX_PER_TICK", "50")) # Overflow stays due and goes out next tick
+RECAPTURE_SPOOL_MAX_BYTES = int(os.environ.get("RECAPTURE_SPOOL_MAX_BYTES", str(4 * 1024 * 1024))) # Larger captures spill to disk
+
+PHASH_CHANGE_DISTANCE = int(os.environ.get("PHASH_CHANGE_DISTANCE", "10")) # Of 64 bits; beyond this it changed, no pixel diff needed
+PIXEL_DIFF_TOLERANCE = int(os.environ.get("PIXEL_DIFF_TOLERANCE", "24")) # 0-255 luminance difference ignored as noise
+PIXEL_DIFF_MIN_PIXELS = int(os.environ.get("PIXEL_DIFF_MIN_PIXELS", "16")) # A changed digit in small text is a few dozen
+
+
+# --- Scheduling --- #
+
+def recapture_phase_seconds(swipe_file_id: str, interval_seconds: int) -> int:
+    """Stable offset of this swipe file's slot within the interval (uniform over ids)."""
+    return int(hashlib.sha1(swipe_file_id.encode()).hexdigest()[:12], 16) % interval_seconds
+
+
+def next_recapture_at(swipe_file_id: str, interval_hours: int, after: datetime) -> datetime:
+    """The swipe file's first slot strictly after `after`."""
+    interval = interval_hours * 3600
+    phase = recapture_phase_seconds(swipe_file_id, interval)
+    elapsed = (int(after.timestamp()) - phase) % interval
+    return after.replace(microsecond=0) + timedelta(seconds=interval - elapsed)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# --- Fingerprints and comparison --- #
+
+def dhash(image) -> str:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail, as hex."""
+    from PIL import Image
+    small = image.convert("L").resize((9, 8), Image.Resampling.BOX)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def fingerprint(data: bytes, image=None) -> dict:
+    """What is kept per stored image to compare later captures against (in Screen metadata)."""
+    from PIL import Image
+    width, height = png_size(data)
+    if image is None:
+        with Image.open(io.BytesIO(data)) as image:
+            phash = dhash(image)
+    else:
+        phash = dhash(image)
+    return {"sha256": hashlib.sha256(data).hexdigest(), "phash": phash, "width": width, "height": height}
+
+
+def pixel_diff(new_image, old_image):
+    """(number of changed pixels, bounding box of the changes or None)."""
+    from PIL import ImageChops
+    diff = ImageChops.difference(new_image.convert("RGB"), old_image.convert("RGB")).convert("L")
+    mask = diff.point(lambda value: 255 if value > PIXEL_DIFF_TOLERANCE else 0)
+    return mask.histogram()[255], mask.getbbox()
+
+
+def _read_object(key: Optional[str]) -> bytes:
+    if key is None:
+        raise ValueError("not an object in this bucket")
+    return get_object_bytes(key)
+
+
+def compare_image(data: bytes, previous: dict, fetch: Callable[[Optional[str]], bytes] = _read_object):
+    """Compares a new capture with a stored image ({"key", "url", "fingerprint" or None}).
+
+    Returns (new fingerprint, previous fingerprint, comparison). The previous image is only
+    downloaded when the hashes can't decide, or when it has no fingerprint yet (screens captured
+    before tracking was enabled); the fingerprint computed then is returned so it can be saved.
+    """
+    from PIL import Image
+    sha256 = hashlib.sha256(data).hexdigest()
+    previous_fp = previous.get("fingerprint")
+    if previous_fp and previous_fp["sha256"] == sha256:
+        return previous_fp, previous_fp, {"changed": False, "method": "sha256"}
+
+    previous_data = None
+    if previous_fp is None:
+        try:
+            previous_data = fetch(previous["key"])
+            previous_fp = fingerprint(previous_data)
+        except Exception as e:
+            logger.warning(f"Could not load previous capture {previous['url']} ({e}); treating it as changed.")
+            return fingerprint(data), None, {"changed": True, "method": "missing_previous"}
+        if previous_fp["sha256"] == sha256:
+            return previous_fp, previous_fp, {"changed": False, "method": "sha256"}
+
+    with Image.open(io.BytesIO(data)) as image:
+        new_fp = fingerprint(data, image)
+        if (new_fp["width"], new_fp["height"]) != (previous_fp["width"], previous_fp["height"]):
+            return new_fp, previous_fp, {"changed": True, "method": "size",
+                                         "previous_size": [previous_fp["width"], previous_fp["height"]], "size": [new_fp["width"], new_fp["height"]]}
+        distance = hamming(new_fp["phash"], previous_fp["phash"])
+        if distance > PHASH_CHANGE_DISTANCE:
+            return new_fp, previous_fp, {"changed": True, "method": "phash", "phash_distance": distance}
+        try:
+            previous_data = previous_data or fetch(previous["key"])
+        except Exception as e:
+            logger.warning(f"Could not load previous capture {previous['url']} ({e}); treating it as changed.")
+            return new_fp, previous_fp, {"changed": True, "method": "missing_previous", "phash_distance": distance}
+        with Image.open(io.BytesIO(previous_data)) as previous_image:
+            changed_pixels, bbox = pixel_diff(image, previous_image)
+    return new_fp, previous_fp, {
+        "changed": changed_pixels >= PIXEL_DIFF_MIN_PIXELS, "method": "pixels", "phash_distance": distance,
+        "changed_pixels": changed_pixels, "changed_ratio": round(changed_pixels / (new_fp["width"] * new_fp["height"]), 6),
+        "bbox": list(bbox) if bbox else None,
+    }
+
+
+# --- Screens --- #
+
+def screen_units(image_url: str, metadata: Optional[dict]) -> List[dict]:
+    """The stored images making up a screen: its tiles for tiled captures, else the one image."""
+    tiles = (metadata or {}).get("tiles")
+    if tiles:
+        return [{"key": tile["key"], "url": tile["url"], "fingerprint": tile.get("fingerprint")} for tile in tiles["tiles"]]
+    return [{"key": object_key(image_url), "url": image_url, "fingerprint": (metadata or {}).get("fingerprint")}]
+
+
+def with_fingerprints(metadata: Optional[dict], fingerprints: List[Optional[dict]]) -> dict:
+    """A copy of the screen metadata with a fingerprint per unit (JSON columns need a new object)."""
+    metadata = dict(metadata or {})
+    if metadata.get("tiles"):
+        tiles = metadata["tiles"]
+        metadata["tiles"] = {**tiles, "tiles": [{**tile, "fingerprint": fp} for tile, fp in zip(tiles["tiles"], fingerprints)]}
+    elif fingerprints:
+        metadata["fingerprint"] = fingerprints[0]
+    return metadata
+
+
+class RecaptureSpool:
+    """Upload callable for page_capture.capture_full_page that holds objects back.
+
+    Each image handed to it is compared with the screen's stored image at the same position
+    and spooled (in memory up to RECAPTURE_SPOOL_MAX_BYTES, then on disk). Afterwards,
+    `flush()` uploads everything if the screen changed; `close()` drops it otherwise.
+    """
+
+    def __init__(self, previous_units: List[dict], fetch: Callable[[Optional[str]], bytes] = _read_object):
+        self.previous_units = previous_units
+        self.fetch = fetch
+        self.fingerprints = []
+        self.previous_fingerprints = [unit["fingerprint"] for unit in previous_units]
+        self.changes = [] # Comparisons of the units that changed
+        self.units = 0
+        self._spooled = [] # (key, content_type, file)
+
+    def __call__(self, key: str, data: bytes, content_type: str) -> str:
+        n = self.units
+        self.units += 1
+        if n >= len(self.previous_units):
+            self.fingerprints.append(fingerprint(data))
+            self.changes.append({"unit": n, "changed": True, "method": "added"})
+        elif self.changes:
+            self.fingerprints.append(fingerprint(data)) # Already changed; no need to compare the rest
+        else:
+            new_fp, previous_fp, comparison = compare_image(data, self.previous_units[n], self.fetch)
+            self.fingerprints.append(new_fp)
+            self.previous_fingerprints[n] = previous_fp
+            if comparison["changed"]:
+                self.changes.append({"unit": n, **comparison})
+        spooled = SpooledTemporaryFile(max_size=RECAPTURE_SPOOL_MAX_BYTES)
+        spooled.write(data)
+        self._spooled.append((key, content_type, spooled))
+        return public_url(key)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.changes) or self.units != len(self.previous_units)
+
+    def summary(self) -> dict:
+        if self.units < len(self.previous_units):
+            return {"changed": True, "method": "removed", "units": self.units, "previous_units": len(self.previous_units)}
+        return {"changed": self.changed, "units": self.units, "changes": self.changes}
+
+    def flush(self, upload: Callable[[str, bytes, str], str]):
+        for key, content_type, spooled in self._spooled:
+            spooled.seek(0)
+            upload(key, spooled.read(), content_type)
+        self.close()
+
+    def close(self):
+        for _, _, spooled in self._spooled:
+            spooled.close()
+        self._spooled = []
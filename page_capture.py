@@ -0,0 +1,139 @@
+"""
+Memory-bounded full-page screenshots.
+
+`page.screenshot(full_page=True)` on a very tall page makes Chromium rasterize, encode and
+ship one enormous bitmap; 20k+ px marketing pages push the browser and the worker to several
+GB. Pages taller than TILED_CAPTURE_THRESHOLD_PX are instead captured as fixed-height tiles:
+scroll to each band (so lazy-loaded content appears), shoot just that clip, upload it and drop
+it before shooting the next. Peak memory is bounded by one tile
+(width x CAPTURE_TILE_HEIGHT_PX x DPR), whatever the page height.
+
+A tiled Screen keeps its tiles as a manifest in metadata["tiles"]. Clients can render the tiles
+in sequence, or a background task can stitch them into one PNG later (`iter_stitched_png`
+streams the stitched image row by row, again holding one tile at a time).
+"""
+import os
+import zlib
+import struct
+import logging
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TILED_CAPTURE_THRESHOLD_PX = int(os.environ.get("TILED_CAPTURE_THRESHOLD_PX", "8000")) # CSS px; shorter pages are shot in one go
+CAPTURE_TILE_HEIGHT_PX = int(os.environ.get("CAPTURE_TILE_HEIGHT_PX", "2000")) # CSS px per tile: the memory knob
+CAPTURE_MAX_PAGE_HEIGHT_PX = int(os.environ.get("CAPTURE_MAX_PAGE_HEIGHT_PX", "60000")) # Stops infinite-scroll pages
+TILE_SETTLE_MS = int(os.environ.get("TILE_SETTLE_MS", "150")) # Lets lazy loaders react to each scroll
+
+PAGE_HEIGHT_JS = "() => Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0)"
+
+# Fixed/sticky elements (headers, cookie bars) would otherwise repeat at the top of every tile
+HIDE_FIXED_JS = """() => {
+    for (const el of document.querySelectorAll("body *")) {
+        const position = getComputedStyle(el).position;
+        if (position === "fixed" || position === "sticky") {
+            el.dataset.flowvaultVisibility = el.style.getPropertyValue("visibility");
+            el.style.setProperty("visibility", "hidden", "important");
+        }
+    }
+}"""
+RESTORE_FIXED_JS = """() => {
+    for (const el of document.querySelectorAll("[data-flowvault-visibility]")) {
+        el.style.setProperty("visibility", el.dataset.flowvaultVisibility);
+        delete el.dataset.flowvaultVisibility;
+    }
+}"""
+
+
+def tile_object_key(screen_key: str, index: int) -> str:
+    base = screen_key[:-len(".png")] if screen_key.endswith(".png") else screen_key
+    return f"{base}_tile_{index + 1:02d}.png"
+
+
+def png_size(data: bytes) -> Tuple[int, int]:
+    """(width, height) from the PNG header, without decoding the image."""
+    return struct.unpack(">II", data[16:24])
+
+
+def capture_full_page(page, key: str, upload: Callable[[str, bytes, str], str],
+                      threshold: int = TILED_CAPTURE_THRESHOLD_PX, tile_height: int = CAPTURE_TILE_HEIGHT_PX) -> Tuple[str, Optional[dict]]:
+    """Screenshot the whole page to storage under `key`.
+
+    Returns (image_url, tiles manifest or None). Short pages are one object at `key`; tall pages
+    are uploaded tile by tile and image_url points at the first tile until they are stitched.
+    """
+    height = page.evaluate(PAGE_HEIGHT_JS)
+    if height <= threshold:
+        return upload(key, page.screenshot(full_page=True), "image/png"), None
+    return _capture_tiles(page, key, upload, height, tile_height)
+
+
+def _capture_tiles(page, key: str, upload, height: int, tile_height: int) -> Tuple[str, dict]:
+    width = page.evaluate("() => document.documentElement.clientWidth")
+    height = min(height, CAPTURE_MAX_PAGE_HEIGHT_PX)
+    tiles = []
+    y = 0
+    pixel_width = 0
+    try:
+        while y < height:
+            page.evaluate("y => window.scrollTo(0, y)", y)
+            page.wait_for_timeout(TILE_SETTLE_MS)
+            if len(tiles) == 1:
+                page.evaluate(HIDE_FIXED_JS)
+            # Lazy content can grow the page as we scroll
+            height = min(max(height, page.evaluate(PAGE_HEIGHT_JS)), CAPTURE_MAX_PAGE_HEIGHT_PX)
+            band = min(tile_height, height - y)
+            png = page.screenshot(full_page=True, clip={"x": 0, "y": y, "width": width, "height": band})
+            pixel_width, pixel_height = png_size(png)
+            tile_key = tile_object_key(key, len(tiles))
+            tiles.append({"key": tile_key, "url": upload(tile_key, png, "image/png"), "y": y, "height": band, "pixel_height": pixel_height})
+            del png # Only one tile is ever held
+            y += band
+    finally:
+        page.evaluate(RESTORE_FIXED_JS)
+        page.evaluate("() => window.scrollTo(0, 0)")
+
+    logger.info(f"Captured {y}px tall page as {len(tiles)} tiles of {tile_height}px ({key}).")
+    manifest = {
+        "width": width, "height": y, "tile_height": tile_height,
+        "pixel_width": pixel_width, "pixel_height": sum(tile["pixel_height"] for tile in tiles),
+        "truncated": y >= CAPTURE_MAX_PAGE_HEIGHT_PX,
+        "stitched": False, "stitched_key": key,
+        "tiles": tiles,
+    }
+    return tiles[0]["url"], manifest
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff)
+
+
+def iter_stitched_png(tiles: Iterable[bytes], width: int, height: int) -> Iterator[bytes]:
+    """One PNG from vertically stacked tile PNGs, encoded row by row as tiles arrive.
+
+    Holds one decoded tile at a time; `width`/`height` (pixels) come from the tiles manifest.
+    """
+    from PIL import Image # Only needed by the stitching task
+    import io
+
+    compressor = zlib.compressobj(6)
+    yield b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) # 8-bit RGB
+    rows_written = 0
+    for data in tiles:
+        with Image.open(io.BytesIO(data)) as tile:
+            raw = tile.convert("RGB").tobytes()
+            tile_width, tile_height = tile.size
+        if tile_width != width:
+            raise ValueError(f"Tile width {tile_width} does not match manifest width {width}")
+        stride = width * 3
+        tile_height = min(tile_height, height - rows_written)
+        compressed = b"".join(
+            compressor.compress(b"\x00" + raw[row * stride:(row + 1) * stride]) for row in range(tile_height) # filter type 0
+        )
+        del raw
+        rows_written += tile_height
+        if compressed:
+            yield _png_chunk(b"IDAT", compressed)
+    if rows_written != height:
+        raise ValueError(f"Tiles cover {rows_written} rows, manifest says {height}")
+    yield _png_chunk(b"IDAT", compressor.flush()) + _png_chunk(b"IEND", b"")
@@ -0,0 +1,233 @@
+"""
+Soft delete, then purge in the background, for users, teams and collections.
+
+Deleting one of them in the request only marks it (deleted_at, which hides it right away) and
+records a PurgeJob. The purge task, which runs on the maintenance queue, then removes everything
+under it following a fixed plan of steps. Each step deletes one bounded batch per transaction
+until nothing is left, so no statement holds many row locks or runs long. Stored screenshots go
+in bulk: each swipe file's objects share a prefix and are removed 1000 per DeleteObjects call,
+before the rows that point at them.
+
+Each batch commits together with the job's checkpoint (completed_steps) and counters
+(progress), so the job can be stopped anywhere and resumes exactly where it left off. Every
+invocation does at most PURGE_BATCHES_PER_TASK batches and then re-enqueues itself. That keeps
+a single huge purge from holding a worker, and admins can follow it in the admin purges view.
+"""
+import os
+import uuid
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import select, text, update
+
+from models import Collection, CollectionSwipeFile, PurgeJob, SwipeFile, Team, User, bump_version
+from storage import delete_prefix
+from celery_client import send_purge_deleted
+from http_cache import DELETED_VERSION, invalidate_collection
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = int(os.environ.get("PURGE_BATCH_SIZE", "1000")) # Rows per DELETE
+PURGE_SWIPE_FILE_BATCH_SIZE = int(os.environ.get("PURGE_SWIPE_FILE_BATCH_SIZE", "25")) # Swipe files (with their screens) per transaction
+PURGE_BATCHES_PER_TASK = int(os.environ.get("PURGE_BATCHES_PER_TASK", "50"))
+
+PURGE_ENTITY_TYPES = {"user": User, "team": Team, "collection": Collection}
+
+# Collections and teams that go with a user or team (all soft-deleted with it)
+_USER_TEAMS = "SELECT id FROM teams WHERE owner_user_id = :id"
+_USER_COLLECTIONS = f"SELECT id FROM collections WHERE owner_user_id = :id OR team_id IN ({_USER_TEAMS})"
+_TEAM_COLLECTIONS = "SELECT id FROM collections WHERE team_id = :id"
+
+# session.info key: (collection id, version) pairs to drop from the public cache once the transaction commits
+_PENDING_INVALIDATIONS = "invalidate_collections"
+
+
+def _delete_rows(table: str, where: str) -> Callable:
+    """A step deleting up to PURGE_BATCH_SIZE rows of `table` matching `where` per call."""
+    # ctid = ANY(ARRAY(...)) is a TID scan over exactly the selected rows; works for composite keys too
+    statement = text(
+        f"DELETE FROM {table} WHERE ctid = ANY(ARRAY(SELECT ctid FROM {table} WHERE {where} LIMIT :limit))"
+    )
+
+    def step(db, entity_id: str) -> Dict[str, int]:
+        return {table: db.execute(statement, {"id": entity_id, "limit": PURGE_BATCH_SIZE}).rowcount}
+    return step
+
+
+def _invalidate_after_commit(db, collection_versions):
+    db.info.setdefault(_PENDING_INVALIDATIONS, []).extend(collection_versions)
+
+
+def _commit(db):
+    """Commits, then invalidates the cached collections the transaction changed."""
+    db.commit()
+    for collection_id, version in db.info.pop(_PENDING_INVALIDATIONS, []):
+        invalidate_collection(collection_id, version)
+
+
+def _bump_collection_versions(db, collection_ids):
+    """version = version + 1 on each collection (their content changed), invalidated by _commit."""
+    if collection_ids:
+        _invalidate_after_commit(db, db.execute(
+            update(Collection).where(Collection.id.in_(collection_ids)).values(version=Collection.version + 1)
+            .returning(Collection.id, Collection.version)
+        ).all())
+
+
+def _delete_swipe_files(db, ids: List[str], job_ids: List[str]) -> Dict[str, int]:
+    """Deletes swipe files with their screens, versions and stored objects (job_ids: their capture jobs).
+
+    The collections they were in get a new version; commit with _commit.
+    """
+    _bump_collection_versions(db, db.scalars(
+        select(CollectionSwipeFile.collection_id).where(CollectionSwipeFile.swipe_file_id.in_(ids)).distinct()
+    ).all())
+    # Every object of a capture (screens, tiles, recaptured versions) is under its job's prefix.
+    # Objects go first: if this transaction is lost, the rows are still there to find them again.
+    counts = {"objects": sum(delete_prefix(f"mcp_jobs/{job_id}/") for job_id in job_ids)}
+    for table in ("screens", "swipe_file_versions", "collection_swipe_files"):
+        counts[table] = db.execute(text(f"DELETE FROM {table} WHERE swipe_file_id = ANY(:ids)"), {"ids": ids}).rowcount
+    # mcp_jobs and swipe_files reference each other; the jobs themselves go in a later step
+    db.execute(text("UPDATE mcp_jobs SET swipe_file_id = NULL WHERE id = ANY(:job_ids)"), {"job_ids": job_ids})
+    counts["swipe_files"] = db.execute(text("DELETE FROM swipe_files WHERE id = ANY(:ids)"), {"ids": ids}).rowcount
+    return counts
+
+
+def _purge_swipe_files(db, user_id: str) -> Dict[str, int]:
+    """Step: the next batch of a user's swipe files with their screens, versions and stored objects."""
+    rows = db.execute(
+        text("SELECT id, mcp_job_id FROM swipe_files WHERE owner_user_id = :id LIMIT :limit"),
+        {"id": user_id, "limit": PURGE_SWIPE_FILE_BATCH_SIZE},
+    ).all()
+    if not rows:
+        return {}
+    return _delete_swipe_files(db, [row.id for row in rows], [row.mcp_job_id for row in rows if row.mcp_job_id])
+
+
+def delete_swipe_file(db, swipe_file: SwipeFile) -> Dict[str, int]:
+    """Deletes one swipe file right away (a single capture, so bounded) and updates the collections it was in."""
+    ids, job_ids = [swipe_file.id], [swipe_file.mcp_job_id] if swipe_file.mcp_job_id else []
+    db.expunge(swipe_file) # Removed with plain SQL below
+    counts = _delete_swipe_files(db, ids, job_ids)
+    _commit(db)
+    return counts
+
+
+def _clear_settings_author(db, user_id: str) -> Dict[str, int]:
+    db.execute(text("UPDATE runtime_settings SET updated_by = NULL WHERE updated_by = :id"), {"id": user_id})
+    return {} # One statement; the step is done
+
+
+# Steps run in order (children before parents, for the foreign keys); each runs until it deletes nothing
+PURGE_PLANS: Dict[str, List[Tuple[str, Callable]]] = {
+    "collection": [
+        ("collection_swipe_files", _delete_rows("collection_swipe_files", "collection_id = :id")),
+        ("collections", _delete_rows("collections", "id = :id")),
+    ],
+    "team": [
+        ("team_members", _delete_rows("team_members", "team_id = :id")),
+        ("collection_swipe_files", _delete_rows("collection_swipe_files", f"collection_id IN ({_TEAM_COLLECTIONS})")),
+        ("collections", _delete_rows("collections", "team_id = :id")),
+        ("teams", _delete_rows("teams", "id = :id")),
+    ],
+    "user": [
+        ("swipe_files", _purge_swipe_files),
+        ("mcp_jobs", _delete_rows("mcp_jobs", "submitted_by_user_id = :id")),
+        ("collection_swipe_files", _delete_rows("collection_swipe_files", f"collection_id IN ({_USER_COLLECTIONS})")),
+        ("collections", _delete_rows("collections", f"id IN ({_USER_COLLECTIONS})")),
+        ("team_members", _delete_rows("team_members", f"user_id = :id OR team_id IN ({_USER_TEAMS})")),
+        ("teams", _delete_rows("teams", "owner_user_id = :id")),
+        ("runtime_settings", _clear_settings_author),
+        ("users", _delete_rows("users", "id = :id")),
+    ],
+}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def soft_delete(db, entity, requested_by: str = None) -> PurgeJob:
+    """Marks a user, team or collection (and what goes with it) deleted and queues its purge.
+
+    Only a handful of rows are touched here: the entity, the collections and teams that go with
+    it, and (for users) the tracking flag of their monitored swipe files. Each gets a new version
+    (ETags), and every deleted collection is dropped from the public cache after the commit.
+    """
+    entity_type = next(name for name, model in PURGE_ENTITY_TYPES.items() if isinstance(entity, model))
+    now = _utcnow()
+    entity.deleted_at = now
+    if entity_type == "collection":
+        bump_version(entity)
+        deleted_collection_ids = [entity.id]
+    elif entity_type == "team":
+        bump_version(entity)
+        deleted_collection_ids = db.scalars(
+            update(Collection).where(Collection.team_id == entity.id, Collection.deleted_at.is_(None))
+            .values(deleted_at=now, version=Collection.version + 1).returning(Collection.id),
+            execution_options={"synchronize_session": False},
+        ).all()
+    else:
+        for team in db.query(Team).filter(Team.owner_user_id == entity.id, Team.deleted_at.is_(None)):
+            team.deleted_at = now
+            bump_version(team)
+        deleted_collection_ids = db.scalars(text(
+            f"UPDATE collections SET deleted_at = :now, version = version + 1 WHERE id IN ({_USER_COLLECTIONS}) AND deleted_at IS NULL RETURNING id"
+        ), {"id": entity.id, "now": now}).all()
+        # Stop recaptures now rather than when the purge reaches the swipe files
+        db.query(SwipeFile).filter(SwipeFile.owner_user_id == entity.id, SwipeFile.is_tracked.is_(True)).update(
+            {"is_tracked": False, "next_recapture_at": None, "version": SwipeFile.version + 1}, synchronize_session=False)
+    _invalidate_after_commit(db, [(collection_id, DELETED_VERSION) for collection_id in deleted_collection_ids])
+
+    job = PurgeJob(id=str(uuid.uuid4()), entity_type=entity_type, entity_id=entity.id,
+                   requested_by_user_id=requested_by, status="pending", completed_steps=0, progress={})
+    db.add(job)
+    _commit(db)
+    send_purge_deleted(job.id)
+    logger.info(f"{entity_type.capitalize()} {entity.id} soft-deleted by {requested_by}; purge job {job.id} queued.")
+    return job
+
+
+def run_purge_batches(db, job: PurgeJob, max_batches: int = PURGE_BATCHES_PER_TASK) -> bool:
+    """Runs up to `max_batches` batches of the job's plan, committing each; True when the purge is done."""
+    plan = PURGE_PLANS[job.entity_type]
+    if job.status != "running":
+        job.status = "running"
+        db.commit()
+    for _ in range(max_batches):
+        if job.completed_steps >= len(plan):
+            break
+        name, step = plan[job.completed_steps]
+        counts = step(db, job.entity_id)
+        if sum(counts.values()) == 0:
+            job.completed_steps += 1 # Nothing left for this step
+        progress = dict(job.progress or {})
+        for key, deleted in counts.items():
+            progress[key] = progress.get(key, 0) + deleted
+        job.progress = progress
+        _commit(db) # The batch and the checkpoint commit together
+    if job.completed_steps >= len(plan):
+        job.status = "completed"
+        job.completed_at = _utcnow()
+        db.commit()
+        return True
+    return False
+
+
+def purge_job_status(job: PurgeJob) -> dict:
+    plan = PURGE_PLANS[job.entity_type]
+    return {
+        "purge_job_id": job.id,
+        "entity_type": job.entity_type,
+        "entity_id": job.entity_id,
+        "requested_by": job.requested_by_user_id,
+        "status": job.status,
+        "current_step": plan[job.completed_steps][0] if job.completed_steps < len(plan) else None,
+        "completed_steps": job.completed_steps,
+        "total_steps": len(plan),
+        "deleted": job.progress or {},
+        "error_message": job.error_message,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "completed_at": job.completed_at,
+    }
@@ -0,0 +1,47 @@
+"""
+Shared Redis connections for FlowVault.
+
+The broker connection (Celery queues) and the application Redis (cache, pub/sub,
+coordination keys) are configured separately because they can point at different instances.
+"""
+import os
+import redis
+import redis.asyncio as aioredis
+
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
+REDIS_URL = os.environ.get("REDIS_URL", CELERY_BROKER_URL)
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "2"))
+
+_sync_client = None
+_async_client = None
+_async_broker_client = None
+
+
+def get_redis() -> redis.Redis:
+    """Process-wide synchronous client (connection pooled, safe to share between threads)."""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(
+            REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT, health_check_interval=30
+        )
+    return _sync_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Process-wide asyncio client for use inside FastAPI endpoints."""
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(
+            REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT, health_check_interval=30
+        )
+    return _async_client
+
+
+def get_async_broker_redis() -> aioredis.Redis:
+    """asyncio client for the Celery broker (queue inspection only)."""
+    global _async_broker_client
+    if _async_broker_client is None:
+        _async_broker_client = aioredis.Redis.from_url(
+            CELERY_BROKER_URL, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+        )
+    return _async_broker_client
@@ -1,119 +1,213 @@
-"""
 # /home/ubuntu/flowvault_backend_fastapi/routers/admin_router.py
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
 import logging
+import redis
 
-# Placeholder for database connection/session and authentication/authorization dependency
-# from ..dependencies import get_db_session, require_admin_user
+from auth import ADMIN_EMAIL_DOMAIN, get_admin_user, get_db, get_read_db
+from models import McpJob, PurgeJob, SwipeFile, User
+from runtime_settings import runtime_settings
+from celery_client import send_purge_deleted
+from purge import delete_swipe_file, purge_job_status, soft_delete
+
+from fast_json import FAST_JSON_RESPONSES, fast_list_response
+from http_cache import make_etag, etag_matches, cache_headers, not_modified
 
 logger = logging.getLogger(__name__)
 router = APIRouter(
     prefix="/api/v1/admin",
     tags=["admin"],
-    # dependencies=[Depends(require_admin_user)], # Add admin auth dependency later
 )
 
-# Mock data - replace with actual DB interaction and service calls
-MOCK_DB_USERS = {
-    "u1": {"id": "u1", "email": "admin@flowvault.com", "name": "Admin User", "role": "admin", "createdAt": "2024-01-01T10:00:00Z", "swipeFilesCount": 10, "is_active": True},
-    "u2": {"id": "u2", "email": "user1@example.com", "name": "Alice Wonderland", "role": "user", "createdAt": "2024-02-15T11:00:00Z", "swipeFilesCount": 5, "is_active": True},
-    "u3": {"id": "u3", "email": "user2@example.com", "name": "Bob The Builder", "role": "user", "createdAt": "2024-03-20T12:00:00Z", "swipeFilesCount": 2, "is_active": False},
-}
-
-MOCK_DB_SWIPE_FILES = {
-    "sf1": {"id": "sf1", "title": "Acme Onboarding", "url": "https://acme.com", "user_id": "u2", "status": "completed", "created_at": "2024-05-01T14:00:00Z"},
-    "sf2": {"id": "sf2", "title": "Beta Co Checkout", "url": "https://beta.co", "user_id": "u3", "status": "pending", "created_at": "2024-05-10T15:00:00Z"},
-    "sf3": {"id": "sf3", "title": "Gamma Inc Settings", "url": "https://gamma.inc", "user_id": "u1", "status": "failed", "created_at": "2024-05-11T16:00:00Z"},
-}
-
 class AdminUserResponse(BaseModel):
     id: str
     email: str
     name: Optional[str] = None
     role: str
-    createdAt: str
+    createdAt: Optional[datetime] = None
     swipeFilesCount: int
     is_active: bool
 
 class AdminSwipeFileResponse(BaseModel):
     id: str
-    title: str
+    title: Optional[str] = None
     url: str
     user_id: str
     status: str
-    created_at: str
+    created_at: Optional[datetime] = None
 
 class UserUpdateAdmin(BaseModel):
     role: Optional[str] = None
     is_active: Optional[bool] = None
     name: Optional[str] = None
 
+# Rows already shaped like the response models, so listings can skip pydantic (fast_json.py)
+_swipe_files_count = (
+    select(func.count(SwipeFile.id)).where(SwipeFile.owner_user_id == User.id).correlate(User).scalar_subquery()
+)
+ADMIN_USERS_QUERY = select(
+    User.id,
+    User.email,
+    User.name,
+    case((User.email.endswith(ADMIN_EMAIL_DOMAIN), "admin"), else_="user").label("role"), # Same rule as get_admin_user
+    User.created_at.label("createdAt"),
+    _swipe_files_count.label("swipeFilesCount"),
+    User.deleted_at.is_(None).label("is_active"), # Soft-deleted accounts stay listed until purged
+)
+ADMIN_SWIPE_FILES_QUERY = select(
+    SwipeFile.id,
+    SwipeFile.title,
+    SwipeFile.original_url.label("url"),
+    SwipeFile.owner_user_id.label("user_id"),
+    func.coalesce(McpJob.status, "completed").label("status"), # Swipe files are created when their job completes
+    SwipeFile.created_at,
+).outerjoin(McpJob, McpJob.id == SwipeFile.mcp_job_id)
+
+def _list_response(rows, model):
+    if FAST_JSON_RESPONSES:
+        # Admin listings are the largest responses; skip per-item validation and encode with orjson
+        return fast_list_response(rows, model)
+    return [dict(row._mapping) for row in rows]
+
 @router.get("/users", response_model=List[AdminUserResponse])
-async def admin_get_users():
-    # In a real app, ensure only admins can access this
-    return list(MOCK_DB_USERS.values())
+def admin_get_users(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0),
+                    admin_user: User = Depends(get_admin_user), db: Session = Depends(get_read_db)):
+    # Listings are read-only: served from a replica when one is caught up
+    rows = db.execute(ADMIN_USERS_QUERY.order_by(User.created_at.desc(), User.id).limit(limit).offset(offset)).all()
+    return _list_response(rows, AdminUserResponse)
 
 @router.get("/users/{user_id}", response_model=AdminUserResponse)
-async def admin_get_user(user_id: str):
-    if user_id not in MOCK_DB_USERS:
+def admin_get_user(user_id: str, admin_user: User = Depends(get_admin_user), db: Session = Depends(get_read_db)):
+    row = db.execute(ADMIN_USERS_QUERY.where(User.id == user_id)).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return MOCK_DB_USERS[user_id]
+    return dict(row._mapping)
 
 @router.put("/users/{user_id}", response_model=AdminUserResponse)
-async def admin_update_user(user_id: str, user_update: UserUpdateAdmin):
-    if user_id not in MOCK_DB_USERS:
+def admin_update_user(user_id: str, user_update: UserUpdateAdmin, admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    user = db.get(User, user_id)
+    if user is None or user.deleted_at is not None:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    user_data = MOCK_DB_USERS[user_id]
-    update_data = user_update.model_dump(exclude_unset=True)
-    
-    for key, value in update_data.items():
-        user_data[key] = value
-        
-MOCK_DB_USERS[user_id] = user_data
-    logger.info(f"Admin updated user {user_id}. New data: {user_data}")
-    return user_data
-
-@router.delete("/users/{user_id}", status_code=204)
-async def admin_delete_user(user_id: str):
-    if user_id not in MOCK_DB_USERS:
+    if user_update.role is not None:
+        # Not stored: admins are recognised by their email domain (get_admin_user)
+        raise HTTPException(status_code=422, detail="A user's role follows their email domain and can't be set")
+    if user_update.name is not None:
+        user.name = user_update.name
+    if user_update.is_active is False:
+        # Deactivating is deleting: the same soft delete and purge as DELETE /users/{user_id}
+        soft_delete(db, user, requested_by=admin_user.id)
+    else:
+        db.commit()
+    logger.info(f"Admin {admin_user.id} updated user {user_id}: {user_update.model_dump(exclude_unset=True)}")
+    return dict(db.execute(ADMIN_USERS_QUERY.where(User.id == user_id)).one()._mapping)
+
+@router.delete("/users/{user_id}", status_code=202)
+def admin_delete_user(user_id: str, admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    # Soft delete: the account is locked out and hidden now; their swipe files, screenshots,
+    # collections and teams are removed in batches by the purge task (progress: /purges/{id})
+    user = db.get(User, user_id)
+    if user is None or user.deleted_at is not None:
         raise HTTPException(status_code=404, detail="User not found")
-    # Add more robust deletion logic (e.g., soft delete, handle related data)
-    del MOCK_DB_USERS[user_id]
+    job = soft_delete(db, user, requested_by=admin_user.id)
     logger.info(f"Admin deleted user {user_id}.")
-    return
+    return purge_job_status(job)
 
 @router.get("/swipefiles", response_model=List[AdminSwipeFileResponse])
-async def admin_get_swipe_files():
-    return list(MOCK_DB_SWIPE_FILES.values())
+def admin_get_swipe_files(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0),
+                          admin_user: User = Depends(get_admin_user), db: Session = Depends(get_read_db)):
+    rows = db.execute(ADMIN_SWIPE_FILES_QUERY.order_by(SwipeFile.created_at.desc(), SwipeFile.id).limit(limit).offset(offset)).all()
+    return _list_response(rows, AdminSwipeFileResponse)
 
 @router.get("/swipefiles/{swipe_file_id}", response_model=AdminSwipeFileResponse)
-async def admin_get_swipe_file(swipe_file_id: str):
-    if swipe_file_id not in MOCK_DB_SWIPE_FILES:
+def admin_get_swipe_file(swipe_file_id: str, request: Request, response: Response,
+                         admin_user: User = Depends(get_admin_user), db: Session = Depends(get_read_db)):
+    # Revalidation reads only SwipeFile.version
+    version = db.execute(select(SwipeFile.version).where(SwipeFile.id == swipe_file_id)).scalar()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Swipe file not found")
+    etag = make_etag("swipe-file", swipe_file_id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    row = db.execute(ADMIN_SWIPE_FILES_QUERY.add_columns(SwipeFile.version).where(SwipeFile.id == swipe_file_id)).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Swipe file not found")
-    return MOCK_DB_SWIPE_FILES[swipe_file_id]
+    response.headers.update(cache_headers(make_etag("swipe-file", swipe_file_id, row.version)))
+    return dict(row._mapping)
 
 @router.delete("/swipefiles/{swipe_file_id}", status_code=204)
-async def admin_delete_swipe_file(swipe_file_id: str):
-    if swipe_file_id not in MOCK_DB_SWIPE_FILES:
+def admin_delete_swipe_file(swipe_file_id: str, admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    swipe_file = db.get(SwipeFile, swipe_file_id)
+    if swipe_file is None:
         raise HTTPException(status_code=404, detail="Swipe file not found")
-    del MOCK_DB_SWIPE_FILES[swipe_file_id]
-    logger.info(f"Admin deleted swipe file {swipe_file_id}.")
+    counts = delete_swipe_file(db, swipe_file)
+    logger.info(f"Admin {admin_user.id} deleted swipe file {swipe_file_id}: {counts}.")
     return
 
-# Placeholder for system settings endpoints
+# Purges of soft-deleted users, teams and collections (purge.py)
+@router.get("/purges")
+def admin_get_purges(status: Optional[str] = None, limit: int = Query(50, ge=1, le=500),
+                     admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    # From the primary: progress is committed batch by batch and should be current
+    query = db.query(PurgeJob).order_by(PurgeJob.created_at.desc())
+    if status is not None:
+        query = query.filter(PurgeJob.status == status)
+    return [purge_job_status(job) for job in query.limit(limit)]
+
+@router.get("/purges/{purge_job_id}")
+def admin_get_purge(purge_job_id: str, admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    job = db.get(PurgeJob, purge_job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return purge_job_status(job)
+
+@router.post("/purges/{purge_job_id}/resume", status_code=202)
+def admin_resume_purge(purge_job_id: str, admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    # Failed purges keep their checkpoint; this picks them up where they stopped
+    job = db.get(PurgeJob, purge_job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    if job.status == "completed":
+        raise HTTPException(status_code=409, detail="Purge job already completed")
+    job.status = "pending"
+    job.error_message = None
+    db.commit()
+    send_purge_deleted(job.id)
+    logger.info(f"Admin {admin_user.id} resumed purge job {purge_job_id}.")
+    return purge_job_status(job)
+
+# Runtime settings (runtime_settings.py): saved to Postgres, pushed to every API and worker process
+class SettingsUpdate(BaseModel):
+    settings: Dict[str, Any]
+
+def _save_settings(db: Session, changes: dict, admin_user: User) -> dict:
+    try:
+        return runtime_settings.update(db, changes, updated_by=admin_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except redis.RedisError as e:
+        # Saved, but other processes only pick it up on their next full reload; saving again is safe
+        logger.error(f"Runtime settings {list(changes)} saved but not broadcast: {e}")
+        raise HTTPException(status_code=503, detail="Settings saved but could not be broadcast yet; please retry")
+
 @router.get("/settings")
-async def admin_get_settings():
-    # Mock settings
-    return {"maintenance_mode": False, "api_key_status": "active", "feature_flags": {"new_dashboard": True}}
+async def admin_get_settings(admin_user: User = Depends(get_admin_user)):
+    # This process's cached copy, which is what it is enforcing right now
+    return runtime_settings.snapshot()
 
-@router.post("/settings/maintenance")
-async def admin_toggle_maintenance_mode(enable: bool):
-    logger.info(f"Admin set maintenance mode to: {enable}")
-    # Logic to update system setting
-    return {"message": f"Maintenance mode set to {enable}"}
+@router.put("/settings")
+def admin_update_settings(update: SettingsUpdate, admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    return _save_settings(db, update.settings, admin_user)
 
-"""
+@router.post("/settings/maintenance")
+def admin_toggle_maintenance_mode(enable: bool, message: Optional[str] = None, admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    changes = {"maintenance_mode": enable}
+    if message is not None:
+        changes["maintenance_message"] = message
+    snapshot = _save_settings(db, changes, admin_user)
+    logger.info(f"Admin {admin_user.id} set maintenance mode to: {enable}")
+    return {"message": f"Maintenance mode set to {enable}", **snapshot}
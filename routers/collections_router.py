@@ -1,33 +1,30 @@
-"""
 # /home/ubuntu/flowvault_backend_fastapi/routers/collections_router.py
 
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 import logging
 
-# Placeholder for database connection/session and authentication dependency
-# from ..dependencies import get_db_session, get_current_active_user
+from fast_json import FAST_JSON_RESPONSES, fast_list_response
+from http_cache import make_etag, etag_matches, cache_headers, not_modified, get_cached_public_collection, cache_public_collection, invalidate_collection
+from auth import get_current_user, get_db, get_read_db
+from models import Collection, CollectionSwipeFile, SwipeFile, Team, TeamMember, User, bump_version
+from celery_client import send_export_collection
+from purge import soft_delete
+from exports import EXPORT_MEDIA_TYPES, EXPORT_STREAM_MAX_SCREENS, count_export_screens, iter_export_items, iter_export, set_export_state, get_export_state, slugify
 
 logger = logging.getLogger(__name__)
 router = APIRouter(
     prefix="/api/v1/collections",
     tags=["collections"],
-    # dependencies=[Depends(get_current_active_user)], # Add auth dependency later
 )
 
-# Mock database for collections (replace with actual DB interaction)
-MOCK_DB_COLLECTIONS = {
-    "c1": {"collection_id": "c1", "user_id": "user123", "team_id": None, "name": "My Favorite Onboarding Flows", "description": "A collection of interesting onboarding flows.", "is_private": True, "swipe_file_ids": ["sf1", "sf2"]},
-    "c2": {"collection_id": "c2", "user_id": None, "team_id": "t1", "name": "Project Phoenix - Checkout Inspirations", "description": "Inspiration for Project Phoenix checkout.", "is_private": False, "swipe_file_ids": ["sf3"]},
-}
-MOCK_DB_SWIPE_FILES_IN_COLLECTION = {
-    ("c1", "sf1"): {"collection_id": "c1", "swipe_file_id": "sf1"},
-    ("c1", "sf2"): {"collection_id": "c1", "swipe_file_id": "sf2"},
-    ("c2", "sf3"): {"collection_id": "c2", "swipe_file_id": "sf3"},
-}
-
 class CollectionBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -50,110 +47,254 @@ class CollectionResponse(CollectionBase):
 class AddSwipeFileToCollectionRequest(BaseModel):
     swipe_file_id: str
 
+# Columns named like CollectionResponse's fields, so listings can skip pydantic (fast_json.py)
+COLLECTION_COLUMNS = (
+    Collection.id.label("collection_id"),
+    Collection.owner_user_id.label("user_id"),
+    Collection.team_id,
+    Collection.name,
+    Collection.description,
+    Collection.is_private,
+)
+
+def _user_team_ids(user_id: str):
+    return select(TeamMember.team_id).join(Team, Team.id == TeamMember.team_id).where(
+        TeamMember.user_id == user_id, Team.deleted_at.is_(None)
+    )
+
+def _collection_response(collection: Collection) -> dict:
+    return {
+        "collection_id": collection.id,
+        "user_id": collection.owner_user_id,
+        "team_id": collection.team_id,
+        "name": collection.name,
+        "description": collection.description,
+        "is_private": collection.is_private,
+    }
+
+def _get_editable_collection(db: Session, collection_id: str, user_id: str) -> Collection:
+    """The collection, locked for update, if `user_id` may change it: its owner, or an owner/admin of its team."""
+    collection = db.get(Collection, collection_id, with_for_update=True)
+    if collection is None or collection.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    if collection.owner_user_id == user_id:
+        return collection
+    role = None
+    if collection.team_id is not None:
+        role = db.query(TeamMember.role).filter(TeamMember.team_id == collection.team_id, TeamMember.user_id == user_id).scalar()
+    if role is None and not _can_view_collection(db, collection, user_id):
+        raise HTTPException(status_code=404, detail="Collection not found")
+    if role not in ("owner", "admin"):
+        raise HTTPException(status_code=403, detail="Not authorized to modify this collection")
+    return collection
+
+def _commit_collection_write(db: Session, collection: Collection):
+    # Every write moves the version (ETags), then drops the shared cache entry for older versions
+    bump_version(collection)
+    db.commit()
+    invalidate_collection(collection.id, collection.version)
+
 @router.post("/", response_model=CollectionResponse, status_code=201)
-async def create_collection(collection: CollectionCreate):
-    # user = Depends(get_current_active_user) # Get current user
-    # user_id = user.id
-    user_id = "user123" # Mock user_id
-    collection_id = str(uuid.uuid4())
-    
-    if collection.team_id and user_id: # Basic validation: if team_id is present, user_id (owner) should be None for the collection record itself, handled by team ownership
-        # Logic to check if user is part of the team and has permission to create collection for the team
-        pass
-
-    new_collection_data = collection.model_dump()
-    new_collection_data["collection_id"] = collection_id
-    if collection.team_id:
-        new_collection_data["user_id"] = None # Team collections are not directly owned by a single user in the `collections` table
-    else:
-        new_collection_data["user_id"] = user_id
-    
-    MOCK_DB_COLLECTIONS[collection_id] = new_collection_data
-    logger.info(f"User {user_id} created collection {collection_id} with name 	{collection.name}")
-    return new_collection_data
+def create_collection(collection: CollectionCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if collection.team_id is not None and collection.team_id not in db.scalars(_user_team_ids(current_user.id)).all():
+        raise HTTPException(status_code=404, detail="Team not found")
+    new_collection = Collection(
+        id=str(uuid.uuid4()),
+        name=collection.name,
+        description=collection.description,
+        is_private=collection.is_private,
+        team_id=collection.team_id,
+        # Team collections are owned by the team, not directly by a single user
+        owner_user_id=None if collection.team_id else current_user.id,
+    )
+    db.add(new_collection)
+    db.commit()
+    logger.info(f"User {current_user.id} created collection {new_collection.id} with name {collection.name}")
+    return _collection_response(new_collection)
 
 @router.get("/", response_model=List[CollectionResponse])
-async def get_user_collections():
-    # user = Depends(get_current_active_user)
-    # user_id = user.id
-    user_id = "user123" # Mock user_id
-    # This should fetch collections where user_id matches OR user is a member of collection.team_id
-    # For simplicity, returning all for now
-    user_cols = [col for col in MOCK_DB_COLLECTIONS.values() if col["user_id"] == user_id or (col["team_id"] and True)] # True is placeholder for team membership check
-    return user_cols
+def get_user_collections(current_user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    # The user's own collections and those of their teams
+    rows = db.execute(
+        select(*COLLECTION_COLUMNS)
+        .where(
+            Collection.deleted_at.is_(None),
+            or_(Collection.owner_user_id == current_user.id, Collection.team_id.in_(_user_team_ids(current_user.id))),
+        )
+        .order_by(Collection.created_at.desc(), Collection.id)
+    ).all()
+    if FAST_JSON_RESPONSES:
+        # Skip per-item response_model validation; the columns are already labelled as the response fields
+        return fast_list_response(rows, CollectionResponse)
+    return [dict(row._mapping) for row in rows]
+
+def _visible_collection_version(db: Session, collection_id: str, user_id: str):
+    # Only what the ETag and the permission check need; the row itself is loaded on a miss
+    return db.execute(
+        select(Collection.version, Collection.is_private).where(
+            Collection.id == collection_id,
+            Collection.deleted_at.is_(None),
+            or_(
+                Collection.is_private.is_(False),
+                Collection.owner_user_id == user_id,
+                Collection.team_id.in_(_user_team_ids(user_id)),
+            ),
+        )
+    ).first()
 
 @router.get("/{collection_id}", response_model=CollectionResponse)
-async def get_collection(collection_id: str):
-    # user = Depends(get_current_active_user)
-    # user_id = user.id
-    if collection_id not in MOCK_DB_COLLECTIONS:
+async def get_collection(
+    collection_id: str,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    # Public collections are served from the shared Redis cache (no DB access, no permission check needed)
+    cached = await get_cached_public_collection(collection_id)
+    if cached:
+        etag, body = cached
+        if etag_matches(request, etag):
+            return not_modified(etag, public=True)
+        return Response(content=body, media_type="application/json", headers=cache_headers(etag, public=True))
+
+    row = await asyncio.to_thread(_visible_collection_version, db, collection_id, current_user.id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    is_public = row.is_private is False
+    etag = make_etag("collection", collection_id, row.version)
+    if etag_matches(request, etag):
+        return not_modified(etag, public=is_public)
+
+    collection = await asyncio.to_thread(db.get, Collection, collection_id)
+    if collection is None or collection.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Collection not found")
-    collection_data = MOCK_DB_COLLECTIONS[collection_id]
-    # Add permission check: user_id must match or user must be part of team_id
+    etag = make_etag("collection", collection_id, collection.version) # It may have moved since the version was read
+    collection_data = _collection_response(collection)
+    if is_public:
+        body = CollectionResponse.model_validate(collection_data).model_dump_json().encode()
+        await cache_public_collection(collection_id, collection.version, etag, body)
+        return Response(content=body, media_type="application/json", headers=cache_headers(etag, public=True))
+    response.headers.update(cache_headers(etag))
     return collection_data
 
 @router.put("/{collection_id}", response_model=CollectionResponse)
-async def update_collection(collection_id: str, collection_update: CollectionUpdate):
-    # user = Depends(get_current_active_user)
-    # user_id = user.id
-    if collection_id not in MOCK_DB_COLLECTIONS:
-        raise HTTPException(status_code=404, detail="Collection not found")
-    
-    # Add permission check here
-    stored_collection_data = MOCK_DB_COLLECTIONS[collection_id]
+def update_collection(collection_id: str, collection_update: CollectionUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    collection = _get_editable_collection(db, collection_id, current_user.id)
     update_data = collection_update.model_dump(exclude_unset=True)
-    updated_collection = stored_collection_data.copy()
-    updated_collection.update(update_data)
-    MOCK_DB_COLLECTIONS[collection_id] = updated_collection
+    if update_data.pop("team_id", collection.team_id) != collection.team_id:
+        raise HTTPException(status_code=400, detail="Collections cannot be moved between teams")
+    if update_data.get("name", collection.name) is None:
+        raise HTTPException(status_code=422, detail="name cannot be null")
+    for key, value in update_data.items():
+        setattr(collection, key, value)
+    _commit_collection_write(db, collection)
     logger.info(f"Collection {collection_id} updated.")
-    return updated_collection
+    return _collection_response(collection)
 
 @router.delete("/{collection_id}", status_code=204)
-async def delete_collection(collection_id: str):
-    # user = Depends(get_current_active_user)
-    # user_id = user.id
-    if collection_id not in MOCK_DB_COLLECTIONS:
+def delete_collection(collection_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Soft delete: hidden now; its swipe file links and the row go in batches (purge.py)
+    collection = db.get(Collection, collection_id)
+    if collection is None or collection.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Collection not found")
-    # Add permission check here
-    del MOCK_DB_COLLECTIONS[collection_id]
-    # Also remove entries from MOCK_DB_SWIPE_FILES_IN_COLLECTION
-    keys_to_delete = [key for key in MOCK_DB_SWIPE_FILES_IN_COLLECTION if key[0] == collection_id]
-    for key in keys_to_delete:
-        del MOCK_DB_SWIPE_FILES_IN_COLLECTION[key]
+    if collection.owner_user_id != current_user.id and not (
+        collection.team_id is not None and collection.team.owner_user_id == current_user.id
+    ):
+        raise HTTPException(status_code=403, detail="Not authorized to delete this collection")
+    soft_delete(db, collection, requested_by=current_user.id) # Also drops it from the public cache
     logger.info(f"Collection {collection_id} deleted.")
     return
 
 @router.post("/{collection_id}/swipefiles", status_code=201)
-async def add_swipe_file_to_collection(collection_id: str, request: AddSwipeFileToCollectionRequest):
-    # user = Depends(get_current_active_user)
-    if collection_id not in MOCK_DB_COLLECTIONS:
-        raise HTTPException(status_code=404, detail="Collection not found")
-    # Add permission check for collection access
-    # Check if swipe_file_id exists (mocked for now)
+def add_swipe_file_to_collection(collection_id: str, request: AddSwipeFileToCollectionRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    collection = _get_editable_collection(db, collection_id, current_user.id)
     swipe_file_id = request.swipe_file_id
-    if (collection_id, swipe_file_id) in MOCK_DB_SWIPE_FILES_IN_COLLECTION:
+    swipe_file = db.get(SwipeFile, swipe_file_id)
+    if swipe_file is None or swipe_file.owner_user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Swipe file not found")
+    # The collection row is locked, so concurrent adds of the same swipe file queue up here
+    if db.get(CollectionSwipeFile, (collection_id, swipe_file_id)) is not None:
+        raise HTTPException(status_code=400, detail="Swipe file already in collection")
+
+    db.add(CollectionSwipeFile(collection_id=collection_id, swipe_file_id=swipe_file_id))
+    # Membership changes are collection writes too (the collection's version moves)
+    try:
+        _commit_collection_write(db, collection)
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Swipe file already in collection")
-    
-MOCK_DB_SWIPE_FILES_IN_COLLECTION[(collection_id, swipe_file_id)] = {"collection_id": collection_id, "swipe_file_id": swipe_file_id}
     logger.info(f"Swipe file {swipe_file_id} added to collection {collection_id}.")
     return {"message": "Swipe file added to collection successfully."}
 
 @router.delete("/{collection_id}/swipefiles/{swipe_file_id}", status_code=204)
-async def remove_swipe_file_from_collection(collection_id: str, swipe_file_id: str):
-    # user = Depends(get_current_active_user)
-    if collection_id not in MOCK_DB_COLLECTIONS:
-        raise HTTPException(status_code=404, detail="Collection not found")
-    # Add permission check for collection access
-    if (collection_id, swipe_file_id) not in MOCK_DB_SWIPE_FILES_IN_COLLECTION:
+def remove_swipe_file_from_collection(collection_id: str, swipe_file_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    collection = _get_editable_collection(db, collection_id, current_user.id)
+    link = db.get(CollectionSwipeFile, (collection_id, swipe_file_id))
+    if link is None:
         raise HTTPException(status_code=404, detail="Swipe file not found in this collection")
 
-    del MOCK_DB_SWIPE_FILES_IN_COLLECTION[(collection_id, swipe_file_id)]
+    db.delete(link)
+    _commit_collection_write(db, collection)
     logger.info(f"Swipe file {swipe_file_id} removed from collection {collection_id}.")
     return
 
+# --- Exports --- #
+
+def _can_view_collection(db: Session, collection: Collection, user_id: str) -> bool:
+    if not collection.is_private or collection.owner_user_id == user_id:
+        return True
+    return collection.team_id is not None and db.query(TeamMember.id).filter(
+        TeamMember.team_id == collection.team_id, TeamMember.user_id == user_id
+    ).first() is not None
+
+@router.get("/exports/{export_id}")
+def get_export_status(export_id: str, current_user: User = Depends(get_current_user)):
+    # Poll target for background exports; `download_url` appears once the archive is in storage
+    state = get_export_state(export_id)
+    if state is None or state.get("requested_by") != current_user.id:
+        raise HTTPException(status_code=404, detail="Export not found or expired")
+    return state
+
+@router.get("/{collection_id}/export")
+def export_collection(
+    collection_id: str,
+    export_format: Literal["zip", "pdf"] = Query("zip", alias="format"),
+    swipe_file_id: Optional[str] = None, # Export a single swipe file from the collection
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    # Small exports stream straight to the client as the archive is built; large ones become a
+    # background job writing to object storage (202 + a status URL that yields the download link).
+    collection = db.get(Collection, collection_id)
+    if collection is None or collection.deleted_at is not None or not _can_view_collection(db, collection, current_user.id):
+        raise HTTPException(status_code=404, detail="Collection not found")
+    screen_count = count_export_screens(db, collection_id, swipe_file_id)
+    if screen_count == 0:
+        raise HTTPException(status_code=404, detail="Nothing to export")
+
+    if screen_count > EXPORT_STREAM_MAX_SCREENS:
+        export_id = str(uuid.uuid4())
+        set_export_state(export_id, status="queued", requested_by=current_user.id, collection_id=collection_id,
+                         swipe_file_id=swipe_file_id, format=export_format, screens=screen_count)
+        send_export_collection(export_id, collection_id, export_format, swipe_file_id=swipe_file_id)
+        logger.info(f"Export {export_id} of collection {collection_id} ({screen_count} screens) queued.")
+        return JSONResponse(status_code=202, content={
+            "export_id": export_id, "status": "queued", "screens": screen_count,
+            "status_url": f"{router.prefix}/exports/{export_id}",
+        })
+
+    # The DB session closes when this function returns, so take the (bounded) list of screens now;
+    # images are fetched lazily while the response streams.
+    items = list(iter_export_items(db, collection_id, swipe_file_id))
+    filename = f"{slugify(collection.name)}.{export_format}"
+    return StreamingResponse(
+        iter_export(items, export_format), # Sync generator: Starlette iterates it in the threadpool
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
+
 # Need to add endpoints for listing swipe files in a collection
 # @router.get("/{collection_id}/swipefiles", response_model=List[SwipeFileResponse]) # Define SwipeFileResponse
 # async def get_swipe_files_in_collection(collection_id: str):
 #     pass
-
-"""
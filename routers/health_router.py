@@ -0,0 +1,175 @@
+"""
+Liveness and readiness probes for the FlowVault API.
+
+Liveness only proves the process is serving requests. Readiness checks Postgres, the Redis
+broker, Celery worker presence and browser pool capacity in parallel, each with a tight
+timeout, and caches the combined result for a few seconds so frequent probes from the
+platform (and autoscaler) don't hammer the dependencies.
+
+Blocking checks run on a few threads of their own, not the default executor that also runs the
+sync endpoints, and the database check uses its own one-connection engine with short connect
+and statement timeouts. A hung dependency therefore can't pile up probe threads or take
+capacity from requests.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from models import engine
+from db_routing import DATABASE_URL, make_engine, refresh_replicas
+from redis_client import get_async_redis, get_async_broker_redis
+from celery_client import celery_app, BROWSER_POOL_KEY_PREFIX
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    prefix="/api/v1/health",
+    tags=["health"],
+)
+
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.environ.get("HEALTH_CHECK_TIMEOUT_SECONDS", "1.0"))
+HEALTH_CACHE_TTL_SECONDS = float(os.environ.get("HEALTH_CACHE_TTL_SECONDS", "5"))
+DATABASE_CHECK_SQL = "SELECT 1"
+HEALTH_CHECK_THREADS = int(os.environ.get("HEALTH_CHECK_THREADS", "3")) # database, workers, replicas
+
+# Failing one of these makes the instance not ready; the others are reported but informational
+CRITICAL_CHECKS = {"database", "broker"}
+
+_cached_result = None
+_cached_at = 0.0
+_refresh_lock = asyncio.Lock()
+
+_executor = ThreadPoolExecutor(max_workers=HEALTH_CHECK_THREADS, thread_name_prefix="health-check")
+_health_engine = make_engine(
+    DATABASE_URL, "health",
+    connect_timeout=max(math.ceil(HEALTH_CHECK_TIMEOUT_SECONDS), 1),
+    pool_size=1, max_overflow=0, pool_timeout=HEALTH_CHECK_TIMEOUT_SECONDS,
+)
+
+
+async def _in_executor(function):
+    return await asyncio.get_running_loop().run_in_executor(_executor, function)
+
+
+def _check_database_sync():
+    with _health_engine.begin() as conn:
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(HEALTH_CHECK_TIMEOUT_SECONDS * 1000)}")
+        conn.exec_driver_sql(DATABASE_CHECK_SQL)
+    # The app's pool, for spotting exhaustion (checked_out at pool_size + max overflow)
+    pool = engine.pool
+    return {"pool_size": pool.size(), "checked_out": pool.checkedout(), "overflow": pool.overflow()}
+
+
+async def _check_database():
+    return await _in_executor(_check_database_sync)
+
+
+async def _check_broker():
+    broker = get_async_broker_redis()
+    queues = [queue.name for queue in celery_app.conf.task_queues] # Each Redis-backed queue is a list
+    async with broker.pipeline(transaction=False) as pipe:
+        pipe.ping()
+        for queue in queues:
+            pipe.llen(queue)
+        _, *depths = await pipe.execute()
+    return {"queues": dict(zip(queues, depths)), "queue_depth": sum(depths)}
+
+
+async def _check_workers():
+    # control.ping is a blocking broadcast; keep its own timeout below the check timeout
+    replies = await _in_executor(lambda: celery_app.control.ping(timeout=HEALTH_CHECK_TIMEOUT_SECONDS * 0.8))
+    workers = [hostname for reply in replies for hostname in reply]
+    if not workers:
+        raise RuntimeError("No Celery workers responded")
+    return {"workers": len(workers)}
+
+
+async def _check_browser_pool():
+    client = get_async_redis()
+    capacity = active = 0
+    async for key in client.scan_iter(match=f"{BROWSER_POOL_KEY_PREFIX}*", count=100):
+        slots = await client.hgetall(key)
+        capacity += int(slots.get(b"capacity", 0))
+        active += max(int(slots.get(b"active", 0)), 0)
+    if capacity == 0:
+        raise RuntimeError("No browser capacity advertised")
+    return {"capacity": capacity, "active": active, "available": max(capacity - active, 0)}
+
+
+async def _check_replicas():
+    # Not critical: reads fall back to the primary while no replica is usable
+    replicas = await _in_executor(refresh_replicas)
+    if replicas and not any(replica["healthy"] for replica in replicas):
+        raise RuntimeError("No read replica is usable; reads are going to the primary")
+    return {"replicas": replicas}
+
+
+async def _run_check(name, check):
+    started = time.perf_counter()
+    try:
+        details = await asyncio.wait_for(check(), timeout=HEALTH_CHECK_TIMEOUT_SECONDS)
+        result = {"status": "ok", **details}
+    except asyncio.TimeoutError:
+        result = {"status": "timeout"}
+    except Exception as e:
+        logger.warning(f"Readiness check '{name}' failed: {e}")
+        result = {"status": "error", "error": str(e)}
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return name, result
+
+
+async def _compute_readiness():
+    checks = {
+        "database": _check_database,
+        "broker": _check_broker,
+        "workers": _check_workers,
+        "browser_pool": _check_browser_pool,
+        "replicas": _check_replicas,
+    }
+    results = dict(await asyncio.gather(*(_run_check(name, check) for name, check in checks.items())))
+    ready = all(results[name]["status"] == "ok" for name in CRITICAL_CHECKS)
+    degraded = any(result["status"] != "ok" for result in results.values())
+    return {
+        "status": "ready" if ready and not degraded else ("degraded" if ready else "unavailable"),
+        "ready": ready,
+        "queue_depth": results["broker"].get("queue_depth"),
+        "checks": results,
+        "checked_at": time.time(),
+    }
+
+
+async def get_readiness():
+    """Returns the cached readiness result, refreshing it at most once per TTL across concurrent probes."""
+    global _cached_result, _cached_at
+    if _cached_result is not None and time.monotonic() - _cached_at < HEALTH_CACHE_TTL_SECONDS:
+        return _cached_result
+    async with _refresh_lock:
+        # Another probe may have refreshed while we waited for the lock
+        if _cached_result is None or time.monotonic() - _cached_at >= HEALTH_CACHE_TTL_SECONDS:
+            _cached_result = await _compute_readiness()
+            _cached_at = time.monotonic()
+    return _cached_result
+
+
+@router.get("")
+async def liveness():
+    """Liveness probe: the process is up and the event loop is responsive."""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def readiness():
+    """Readiness probe: 200 when Postgres and the broker are reachable, 503 otherwise.
+
+    Queue depth (summed over every Celery queue, with a per-queue breakdown under
+    checks.broker.queues) is exposed in the body and the X-Queue-Depth header for worker autoscaling.
+    """
+    result = await get_readiness()
+    headers = {"Cache-Control": "no-store"}
+    if result["queue_depth"] is not None:
+        headers["X-Queue-Depth"] = str(result["queue_depth"])
+    return JSONResponse(content=result, status_code=200 if result["ready"] else 503, headers=headers)
@@ -0,0 +1,121 @@
+"""
+Monitoring: track a swipe file to have it recaptured on a schedule, and browse its versions.
+
+Tracking only sets the schedule; the recaptures themselves are dispatched by the Celery beat
+scheduler (tasks.schedule_recaptures_task) and a new version exists only when something on
+the page visibly changed (see monitoring.py).
+"""
+from datetime import datetime
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+import logging
+
+from auth import get_current_user, get_db, get_read_db
+from models import SwipeFile, SwipeFileVersion, User, bump_version
+from monitoring import RECAPTURE_DEFAULT_INTERVAL_HOURS, RECAPTURE_MIN_INTERVAL_HOURS, next_recapture_at, utcnow
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    prefix="/api/v1/swipefiles",
+    tags=["monitoring"],
+)
+
+class TrackingRequest(BaseModel):
+    interval_hours: int = Field(RECAPTURE_DEFAULT_INTERVAL_HOURS, ge=RECAPTURE_MIN_INTERVAL_HOURS, le=90 * 24)
+
+class TrackingResponse(BaseModel):
+    swipe_file_id: str
+    is_tracked: bool
+    interval_hours: Optional[int] = None
+    next_recapture_at: Optional[datetime] = None
+    last_recaptured_at: Optional[datetime] = None
+    last_changed_at: Optional[datetime] = None
+    capture_version: int
+
+class SwipeFileVersionResponse(BaseModel):
+    version: int
+    superseded_at: Optional[datetime] = None
+    screens: List[Any]
+    changes: Optional[List[Any]] = None
+
+class VersionsResponse(BaseModel):
+    swipe_file_id: str
+    current_version: int
+    versions: List[SwipeFileVersionResponse] # Superseded versions, newest first
+
+
+def _get_owned_swipe_file(db: Session, swipe_file_id: str, user: User) -> SwipeFile:
+    swipe_file = db.get(SwipeFile, swipe_file_id)
+    if swipe_file is None:
+        raise HTTPException(status_code=404, detail="Swipe file not found")
+    if swipe_file.owner_user_id != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to monitor this swipe file")
+    return swipe_file
+
+
+def _tracking_response(swipe_file: SwipeFile) -> dict:
+    return {
+        "swipe_file_id": swipe_file.id,
+        "is_tracked": swipe_file.is_tracked,
+        "interval_hours": swipe_file.recapture_interval_hours,
+        "next_recapture_at": swipe_file.next_recapture_at if swipe_file.is_tracked else None,
+        "last_recaptured_at": swipe_file.last_recaptured_at,
+        "last_changed_at": swipe_file.last_changed_at,
+        "capture_version": swipe_file.capture_version,
+    }
+
+
+@router.get("/{swipe_file_id}/tracking", response_model=TrackingResponse)
+def get_tracking(swipe_file_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    return _tracking_response(_get_owned_swipe_file(db, swipe_file_id, current_user))
+
+
+@router.put("/{swipe_file_id}/tracking", response_model=TrackingResponse)
+def track_swipe_file(
+    swipe_file_id: str,
+    tracking: TrackingRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    swipe_file = _get_owned_swipe_file(db, swipe_file_id, current_user)
+    if not swipe_file.is_tracked or swipe_file.recapture_interval_hours != tracking.interval_hours:
+        swipe_file.is_tracked = True
+        swipe_file.recapture_interval_hours = tracking.interval_hours
+        # The slot within the interval is fixed per swipe file, so schedules stay evenly spread
+        swipe_file.next_recapture_at = next_recapture_at(swipe_file.id, tracking.interval_hours, utcnow())
+        bump_version(swipe_file)
+        db.commit()
+        logger.info(f"Swipe file {swipe_file_id} tracked every {tracking.interval_hours}h by {current_user.id}; next recapture {swipe_file.next_recapture_at}.")
+    return _tracking_response(swipe_file)
+
+
+@router.delete("/{swipe_file_id}/tracking", status_code=204)
+def untrack_swipe_file(swipe_file_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    swipe_file = _get_owned_swipe_file(db, swipe_file_id, current_user)
+    if swipe_file.is_tracked:
+        swipe_file.is_tracked = False
+        swipe_file.next_recapture_at = None
+        bump_version(swipe_file)
+        db.commit()
+        logger.info(f"Swipe file {swipe_file_id} no longer tracked.")
+
+
+@router.get("/{swipe_file_id}/versions", response_model=VersionsResponse)
+def list_versions(swipe_file_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    swipe_file = _get_owned_swipe_file(db, swipe_file_id, current_user)
+    versions = (
+        db.query(SwipeFileVersion)
+        .filter(SwipeFileVersion.swipe_file_id == swipe_file.id)
+        .order_by(SwipeFileVersion.version.desc())
+        .all()
+    )
+    return {
+        "swipe_file_id": swipe_file.id,
+        "current_version": swipe_file.capture_version,
+        "versions": [
+            {"version": v.version, "superseded_at": v.superseded_at, "screens": v.screens, "changes": v.changes}
+            for v in versions
+        ],
+    }
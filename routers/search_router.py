@@ -0,0 +1,141 @@
+"""
+Search over swipe files and captured page text.
+
+Matches swipe file titles/URLs and per-screen title, headings, alt text and visible text
+through the `search_vector` GIN indexes (Postgres keeps them current on insert), plus
+pg_trgm similarity on titles/URLs so typos and URL fragments still match. Results are
+scoped to swipe files the caller owns or can see through their collections and teams.
+"""
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+import logging
+
+from auth import get_current_user, get_read_db
+from models import User
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    prefix="/api/v1/search",
+    tags=["search"],
+)
+
+class SearchHit(BaseModel):
+    swipe_file_id: str
+    title: Optional[str] = None
+    original_url: str
+    created_at: Optional[datetime] = None
+    rank: float
+    screen_id: Optional[str] = None # Best matching screen, if the match was on page content
+    screen_image_url: Optional[str] = None
+    screen_order_index: Optional[int] = None
+    snippet: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    limit: int
+    offset: int
+    results: List[SearchHit]
+
+# Swipe files visible to the caller: owned, or in a collection they own or their team owns.
+# Soft-deleted collections and teams share nothing, and a soft-deleted user's swipe files are
+# gone for everyone, while the purge task catches up (purge.py).
+# Each ranking CTE filters on the full-text/trigram indexes and the visibility set together.
+SEARCH_SQL = text("""
+WITH query AS (
+    SELECT websearch_to_tsquery('english', :q) AS tsq
+),
+visible AS (
+    SELECT sf.id FROM swipe_files sf WHERE sf.owner_user_id = :user_id
+    UNION
+    SELECT csf.swipe_file_id
+    FROM collection_swipe_files csf
+    JOIN collections c ON c.id = csf.collection_id
+    JOIN swipe_files sf ON sf.id = csf.swipe_file_id
+    JOIN users owner ON owner.id = sf.owner_user_id
+    WHERE c.deleted_at IS NULL AND owner.deleted_at IS NULL
+      AND (c.owner_user_id = :user_id
+           OR c.team_id IN (SELECT tm.team_id FROM team_members tm JOIN teams t ON t.id = tm.team_id
+                            WHERE tm.user_id = :user_id AND t.deleted_at IS NULL))
+),
+screen_hits AS (
+    SELECT s.swipe_file_id, max(ts_rank_cd(s.search_vector, query.tsq, 32)) AS rank
+    FROM screens s, query
+    WHERE s.search_vector @@ query.tsq
+      AND s.swipe_file_id IN (SELECT id FROM visible)
+    GROUP BY s.swipe_file_id
+),
+file_hits AS (
+    SELECT sf.id AS swipe_file_id,
+           ts_rank_cd(sf.search_vector, query.tsq, 32) + similarity(coalesce(sf.title, ''), :q) AS rank
+    FROM swipe_files sf, query
+    WHERE sf.id IN (SELECT id FROM visible)
+      AND (sf.search_vector @@ query.tsq OR sf.title % :q OR sf.original_url ILIKE :like)
+),
+ranked AS (
+    SELECT swipe_file_id, max(rank) AS rank
+    FROM (SELECT * FROM screen_hits UNION ALL SELECT * FROM file_hits) hits
+    GROUP BY swipe_file_id
+)
+SELECT sf.id, sf.title, sf.original_url, sf.created_at, r.rank, count(*) OVER () AS total
+FROM ranked r
+JOIN swipe_files sf ON sf.id = r.swipe_file_id
+ORDER BY r.rank DESC, sf.created_at DESC
+LIMIT :limit OFFSET :offset
+""")
+
+# Highlighting is the expensive part, so it only runs for the page being returned
+BEST_SCREENS_SQL = text("""
+SELECT DISTINCT ON (s.swipe_file_id)
+       s.swipe_file_id, s.id, s.image_url, s.order_index,
+       ts_headline('english', coalesce(s.page_text, s.alt_text, ''), query.tsq,
+                   'MaxFragments=1, MaxWords=24, MinWords=8, StartSel=<mark>, StopSel=</mark>') AS snippet
+FROM screens s, (SELECT websearch_to_tsquery('english', :q) AS tsq) query
+WHERE s.swipe_file_id IN :ids AND s.search_vector @@ query.tsq
+ORDER BY s.swipe_file_id, ts_rank_cd(s.search_vector, query.tsq, 32) DESC
+""").bindparams(bindparam("ids", expanding=True))
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@router.get("", response_model=SearchResponse)
+def search_swipe_files(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db), # Read-only: served from a replica when one is caught up
+):
+    rows = db.execute(
+        SEARCH_SQL,
+        {"q": q, "like": f"%{_escape_like(q)}%", "user_id": current_user.id, "limit": limit, "offset": offset},
+    ).all()
+    total = rows[0].total if rows else 0
+
+    best_screens = {}
+    if rows:
+        for screen in db.execute(BEST_SCREENS_SQL, {"q": q, "ids": [row.id for row in rows]}):
+            best_screens[screen.swipe_file_id] = screen
+
+    results = []
+    for row in rows:
+        screen = best_screens.get(row.id)
+        results.append({
+            "swipe_file_id": row.id,
+            "title": row.title,
+            "original_url": row.original_url,
+            "created_at": row.created_at,
+            "rank": float(row.rank),
+            "screen_id": screen.id if screen else None,
+            "screen_image_url": screen.image_url if screen else None,
+            "screen_order_index": screen.order_index if screen else None,
+            "snippet": screen.snippet if screen else None,
+        })
+    logger.info(f"Search by {current_user.id} for '{q}': {total} results.")
+    return {"query": q, "total": total, "limit": limit, "offset": offset, "results": results}
@@ -1,10 +1,10 @@
-"""
 # /home/ubuntu/flowvault_backend_fastapi/routers/stripe_router.py
 
 import os
 import stripe
 from fastapi import APIRouter, HTTPException, Request, Header, Depends
 from pydantic import BaseModel
+from typing import Optional
 import logging
 
 # Placeholder for database connection/session and authentication dependency
@@ -22,6 +22,9 @@ router = APIRouter(
 # stripe.api_key = settings.STRIPE_SECRET_KEY
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY", "sk_test_YOUR_STRIPE_SECRET_KEY") # Replace with your test secret key
 STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "whsec_YOUR_STRIPE_WEBHOOK_SECRET") # Replace with your webhook secret
+# Point the Stripe client at a stub server (benchmarks/load_test.py) instead of api.stripe.com
+if os.environ.get("STRIPE_API_BASE"):
+    stripe.api_base = os.environ["STRIPE_API_BASE"]
 
 class CreateCheckoutSessionRequest(BaseModel):
     price_id: str # e.g., price_xxxxxxxxxxxxxx for a specific plan
@@ -131,5 +134,3 @@ async def create_customer_portal_session():
         raise HTTPException(status_code=500, detail=str(e))
 
 # Add more endpoints as needed, e.g., to list products/prices, get subscription details for a user.
-
-"""
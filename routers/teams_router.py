@@ -1,32 +1,29 @@
-"""
 # /home/ubuntu/flowvault_backend_fastapi/routers/teams_router.py
 
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 import logging
 
-# Placeholder for database connection/session and authentication dependency
-# from ..dependencies import get_db_session, get_current_active_user
+from fast_json import FAST_JSON_RESPONSES, fast_list_response
+from http_cache import make_etag, etag_matches, cache_headers, not_modified
+from auth import get_current_user, get_db, get_read_db
+from models import Team, User, bump_version
+from models import TeamMember as TeamMemberRow
+from purge import soft_delete
 
 logger = logging.getLogger(__name__)
 router = APIRouter(
     prefix="/api/v1/teams",
     tags=["teams"],
-    # dependencies=[Depends(get_current_active_user)], # Add auth dependency later
 )
 
-# Mock database for teams (replace with actual DB interaction)
-MOCK_DB_TEAMS = {
-    "t1": {"team_id": "t1", "name": "Acme Design Team", "owner_user_id": "user123"},
-    "t2": {"team_id": "t2", "name": "Startup X - Product Team", "owner_user_id": "user456"},
-}
-MOCK_DB_TEAM_MEMBERS = {
-    ("t1", "user123"): {"team_id": "t1", "user_id": "user123", "role": "owner"},
-    ("t1", "user789"): {"team_id": "t1", "user_id": "user789", "role": "member"},
-    ("t2", "user456"): {"team_id": "t2", "user_id": "user456", "role": "owner"},
-}
+MANAGER_ROLES = ("owner", "admin") # May rename the team and manage its members
+ASSIGNABLE_ROLES = ("admin", "member") # "owner" moves only by transferring ownership
 
 class TeamBase(BaseModel):
     name: str
@@ -48,128 +45,183 @@ class TeamMember(BaseModel):
     user_id: str
     role: str # e.g., "owner", "admin", "member"
 
+class TeamMemberRoleUpdate(BaseModel):
+    role: str
+
+def _team_response(team: Team) -> dict:
+    return {"team_id": team.id, "name": team.name, "owner_user_id": team.owner_user_id}
+
+def _team_version(db: Session, team_id: str, user_id: str) -> Optional[int]:
+    """The team's version if `user_id` is a member (ETags: team and membership reads check nothing else first)."""
+    return db.execute(
+        select(Team.version)
+        .join(TeamMemberRow, TeamMemberRow.team_id == Team.id)
+        .where(Team.id == team_id, Team.deleted_at.is_(None), TeamMemberRow.user_id == user_id)
+    ).scalar()
+
+def _get_managed_team(db: Session, team_id: str, user_id: str, allow_self: Optional[str] = None) -> Team:
+    """The team, locked for update, if `user_id` is an owner/admin of it (or is `allow_self`)."""
+    team = db.get(Team, team_id, with_for_update=True)
+    if team is None or team.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Team not found")
+    role = db.query(TeamMemberRow.role).filter(TeamMemberRow.team_id == team_id, TeamMemberRow.user_id == user_id).scalar()
+    if role is None:
+        raise HTTPException(status_code=404, detail="Team not found")
+    if role not in MANAGER_ROLES and user_id != allow_self:
+        raise HTTPException(status_code=403, detail="Only the team owner or an admin can do this")
+    return team
+
+def _get_member(db: Session, team_id: str, user_id: str) -> TeamMemberRow:
+    member = db.query(TeamMemberRow).filter(TeamMemberRow.team_id == team_id, TeamMemberRow.user_id == user_id).first()
+    if member is None:
+        raise HTTPException(status_code=404, detail="Member not found in this team")
+    return member
+
+def _check_assignable(role: str):
+    if role not in ASSIGNABLE_ROLES:
+        raise HTTPException(status_code=400, detail=f"Role must be one of: {', '.join(ASSIGNABLE_ROLES)}")
+
 @router.post("/", response_model=TeamResponse, status_code=201)
-async def create_team(team: TeamCreate):
-    # user = Depends(get_current_active_user)
-    # owner_user_id = user.id
-    owner_user_id = "user123" # Mock owner
-    team_id = str(uuid.uuid4())
-    
-    new_team_data = team.model_dump()
-    new_team_data["team_id"] = team_id
-    new_team_data["owner_user_id"] = owner_user_id
-    
-MOCK_DB_TEAMS[team_id] = new_team_data
+def create_team(team: TeamCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    new_team = Team(id=str(uuid.uuid4()), name=team.name, owner_user_id=current_user.id)
+    db.add(new_team)
+    db.flush()
     # Add owner as the first member
-MOCK_DB_TEAM_MEMBERS[(team_id, owner_user_id)] = {"team_id": team_id, "user_id": owner_user_id, "role": "owner"}
-    logger.info(f"User {owner_user_id} created team {team_id} with name {team.name}")
-    return new_team_data
+    db.add(TeamMemberRow(team_id=new_team.id, user_id=current_user.id, role="owner"))
+    db.commit()
+    logger.info(f"User {current_user.id} created team {new_team.id} with name {team.name}")
+    return _team_response(new_team)
 
 @router.get("/", response_model=List[TeamResponse])
-async def get_user_teams():
-    # user = Depends(get_current_active_user)
-    # user_id = user.id
-    user_id = "user123" # Mock user_id
-    # This should fetch teams where the user is a member
-    user_teams_ids = {tm["team_id"] for tm in MOCK_DB_TEAM_MEMBERS.values() if tm["user_id"] == user_id}
-    user_teams_data = [team for team_id, team in MOCK_DB_TEAMS.items() if team_id in user_teams_ids]
-    return user_teams_data
+def get_user_teams(current_user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    # Teams the user is a member of
+    rows = db.execute(
+        select(Team.id.label("team_id"), Team.name, Team.owner_user_id)
+        .join(TeamMemberRow, TeamMemberRow.team_id == Team.id)
+        .where(TeamMemberRow.user_id == current_user.id, Team.deleted_at.is_(None))
+        .order_by(Team.name, Team.id)
+    ).all()
+    if FAST_JSON_RESPONSES:
+        return fast_list_response(rows, TeamResponse)
+    return [dict(row._mapping) for row in rows]
 
 @router.get("/{team_id}", response_model=TeamResponse)
-async def get_team(team_id: str):
-    # user = Depends(get_current_active_user)
-    # user_id = user.id
-    if team_id not in MOCK_DB_TEAMS:
+def get_team(team_id: str, request: Request, response: Response, current_user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    version = _team_version(db, team_id, current_user.id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Team not found")
+    etag = make_etag("team", team_id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    team = db.get(Team, team_id)
+    if team is None or team.deleted_at is not None: # Deleted (or purged) since the version was read
         raise HTTPException(status_code=404, detail="Team not found")
-    team_data = MOCK_DB_TEAMS[team_id]
-    # Add permission check: user must be a member of the team
-    return team_data
+    response.headers.update(cache_headers(etag))
+    return _team_response(team)
 
 @router.put("/{team_id}", response_model=TeamResponse)
-async def update_team(team_id: str, team_update: TeamUpdate):
-    # user = Depends(get_current_active_user)
-    # user_id = user.id
-    if team_id not in MOCK_DB_TEAMS:
-        raise HTTPException(status_code=404, detail="Team not found")
-    
-    # Add permission check: user must be owner or admin of the team
-    stored_team_data = MOCK_DB_TEAMS[team_id]
+def update_team(team_id: str, team_update: TeamUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    team = _get_managed_team(db, team_id, current_user.id)
     update_data = team_update.model_dump(exclude_unset=True)
-    updated_team = stored_team_data.copy()
-    updated_team.update(update_data)
-    MOCK_DB_TEAMS[team_id] = updated_team
+    if "name" in update_data:
+        if update_data["name"] is None:
+            raise HTTPException(status_code=422, detail="name cannot be null")
+        team.name = update_data["name"]
+    new_owner_id = update_data.get("owner_user_id")
+    if new_owner_id is not None and new_owner_id != team.owner_user_id:
+        if team.owner_user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Only the team owner can transfer ownership")
+        new_owner = _get_member(db, team_id, new_owner_id)
+        _get_member(db, team_id, team.owner_user_id).role = "admin" # The previous owner stays on as an admin
+        new_owner.role = "owner"
+        team.owner_user_id = new_owner_id
+    bump_version(team)
+    db.commit()
     logger.info(f"Team {team_id} updated.")
-    return updated_team
+    return _team_response(team)
 
 @router.delete("/{team_id}", status_code=204)
-async def delete_team(team_id: str):
-    # user = Depends(get_current_active_user)
-    # user_id = user.id
-    if team_id not in MOCK_DB_TEAMS:
+def delete_team(team_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Soft delete: the team and its collections are hidden now; members, collections and the
+    # team row itself are removed in batches by the purge task (purge.py)
+    team = db.get(Team, team_id)
+    if team is None or team.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Team not found")
-    # Add permission check: user must be owner of the team
-    del MOCK_DB_TEAMS[team_id]
-    # Also remove members and associated team collections (or handle as per business logic)
-    keys_to_delete = [key for key in MOCK_DB_TEAM_MEMBERS if key[0] == team_id]
-    for key in keys_to_delete:
-        del MOCK_DB_TEAM_MEMBERS[key]
+    if team.owner_user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the team owner can delete the team")
+    soft_delete(db, team, requested_by=current_user.id)
     logger.info(f"Team {team_id} deleted.")
     return
 
 # --- Team Member Management --- #
+# Membership is part of the team's version: every membership write bumps the team row
 
 @router.post("/{team_id}/members", response_model=TeamMember, status_code=201)
-async def add_team_member(team_id: str, member_data: TeamMember):
-    # user = Depends(get_current_active_user) # User performing the action
-    if team_id not in MOCK_DB_TEAMS:
-        raise HTTPException(status_code=404, detail="Team not found")
-    # Add permission check: current user must be owner or admin of the team
-    # Check if user_to_add exists (mocked for now)
-    user_to_add_id = member_data.user_id
-    if (team_id, user_to_add_id) in MOCK_DB_TEAM_MEMBERS:
+def add_team_member(team_id: str, member_data: TeamMember, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    team = _get_managed_team(db, team_id, current_user.id)
+    _check_assignable(member_data.role)
+    user_to_add = db.get(User, member_data.user_id)
+    if user_to_add is None or user_to_add.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="User not found")
+    # The team row is locked, so concurrent adds of the same user queue up here
+    if db.query(TeamMemberRow.id).filter(TeamMemberRow.team_id == team_id, TeamMemberRow.user_id == member_data.user_id).first():
         raise HTTPException(status_code=400, detail="User is already a member of this team")
-    
-MOCK_DB_TEAM_MEMBERS[(team_id, user_to_add_id)] = {"team_id": team_id, "user_id": user_to_add_id, "role": member_data.role}
-    logger.info(f"User {user_to_add_id} added to team {team_id} with role {member_data.role}.")
+
+    db.add(TeamMemberRow(team_id=team_id, user_id=member_data.user_id, role=member_data.role))
+    bump_version(team)
+    try:
+        db.commit()
+    except IntegrityError: # uq_team_members_team_id_user_id
+        db.rollback()
+        raise HTTPException(status_code=400, detail="User is already a member of this team")
+    logger.info(f"User {member_data.user_id} added to team {team_id} with role {member_data.role}.")
     return member_data
 
 @router.get("/{team_id}/members", response_model=List[TeamMember])
-async def get_team_members(team_id: str):
-    # user = Depends(get_current_active_user)
-    if team_id not in MOCK_DB_TEAMS:
+def get_team_members(team_id: str, request: Request, response: Response, current_user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    # The team's version covers its membership, so a revalidation never loads the member list
+    version = _team_version(db, team_id, current_user.id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Team not found")
-    # Add permission check: current user must be a member of the team
-    members = [data for key, data in MOCK_DB_TEAM_MEMBERS.items() if key[0] == team_id]
-    return members
+    etag = make_etag("team-members", team_id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    members = db.execute(
+        select(TeamMemberRow.user_id, TeamMemberRow.role)
+        .where(TeamMemberRow.team_id == team_id)
+        .order_by(TeamMemberRow.joined_at, TeamMemberRow.id)
+    ).all()
+    if FAST_JSON_RESPONSES:
+        fast_response = fast_list_response(members, TeamMember)
+        fast_response.headers.update(cache_headers(etag))
+        return fast_response
+    response.headers.update(cache_headers(etag))
+    return [dict(member._mapping) for member in members]
 
 @router.put("/{team_id}/members/{member_user_id}", response_model=TeamMember)
-async def update_team_member_role(team_id: str, member_user_id: str, role_data: BaseModel): # Pydantic model for role needed
-    # user = Depends(get_current_active_user)
-    if team_id not in MOCK_DB_TEAMS:
-        raise HTTPException(status_code=404, detail="Team not found")
-    if (team_id, member_user_id) not in MOCK_DB_TEAM_MEMBERS:
-        raise HTTPException(status_code=404, detail="Member not found in this team")
-    # Add permission check: current user must be owner or admin
-    # new_role = role_data.role # Assuming role_data has a 'role' field
-    new_role = "member" # Mock role update
-MOCK_DB_TEAM_MEMBERS[(team_id, member_user_id)]["role"] = new_role
-    logger.info(f"User {member_user_id}\'s role in team {team_id} updated to {new_role}.")
-    return MOCK_DB_TEAM_MEMBERS[(team_id, member_user_id)]
+def update_team_member_role(team_id: str, member_user_id: str, role_data: TeamMemberRoleUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    team = _get_managed_team(db, team_id, current_user.id)
+    member = _get_member(db, team_id, member_user_id)
+    if member_user_id == team.owner_user_id:
+        raise HTTPException(status_code=400, detail="Cannot change the team owner's role. Transfer ownership instead.")
+    _check_assignable(role_data.role)
+    member.role = role_data.role
+    bump_version(team)
+    db.commit()
+    logger.info(f"User {member_user_id}\'s role in team {team_id} updated to {role_data.role}.")
+    return {"user_id": member.user_id, "role": member.role}
 
 @router.delete("/{team_id}/members/{member_user_id}", status_code=204)
-async def remove_team_member(team_id: str, member_user_id: str):
-    # user = Depends(get_current_active_user)
-    if team_id not in MOCK_DB_TEAMS:
-        raise HTTPException(status_code=404, detail="Team not found")
-    if (team_id, member_user_id) not in MOCK_DB_TEAM_MEMBERS:
-        raise HTTPException(status_code=404, detail="Member not found in this team")
-    # Add permission check: current user must be owner or admin, or user removing themselves (unless owner)
+def remove_team_member(team_id: str, member_user_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Owners and admins remove anyone; members may remove (leave) themselves
+    team = _get_managed_team(db, team_id, current_user.id, allow_self=member_user_id)
+    member = _get_member(db, team_id, member_user_id)
     # Prevent owner from being removed directly without transferring ownership
-    if MOCK_DB_TEAMS[team_id]["owner_user_id"] == member_user_id:
+    if team.owner_user_id == member_user_id:
         raise HTTPException(status_code=400, detail="Cannot remove the team owner. Transfer ownership first.")
 
-    del MOCK_DB_TEAM_MEMBERS[(team_id, member_user_id)]
+    db.delete(member)
+    bump_version(team)
+    db.commit()
     logger.info(f"User {member_user_id} removed from team {team_id}.")
     return
-
-"""
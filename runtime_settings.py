@@ -0,0 +1,226 @@
+"""
+Runtime settings: maintenance mode, feature flags, capture limits and per-tier quotas.
+
+Postgres (the runtime_settings table) is the source of truth. Redis keeps a copy of every
+setting (one hash) and a version counter, and each change is broadcast on a pub/sub channel.
+
+Every API and worker process holds all settings in a local dict, so reading one on the hot path
+(`runtime_settings.get("maintenance_mode")`) is a dict lookup with no network call. Processes
+load them at startup (the API's startup hook, Celery's worker_process_init); a process that
+reads before that gets the defaults while the load runs in the background. A daemon
+thread per process applies published changes as they arrive, typically within milliseconds. It
+re-reads everything when it (re)subscribes, when it sees a version gap, or when the version in
+Redis moved without a message (checked every RUNTIME_SETTINGS_VERIFY_SECONDS), so a dropped
+connection can't leave a process stale for long.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import Optional
+import redis
+
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RUNTIME_SETTINGS_VERIFY_SECONDS = float(os.environ.get("RUNTIME_SETTINGS_VERIFY_SECONDS", "30"))
+RUNTIME_SETTINGS_RECONNECT_SECONDS = float(os.environ.get("RUNTIME_SETTINGS_RECONNECT_SECONDS", "1"))
+
+SETTINGS_KEY = "flowvault:settings"                  # hash: setting -> JSON value
+SETTINGS_VERSION_KEY = "flowvault:settings:version"  # bumped on every change
+SETTINGS_CHANNEL = "flowvault:settings:changes"      # {"version": n, "changes": {...}}
+
+DEFAULT_SETTINGS = {
+    "maintenance_mode": False,
+    "maintenance_message": "FlowVault is down for maintenance. Please try again in a few minutes.",
+    "feature_flags": {},
+    "capture_host_concurrency": None, # None: HOST_CONCURRENCY_LIMIT from the environment
+    "capture_host_min_interval_seconds": None, # None: HOST_MIN_REQUEST_INTERVAL_SECONDS
+    "tier_quotas": { # None: unlimited until an admin sets a limit
+        "free": {"captures_per_day": None},
+        "pro": {"captures_per_day": None},
+    },
+}
+
+# Stripe subscription states that get the paid tier's quotas
+PAID_SUBSCRIPTION_STATUSES = {"active", "trialing"}
+
+# HSET the changed settings, bump the version and publish, atomically so every process sees
+# changes in version order. KEYS[1] = settings hash, KEYS[2] = version counter;
+# ARGV[1] = channel, ARGV[2] = changes JSON, ARGV[3..] = setting, JSON value pairs
+_UPDATE_LUA = """
+for i = 3, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+local version = redis.call('INCR', KEYS[2])
+redis.call('PUBLISH', ARGV[1], '{"version": ' .. version .. ', "changes": ' .. ARGV[2] .. '}')
+return version
+"""
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_settings(changes: dict) -> dict:
+    """Checks setting names and value types; raises ValueError with a message fit for a 422."""
+    for key, value in changes.items():
+        if key not in DEFAULT_SETTINGS:
+            raise ValueError(f"Unknown setting '{key}'")
+        if key == "maintenance_mode" and not isinstance(value, bool):
+            raise ValueError("maintenance_mode must be a boolean")
+        if key == "maintenance_message" and not isinstance(value, str):
+            raise ValueError("maintenance_message must be a string")
+        if key == "feature_flags" and not (isinstance(value, dict) and all(isinstance(flag, bool) for flag in value.values())):
+            raise ValueError("feature_flags must map flag names to booleans")
+        if key == "capture_host_concurrency" and value is not None and not (_is_int(value) and value >= 1):
+            raise ValueError("capture_host_concurrency must be a positive integer or null")
+        if key == "capture_host_min_interval_seconds" and value is not None and not ((_is_int(value) or isinstance(value, float)) and value >= 0):
+            raise ValueError("capture_host_min_interval_seconds must be a non-negative number or null")
+        if key == "tier_quotas" and not (
+            isinstance(value, dict) and all(
+                isinstance(quotas, dict) and all(quota is None or (_is_int(quota) and quota >= 0) for quota in quotas.values())
+                for quotas in value.values()
+            )
+        ):
+            raise ValueError("tier_quotas must map tiers to {quota: non-negative integer or null}")
+    return changes
+
+
+def _load_from_db() -> dict:
+    from models import SessionLocal, RuntimeSetting # Loaded on first use: keeps this module importable anywhere
+    with SessionLocal() as db:
+        return {row.key: row.value for row in db.query(RuntimeSetting)}
+
+
+class RuntimeSettings:
+    def __init__(self):
+        self._values = dict(DEFAULT_SETTINGS) # Replaced wholesale, never mutated: readers need no lock
+        self._version = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._update_script = None
+
+    # --- Reads (hot path) --- #
+
+    def get(self, key: str):
+        if self._pid != os.getpid():
+            self.start(wait=False) # First use in this process (or a forked child): never block the read on I/O
+        return self._values.get(key, DEFAULT_SETTINGS[key])
+
+    def flag(self, name: str, default: bool = False) -> bool:
+        return self.get("feature_flags").get(name, default)
+
+    def quota(self, tier: str, name: str) -> Optional[int]:
+        """A tier's quota (None = unlimited); unknown tiers get the free tier's."""
+        quotas = self.get("tier_quotas")
+        return quotas.get(tier, quotas.get("free", {})).get(name)
+
+    def snapshot(self) -> dict:
+        self.get("maintenance_mode")
+        return {"version": self._version, "settings": dict(self._values)}
+
+    # --- Sync --- #
+
+    def start(self, wait: bool = True):
+        """Starts the change listener for this process (idempotent); with `wait`, loads the settings before returning.
+
+        The listener loads everything when it subscribes, so without `wait` the settings arrive in
+        the background and reads return the current (at first, default) values meanwhile.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._listen, name="runtime-settings", daemon=True).start()
+        if wait:
+            self.reload()
+
+    def _load(self) -> tuple:
+        """(settings, version) from Redis, rebuilding its copy from Postgres when missing; from Postgres alone while Redis is down."""
+        try:
+            client = get_redis()
+            pipe = client.pipeline()
+            pipe.hgetall(SETTINGS_KEY)
+            pipe.get(SETTINGS_VERSION_KEY)
+            raw, version = pipe.execute()
+            if raw:
+                return {key.decode(): json.loads(value) for key, value in raw.items()}, int(version or 0)
+            # Never written, or evicted: rebuild the Redis copy from Postgres
+            values = _load_from_db()
+            if values:
+                client.hset(SETTINGS_KEY, mapping={key: json.dumps(value) for key, value in values.items()})
+            return values, int(version or 0)
+        except redis.RedisError as e:
+            logger.warning(f"Runtime settings: Redis unavailable, loading from the database: {e}")
+            return _load_from_db(), self._version
+
+    def reload(self):
+        try:
+            values, version = self._load()
+        except Exception as e: # Postgres needed (Redis copy missing or Redis down) and unreachable
+            logger.error(f"Runtime settings: could not load settings, keeping current values: {e}")
+            return
+        self._values = {**DEFAULT_SETTINGS, **values}
+        self._version = version
+
+    def _apply_message(self, data: bytes):
+        message = json.loads(data)
+        if message["version"] == self._version + 1:
+            self._values = {**self._values, **message["changes"]}
+            self._version = message["version"]
+            logger.info(f"Runtime settings v{self._version}: {', '.join(message['changes'])} changed.")
+        elif message["version"] != self._version:
+            self.reload() # Missed a change (or the counter was reset): take the full state
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(SETTINGS_CHANNEL)
+                self.reload() # Changes published before the subscription was in place
+                next_verify = time.monotonic() + RUNTIME_SETTINGS_VERIFY_SECONDS
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        self._apply_message(message["data"])
+                    if time.monotonic() >= next_verify:
+                        if int(get_redis().get(SETTINGS_VERSION_KEY) or 0) != self._version:
+                            self.reload()
+                        next_verify = time.monotonic() + RUNTIME_SETTINGS_VERIFY_SECONDS
+            except Exception as e:
+                logger.warning(f"Runtime settings listener disconnected, reconnecting: {e}")
+                time.sleep(RUNTIME_SETTINGS_RECONNECT_SECONDS)
+
+    # --- Writes --- #
+
+    def update(self, db, changes: dict, updated_by: str = None) -> dict:
+        """Persists changes (Postgres first, then Redis) and broadcasts them to every process.
+
+        Raises ValueError for invalid settings and redis.RedisError if the change was saved but
+        could not be broadcast (saving again is safe).
+        """
+        from models import RuntimeSetting
+        validate_settings(changes)
+        for key, value in changes.items():
+            db.merge(RuntimeSetting(key=key, value=value, updated_by=updated_by))
+        db.commit()
+
+        if self._update_script is None:
+            self._update_script = get_redis().register_script(_UPDATE_LUA)
+        pairs = [item for key, value in changes.items() for item in (key, json.dumps(value))]
+        version = int(self._update_script(keys=[SETTINGS_KEY, SETTINGS_VERSION_KEY], args=[SETTINGS_CHANNEL, json.dumps(changes), *pairs]))
+        if version == self._version + 1:
+            self._values = {**self._values, **changes} # This process needn't wait for its own message
+            self._version = version
+        logger.info(f"Runtime settings v{version} by {updated_by}: {changes}")
+        return self.snapshot()
+
+
+def user_tier(user) -> str:
+    return "pro" if user.subscription_status in PAID_SUBSCRIPTION_STATUSES else "free"
+
+
+runtime_settings = RuntimeSettings()
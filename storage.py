@@ -0,0 +1,256 @@
+"""
+Object storage (S3-compatible) for captured screenshots and exports.
+
+With OBJECT_STORE_DIR set, objects are kept in that local directory instead (local development
+and the load test harness, benchmarks/load_test.py); nothing else changes.
+"""
+import os
+import io
+import uuid
+import shutil
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME", "your-s3-bucket-for-flowvault")
+S3_REGION = os.environ.get("S3_REGION", "us-east-1")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") # Set for S3-compatible stores (R2, MinIO)
+S3_PUBLIC_BASE_URL = os.environ.get("S3_PUBLIC_BASE_URL") # CDN in front of the bucket, if any
+S3_MULTIPART_PART_SIZE = int(os.environ.get("S3_MULTIPART_PART_SIZE", str(8 * 1024 * 1024))) # S3 minimum is 5 MiB (except the last part)
+OBJECT_STORE_DIR = os.environ.get("OBJECT_STORE_DIR") # Local filesystem stand-in for S3
+
+_s3_client = None
+
+
+class LocalObjectStore:
+    """The part of the boto3 S3 client API this module uses, backed by a directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def _write(self, path: str, chunks):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp, path) # Readers never see a partial object
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self._write(self._path(Bucket, Key), [Body])
+        return {}
+
+    def head_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            from botocore.exceptions import ClientError
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {"ContentLength": os.path.getsize(path)}
+
+    def get_object(self, Bucket, Key):
+        with open(self._path(Bucket, Key), "rb") as f:
+            return {"Body": io.BytesIO(f.read())}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"file://{self._path(Params['Bucket'], Params['Key'])}"
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, ".multipart", upload_id))
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with open(os.path.join(self.root, ".multipart", UploadId, str(PartNumber)), "wb") as f:
+            f.write(Body)
+        return {"ETag": str(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts_dir = os.path.join(self.root, ".multipart", UploadId)
+
+        def chunks():
+            for part in MultipartUpload["Parts"]:
+                with open(os.path.join(parts_dir, str(part["PartNumber"])), "rb") as f:
+                    yield f.read()
+        self._write(self._path(Bucket, Key), chunks())
+        shutil.rmtree(parts_dir)
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        shutil.rmtree(os.path.join(self.root, ".multipart", UploadId), ignore_errors=True)
+        return {}
+
+    def get_paginator(self, operation_name):
+        return self # Only list_objects_v2 is paginated here
+
+    def paginate(self, Bucket, Prefix=""):
+        bucket_root = os.path.join(self.root, Bucket)
+        keys = []
+        for directory, _, files in os.walk(os.path.join(bucket_root, *Prefix.split("/")[:-1])):
+            for name in files:
+                key = os.path.relpath(os.path.join(directory, name), bucket_root).replace(os.sep, "/")
+                if key.startswith(Prefix) and not name.endswith(".tmp"):
+                    keys.append(key)
+        keys.sort()
+        for start in range(0, len(keys), 1000):
+            yield {"Contents": [{"Key": key} for key in keys[start:start + 1000]]}
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            try:
+                os.remove(self._path(Bucket, obj["Key"]))
+            except FileNotFoundError:
+                pass
+        return {}
+
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None and OBJECT_STORE_DIR:
+        _s3_client = LocalObjectStore(OBJECT_STORE_DIR)
+    if _s3_client is None:
+        # boto3 is slow to import; load it on first use rather than at process start
+        import boto3
+        from botocore.config import Config
+        _s3_client = boto3.client(
+            "s3",
+            region_name=S3_REGION,
+            endpoint_url=S3_ENDPOINT_URL,
+            aws_access_key_id=os.environ.get("S3_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.environ.get("S3_SECRET_ACCESS_KEY"),
+            config=Config(retries={"max_attempts": 5, "mode": "adaptive"}),
+        )
+    return _s3_client
+
+
+def screen_object_key(mcp_job_id: str, order_index: int, viewport: str = None, version: int = 1) -> str:
+    # Desktop (or unspecified) keeps the original key layout; other breakpoints get a suffix.
+    # Recaptures that found changes (monitoring) write under a per-version prefix.
+    suffix = f"_{viewport}" if viewport and viewport != "desktop" else ""
+    prefix = f"v{version}/" if version > 1 else ""
+    return f"mcp_jobs/{mcp_job_id}/{prefix}screen_{order_index + 1}{suffix}.png"
+
+
+def _public_bases() -> list:
+    bases = [f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/"]
+    if S3_PUBLIC_BASE_URL:
+        bases.insert(0, f"{S3_PUBLIC_BASE_URL.rstrip('/')}/")
+    return bases
+
+
+def public_url(key: str) -> str:
+    return f"{_public_bases()[0]}{key}"
+
+
+def object_key(url: str) -> Optional[str]:
+    """The key behind a URL made by public_url (the bucket URL too, for rows stored before a CDN); None otherwise."""
+    for base in _public_bases():
+        if url.startswith(base):
+            return url[len(base):]
+    return None
+
+
+def object_exists(key: str) -> bool:
+    """HEAD the object; used to skip re-uploading work done by a previous attempt."""
+    from botocore.exceptions import ClientError
+    try:
+        get_s3_client().head_object(Bucket=S3_BUCKET_NAME, Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def get_object_bytes(key: str) -> bytes:
+    return get_s3_client().get_object(Bucket=S3_BUCKET_NAME, Key=key)["Body"].read()
+
+
+def upload_bytes(key: str, data: bytes, content_type: str) -> str:
+    """Upload an object and return its public URL."""
+    get_s3_client().put_object(Bucket=S3_BUCKET_NAME, Key=key, Body=data, ContentType=content_type)
+    logger.info(f"Uploaded {len(data)} bytes to s3://{S3_BUCKET_NAME}/{key}")
+    return public_url(key)
+
+
+def delete_prefix(prefix: str) -> int:
+    """Delete every object under `prefix`, up to 1000 per request (DeleteObjects); returns how many."""
+    client = get_s3_client()
+    deleted = 0
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix):
+        keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+        if not keys:
+            continue
+        response = client.delete_objects(Bucket=S3_BUCKET_NAME, Delete={"Objects": keys, "Quiet": True})
+        if response.get("Errors"):
+            raise RuntimeError(f"Could not delete {len(response['Errors'])} objects under {prefix}: {response['Errors'][0]}")
+        deleted += len(keys)
+    return deleted
+
+
+def export_object_key(export_id: str, export_format: str) -> str:
+    return f"exports/{export_id}.{export_format}"
+
+
+def presigned_download_url(key: str, expires_in: int, filename: str = None) -> str:
+    """Time-limited GET link for a private object (exports are not published under the public base URL)."""
+    params = {"Bucket": S3_BUCKET_NAME, "Key": key}
+    if filename:
+        params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+    return get_s3_client().generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+
+
+class MultipartUpload:
+    """File-like writer that streams an object of unknown size to S3 in fixed-size parts.
+
+    Holds at most one part in memory. Completes the upload on a clean exit from the `with`
+    block and aborts it (so no orphaned parts are billed) on an exception.
+    """
+
+    def __init__(self, key: str, content_type: str, part_size: int = S3_MULTIPART_PART_SIZE):
+        self.key = key
+        self.content_type = content_type
+        self.part_size = part_size
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = None
+
+    def __enter__(self):
+        response = get_s3_client().create_multipart_upload(Bucket=S3_BUCKET_NAME, Key=self.key, ContentType=self.content_type)
+        self._upload_id = response["UploadId"]
+        return self
+
+    def write(self, data: bytes):
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+
+    def _upload_part(self, data: bytes):
+        part_number = len(self._parts) + 1
+        response = get_s3_client().upload_part(
+            Bucket=S3_BUCKET_NAME, Key=self.key, UploadId=self._upload_id, PartNumber=part_number, Body=data,
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+    def __exit__(self, exc_type, exc, tb):
+        client = get_s3_client()
+        if exc_type is not None:
+            try:
+                client.abort_multipart_upload(Bucket=S3_BUCKET_NAME, Key=self.key, UploadId=self._upload_id)
+            except Exception as e: # Don't mask the original error
+                logger.warning(f"Could not abort multipart upload of {self.key}: {e}")
+            return False
+        if self._buffer or not self._parts: # The last part may be smaller than the minimum
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        client.complete_multipart_upload(
+            Bucket=S3_BUCKET_NAME, Key=self.key, UploadId=self._upload_id, MultipartUpload={"Parts": self._parts},
+        )
+        logger.info(f"Uploaded {self.bytes_written} bytes in {len(self._parts)} parts to s3://{S3_BUCKET_NAME}/{self.key}")
+        return False
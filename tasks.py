@@ -3,111 +3,701 @@ Celery tasks for FlowVault screenshot generation system.
 """
 import os
 import time
+import uuid
 import logging
-from celery import Celery
-from playwright.sync_api import sync_playwright # Added for placeholder
-import random # For simulating success/failure
+import threading
+from datetime import timedelta
+import redis
+from celery import signals
+from urllib.parse import urlparse, urldefrag
+from celery_client import (
+    celery_app, GENERATE_SCREENSHOTS_TASK, EXPORT_COLLECTION_TASK, STITCH_SCREEN_TASK, RECAPTURE_SWIPE_FILE_TASK, SCHEDULE_RECAPTURES_TASK,
+    PURGE_DELETED_TASK, RECAPTURE_SCHEDULER_TICK_SECONDS, BROWSER_POOL_KEY_PREFIX, send_stitch_screen, send_recapture_swipe_file,
+)
+from tracing import tracer # Registers Celery trace propagation signals
+from redis_client import get_redis
+from job_events import publish_job_event
+from models import SessionLocal, McpJob, SwipeFile, SwipeFileVersion, Screen, PurgeJob, bump_version
+from db_routing import read_session
+from storage import screen_object_key, object_exists, upload_bytes, get_object_bytes, public_url, export_object_key, presigned_download_url, MultipartUpload
+from capture_policy import CircuitOpenError, HostBusyError, circuit_breaker, check_navigation, classify_capture_error, backoff_delay, target_host
+from host_limiter import host_limiter
+from runtime_settings import runtime_settings
+from page_capture import capture_full_page, iter_stitched_png
+from viewports import VIEWPORT_PRESETS, PRIMARY_VIEWPORT, normalize_viewports, viewport_metadata
+from monitoring import RECAPTURE_DEFAULT_INTERVAL_HOURS, RECAPTURE_MAX_PER_TICK, RecaptureSpool, next_recapture_at, screen_units, utcnow, with_fingerprints
+from purge import run_purge_batches
+from exports import EXPORT_MEDIA_TYPES, EXPORT_LINK_EXPIRES_SECONDS, iter_export_items, iter_export, set_export_state
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format=\'%(asctime)s - %(name)s - %(levelname)s - %(message)s\')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Celery Configuration
-CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
-CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+@signals.worker_process_init.connect
+def start_runtime_settings(**kwargs):
+    # Each pool process loads the settings before its first task (the parent's listener thread doesn't survive the fork)
+    runtime_settings.start()
 
-celery_app = Celery(
-    "tasks",
-    broker=CELERY_BROKER_URL,
-    backend=CELERY_RESULT_BACKEND,
-    # Add task_acks_late = True for more robust error handling if needed
-    # task_reject_on_worker_lost = True
-)
+# --- Browser pool heartbeat --- #
+# Each worker advertises its browser slots (one per pool process) and how many are in use,
+# so the API readiness probe can report capture capacity without a Celery broadcast.
+BROWSER_POOL_HEARTBEAT_SECONDS = int(os.environ.get("BROWSER_POOL_HEARTBEAT_SECONDS", "10"))
+MAINTENANCE_DEFER_SECONDS = int(os.environ.get("MAINTENANCE_DEFER_SECONDS", "60"))
+CAPTURE_TASK_NAMES = {GENERATE_SCREENSHOTS_TASK, RECAPTURE_SWIPE_FILE_TASK}
 
-celery_app.conf.update(
-    task_serializer=\'json\',
-    result_serializer=\'json\',
-    accept_content=["json"],
-    timezone=\'UTC\',
-    enable_utc=True,
-    # task_track_started=True, # To get more detailed task status
-)
+@signals.worker_ready.connect
+def start_browser_pool_heartbeat(sender=None, **kwargs):
+    key = f"{BROWSER_POOL_KEY_PREFIX}{sender.hostname}"
+    capacity = sender.controller.concurrency
+
+    def beat():
+        while True:
+            try:
+                pipe = get_redis().pipeline()
+                pipe.hset(key, "capacity", capacity)
+                pipe.hsetnx(key, "active", 0)
+                pipe.expire(key, BROWSER_POOL_HEARTBEAT_SECONDS * 3) # Disappears if the worker dies
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Browser pool heartbeat failed for {sender.hostname}: {e}")
+            time.sleep(BROWSER_POOL_HEARTBEAT_SECONDS)
+
+    threading.Thread(target=beat, name="browser-pool-heartbeat", daemon=True).start()
+    logger.info(f"Browser pool heartbeat started for {sender.hostname} (capacity {capacity}).")
+
+def _adjust_active_browsers(task, delta: int):
+    if task is None or task.name not in CAPTURE_TASK_NAMES or not task.request.hostname:
+        return
+    try:
+        get_redis().hincrby(f"{BROWSER_POOL_KEY_PREFIX}{task.request.hostname}", "active", delta)
+    except redis.RedisError as e:
+        logger.warning(f"Could not update active browser count: {e}")
+
+@signals.task_prerun.connect
+def _claim_browser_slot(task=None, **kwargs):
+    _adjust_active_browsers(task, 1)
+
+@signals.task_postrun.connect
+def _release_browser_slot(task=None, **kwargs):
+    _adjust_active_browsers(task, -1)
+
+# --- Capture helpers --- #
+MAX_FLOW_STEPS = int(os.environ.get("MAX_FLOW_STEPS", "7"))
+NAVIGATION_TIMEOUT_MS = 30000 # 30s timeout
+CAPTURE_VIEWPORT = {key: VIEWPORT_PRESETS[PRIMARY_VIEWPORT][key] for key in ("width", "height")}
+VIEWPORT_SETTLE_MS = int(os.environ.get("VIEWPORT_SETTLE_MS", "500")) # Lets media queries, reflow and srcset images settle after re-emulation
+CAPTURE_STITCH_TILES = os.environ.get("CAPTURE_STITCH_TILES", "false").lower() == "true" # Stitch tiled captures in the background
+UA_SNIFF_LENGTH_RATIO = 0.2 # Bodies differing by more than this (with Vary: User-Agent) count as UA-specific markup
+HOST_MAX_DEFERRALS = int(os.environ.get("HOST_MAX_DEFERRALS", "120"))
+MAX_PAGE_TEXT_CHARS = int(os.environ.get("MAX_PAGE_TEXT_CHARS", "20000")) # Keeps search_vector well under the tsvector size limit
+
+# Visible text only: innerText skips hidden elements, scripts and styles
+EXTRACT_PAGE_TEXT_JS = """() => ({
+    title: document.title || "",
+    headings: Array.from(document.querySelectorAll("h1, h2, h3")).map(h => h.innerText.trim()).filter(Boolean),
+    text: document.body ? document.body.innerText : "",
+})"""
 
-@celery_app.task(name="generate_screenshots_task", bind=True, max_retries=3, default_retry_delay=60) # Added bind=True, retries
-def generate_screenshots_task(self, target_url: str, mcp_job_id: str):
+def _discover_flow_steps(page, target_url: str) -> list:
+    """Landing page first, then distinct same-origin links in document order (up to MAX_FLOW_STEPS)."""
+    origin = urlparse(target_url).netloc
+    steps = [target_url]
+    for href in page.eval_on_selector_all("a[href]", "els => els.map(e => e.href)"):
+        url = urldefrag(href)[0]
+        parsed = urlparse(url)
+        if parsed.scheme in ("http", "https") and parsed.netloc == origin and url not in steps:
+            steps.append(url)
+        if len(steps) >= MAX_FLOW_STEPS:
+            break
+    return steps
+
+def _extract_page_text(page) -> dict:
+    content = page.evaluate(EXTRACT_PAGE_TEXT_JS)
+    text = " ".join(content["text"].split()) # Collapse layout whitespace
+    return {
+        "page_title": content["title"][:500] or None,
+        "page_headings": "\n".join(content["headings"])[:5000] or None,
+        "page_text": text[:MAX_PAGE_TEXT_CHARS] or None,
+    }
+
+def _varies_by_user_agent(context, url: str, preset: dict, host: str) -> bool:
+    """Whether the site serves different markup to this device's User-Agent.
+
+    Resizing an already loaded page only exercises CSS breakpoints; sites that sniff the UA
+    server-side (m. subdomains, separate mobile templates) need a real device navigation.
+    Signals: a different final URL for the device UA, or `Vary: User-Agent` together with a
+    clearly different body.
+    """
+    try:
+        host_limiter.wait_for_turn(host)
+        desktop = context.request.get(url, timeout=NAVIGATION_TIMEOUT_MS)
+        host_limiter.wait_for_turn(host)
+        device = context.request.get(url, headers={"User-Agent": preset["user_agent"]}, timeout=NAVIGATION_TIMEOUT_MS)
+    except Exception as e:
+        logger.warning(f"UA sniffing probe for {url} failed ({e}); using a separate device context to be safe.")
+        return True
+    if urlparse(desktop.url)[:3] != urlparse(device.url)[:3]: # scheme, host, path
+        return True
+    if "user-agent" in desktop.headers.get("vary", "").lower():
+        desktop_length, device_length = len(desktop.body()), len(device.body())
+        return abs(desktop_length - device_length) > UA_SNIFF_LENGTH_RATIO * max(desktop_length, device_length, 1)
+    return False
+
+def _emulate_viewport(page, cdp, preset: dict):
+    """Re-emulate the loaded page as another device: size via Playwright, DPR/mobile/touch via CDP."""
+    page.set_viewport_size({"width": preset["width"], "height": preset["height"]})
+    cdp.send("Emulation.setDeviceMetricsOverride", {
+        "width": preset["width"], "height": preset["height"],
+        "deviceScaleFactor": preset["device_scale_factor"], "mobile": preset["is_mobile"],
+    })
+    cdp.send("Emulation.setTouchEmulationEnabled", {"enabled": preset["has_touch"]})
+    page.wait_for_timeout(VIEWPORT_SETTLE_MS)
+
+def _reset_emulation(page, cdp):
+    cdp.send("Emulation.clearDeviceMetricsOverride")
+    cdp.send("Emulation.setTouchEmulationEnabled", {"enabled": False})
+    page.set_viewport_size(CAPTURE_VIEWPORT)
+
+def _new_device_page(browser, preset: dict):
+    context = browser.new_context(
+        viewport={"width": preset["width"], "height": preset["height"]}, device_scale_factor=preset["device_scale_factor"],
+        is_mobile=preset["is_mobile"], has_touch=preset["has_touch"], user_agent=preset["user_agent"],
+    )
+    return context.new_page()
+
+def _upload_png(key: str, data: bytes, content_type: str) -> str:
+    with tracer.start_as_current_span("storage.upload"):
+        return upload_bytes(key, data, content_type)
+
+def _screen_id(mcp_job_id: str, order_index: int, viewport: str) -> str:
+    suffix = f"_{viewport}" if viewport != PRIMARY_VIEWPORT else ""
+    return f"scr_{mcp_job_id}_{order_index}{suffix}"
+
+def _get_or_create_swipe_file(db, job) -> SwipeFile:
+    swipe_file = db.query(SwipeFile).filter(SwipeFile.mcp_job_id == job.id).first()
+    if swipe_file is None:
+        swipe_file = SwipeFile(id=f"sf_{job.id[:8]}", original_url=job.target_url, owner_user_id=job.submitted_by_user_id, mcp_job_id=job.id)
+        db.add(swipe_file)
+        db.commit()
+    return swipe_file
+
+def _mark_job_failed(mcp_job_id: str, error_message: str):
+    with SessionLocal() as db:
+        job = db.get(McpJob, mcp_job_id)
+        if job is not None:
+            job.status = "failed"
+            job.error_message = error_message
+            db.commit()
+
+def _defer_for_host(task, target_url: str, mcp_job_id: str, host: str, deferrals: int, viewports: list = None):
+    """Re-enqueue a task whose target host is at its concurrency limit, freeing this worker slot.
+
+    Deferrals don't count as retries: the retry budget is kept for real failures.
+    """
+    if deferrals >= HOST_MAX_DEFERRALS:
+        raise HostBusyError(f"{host} stayed at its concurrency limit for {deferrals} deferrals")
+    countdown = host_limiter.defer_delay(deferrals)
+    task.apply_async(
+        kwargs={"target_url": target_url, "mcp_job_id": mcp_job_id, "deferrals": deferrals + 1, "viewports": viewports},
+        countdown=countdown,
+        retries=task.request.retries,
+    )
+    logger.info(f"[MCP Job {mcp_job_id}] {host} is at its concurrency limit; deferred for {countdown:.1f}s (deferral {deferrals + 1}).")
+    publish_job_event(mcp_job_id, "deferred", reason="host_busy", retry_in_seconds=round(countdown))
+    return {"status": "deferred", "mcp_job_id": mcp_job_id}
+
+@celery_app.task(name=GENERATE_SCREENSHOTS_TASK, bind=True, max_retries=3, ignore_result=True) # Retry delay comes from capture_policy.backoff_delay
+def generate_screenshots_task(self, target_url: str, mcp_job_id: str, deferrals: int = 0, viewports: list = None):
     """
     Task to generate screenshots for a given URL.
-    Simulates Playwright usage and interaction with storage/database.
+
+    Each captured step is uploaded and committed as a `Screen` row as soon as it is produced,
+    and `McpJob.completed_steps` is advanced in the same transaction. A retry resumes after the
+    last committed step, and skips capturing (and uploading) any step whose object already
+    exists in storage from an attempt that died between upload and commit.
+
+    Captures hold a fleet-wide lease on the target host (see host_limiter); when the host is at
+    its limit the task is deferred rather than waiting in the worker.
+
+    With several viewports, each step is navigated once and every breakpoint is shot from that
+    page by re-emulating the device; only sites that vary their markup by User-Agent get a
+    separate device context (and navigation) per breakpoint. Every breakpoint is its own
+    `Screen` (same order_index, viewport in metadata), committed together with the step.
 
     Args:
         self: The task instance (when bind=True).
         target_url: The URL to capture screenshots from.
         mcp_job_id: The ID of the MCP job.
+        deferrals: How many times the task was deferred because the host was busy.
+        viewports: Breakpoint names from viewports.VIEWPORT_PRESETS (default: desktop only).
     """
     logger.info(f"[MCP Job {mcp_job_id} - Task ID: {self.request.id}] Received task for URL: {target_url}")
+    host = target_host(target_url)
+    viewports = normalize_viewports(viewports)
+    lease = None
 
-    # Placeholder for actual database interaction to update job status to \'processing\'
-    # db.update_mcp_job_status(mcp_job_id, "processing", task_id=self.request.id)
-    logger.info(f"[MCP Job {mcp_job_id}] Status updated to \'processing\'.")
+    if runtime_settings.get("maintenance_mode"):
+        # Hold queued captures until maintenance ends; neither a deferral nor a retry
+        self.apply_async(
+            kwargs={"target_url": target_url, "mcp_job_id": mcp_job_id, "deferrals": deferrals, "viewports": viewports},
+            countdown=MAINTENANCE_DEFER_SECONDS,
+            retries=self.request.retries,
+        )
+        publish_job_event(mcp_job_id, "deferred", reason="maintenance", retry_in_seconds=MAINTENANCE_DEFER_SECONDS)
+        return {"status": "deferred", "mcp_job_id": mcp_job_id}
 
     try:
-        # Simulate Playwright launch and navigation
-        logger.info(f"[MCP Job {mcp_job_id}] Initializing headless browser (simulated)...")
-        time.sleep(random.uniform(1, 3)) # Simulate browser launch time
-        # with sync_playwright() as p:
-        #     browser = p.chromium.launch(headless=True)
-        #     page = browser.new_page()
-        #     logger.info(f"[MCP Job {mcp_job_id}] Navigating to {target_url} (simulated)...")
-        #     page.goto(target_url, wait_until="networkidle", timeout=30000) # 30s timeout
-        #     logger.info(f"[MCP Job {mcp_job_id}] Navigation successful.")
-
-        # Simulate identifying core flows and taking screenshots
-        num_screenshots = random.randint(3, 7)
-        screenshots_data = []
-        for i in range(num_screenshots):
-            # logger.info(f"[MCP Job {mcp_job_id}] Capturing screenshot {i+1}/{num_screenshots} (simulated)...")
-            # screenshot_path = f"/tmp/screenshots/{mcp_job_id}_screen_{i+1}.png"
-            # page.screenshot(path=screenshot_path, full_page=True)
-            # logger.info(f"[MCP Job {mcp_job_id}] Screenshot {i+1} saved to {screenshot_path} (simulated).")
-            
-            # Simulate uploading to S3 and getting URL
-            # s3_url = s3_service.upload(screenshot_path, f"mcp_jobs/{mcp_job_id}/screen_{i+1}.png")
-            s3_url = f"https://s3.example.com/flowvault/{mcp_job_id}/screen_{i+1}.png"
-            screenshots_data.append({"order_index": i, "image_url": s3_url, "alt_text": f"Screenshot {i+1} for {target_url}"})
-            time.sleep(random.uniform(0.5, 1.5)) # Simulate time per screenshot
-        
-        logger.info(f"[MCP Job {mcp_job_id}] Captured {num_screenshots} screenshots (simulated). Data: {screenshots_data}")
-
-        # Simulate success or failure for the overall job
-        if random.random() < 0.1: # 10% chance of simulated failure
-            raise Exception("Simulated critical error during screenshot processing.")
-
-        # Placeholder for database interaction to update job status to \'completed\'
-        # and save swipe_file and screen records
-        # swipe_file_id = db.create_swipe_file(mcp_job_id, target_url, user_id_from_job, screenshots_data)
-        # db.update_mcp_job_status(mcp_job_id, "completed", swipe_file_id=swipe_file_id)
-        swipe_file_id = f"sf_{mcp_job_id[:8]}"
-        logger.info(f"[MCP Job {mcp_job_id}] Successfully generated screenshots. SwipeFile ID: {swipe_file_id} (simulated). Status updated to \'completed\'.")
-        
-        return {"status": "completed", "mcp_job_id": mcp_job_id, "swipe_file_id": swipe_file_id, "screenshots": screenshots_data, "message": f"Screenshots for {target_url} generated."}
+        if not circuit_breaker.allow(host, holder=mcp_job_id):
+            raise CircuitOpenError(f"Circuit open for {host}: too many recent failures, not attempting capture")
+
+        lease = host_limiter.try_acquire(host)
+        if lease is None:
+            return _defer_for_host(self, target_url, mcp_job_id, host, deferrals, viewports)
+
+        with SessionLocal() as db:
+            job = db.get(McpJob, mcp_job_id)
+            if job is None:
+                raise ValueError(f"MCP job {mcp_job_id} does not exist")
+            db.info["user_id"] = job.submitted_by_user_id # The submitter reads their new screens from the primary until replicas catch up
+            job.status = "processing"
+            job.celery_task_id = self.request.id
+            db.commit()
+            logger.info(f"[MCP Job {mcp_job_id}] Status updated to 'processing' (resuming after step {job.completed_steps}).")
+            publish_job_event(mcp_job_id, "processing", target_url=target_url, attempt=self.request.retries + 1, completed_steps=job.completed_steps)
+
+            swipe_file = _get_or_create_swipe_file(db, job)
+
+            # Imported here so only processes that actually capture pay for loading Playwright
+            from playwright.sync_api import sync_playwright
+
+            with sync_playwright() as p:
+                with tracer.start_as_current_span("capture.browser_launch"):
+                    logger.info(f"[MCP Job {mcp_job_id}] Initializing headless browser...")
+                    browser = p.chromium.launch(headless=True)
+                    page = browser.new_page(viewport=CAPTURE_VIEWPORT)
+
+                try:
+                    if job.capture_plan is None:
+                        # The plan is checkpointed so every attempt walks exactly the same steps
+                        with tracer.start_as_current_span("capture.navigate"):
+                            host_limiter.wait_for_turn(host)
+                            response = page.goto(target_url, wait_until="networkidle", timeout=NAVIGATION_TIMEOUT_MS)
+                            check_navigation(response, page, target_url)
+                        job.capture_plan = _discover_flow_steps(page, target_url)
+                        db.commit()
+                        logger.info(f"[MCP Job {mcp_job_id}] Capture plan: {len(job.capture_plan)} steps.")
+
+                    # Breakpoints the site renders differently by User-Agent get their own device page
+                    separate_pages = {}
+                    if job.completed_steps < len(job.capture_plan):
+                        for viewport in viewports:
+                            preset = VIEWPORT_PRESETS[viewport]
+                            if preset["user_agent"] and _varies_by_user_agent(page.context, target_url, preset, host):
+                                logger.info(f"[MCP Job {mcp_job_id}] {host} varies markup by User-Agent; capturing '{viewport}' in a separate context.")
+                                separate_pages[viewport] = _new_device_page(browser, preset)
+                    cdp = None
+
+                    for i, step_url in enumerate(job.capture_plan):
+                        if i < job.completed_steps:
+                            continue # Committed by a previous attempt
+
+                        keys = {viewport: screen_object_key(mcp_job_id, i, viewport) for viewport in viewports}
+                        # Uploaded by an attempt that died before committing; no need to capture again
+                        pending = [viewport for viewport in viewports if not object_exists(keys[viewport])]
+                        alt_text = f"Screenshot {i+1} for {step_url}"
+                        page_content = {}
+                        if any(viewport not in separate_pages for viewport in pending):
+                            if page.url != step_url:
+                                with tracer.start_as_current_span("capture.navigate"):
+                                    host_limiter.wait_for_turn(host)
+                                    response = page.goto(step_url, wait_until="networkidle", timeout=NAVIGATION_TIMEOUT_MS)
+                                    check_navigation(response, page, step_url)
+                            page_content = _extract_page_text(page)
+                            alt_text = f"{page_content['page_title'] or 'Screenshot'} ({step_url})"
+
+                        captured = [] # (viewport, image_url, emulation, tiles manifest)
+                        emulated = False
+                        for viewport in viewports:
+                            emulation = "separate_context" if viewport in separate_pages else "shared_navigation"
+                            with tracer.start_as_current_span("capture.screenshot") as span:
+                                span.set_attribute("capture.order_index", i)
+                                span.set_attribute("capture.viewport", viewport)
+                                tiles = None
+                                if viewport not in pending:
+                                    logger.info(f"[MCP Job {mcp_job_id}] Step {i+1} ({viewport}) already in storage, skipping capture.")
+                                    image_url = public_url(keys[viewport])
+                                else:
+                                    shot_page = page
+                                    if viewport in separate_pages:
+                                        shot_page = separate_pages[viewport]
+                                        with tracer.start_as_current_span("capture.navigate"):
+                                            host_limiter.wait_for_turn(host)
+                                            response = shot_page.goto(step_url, wait_until="networkidle", timeout=NAVIGATION_TIMEOUT_MS)
+                                            check_navigation(response, shot_page, step_url)
+                                    elif viewport != PRIMARY_VIEWPORT:
+                                        if cdp is None:
+                                            cdp = page.context.new_cdp_session(page)
+                                        _emulate_viewport(page, cdp, VIEWPORT_PRESETS[viewport])
+                                        emulated = True
+                                    # Tall pages are shot and uploaded tile by tile (see page_capture); their
+                                    # main key only exists once stitched, so a retry re-captures them.
+                                    image_url, tiles = capture_full_page(shot_page, keys[viewport], _upload_png)
+                            captured.append((viewport, image_url, emulation, tiles))
+                        if emulated:
+                            _reset_emulation(page, cdp) # Next step loads at desktop size again
+
+                        with tracer.start_as_current_span("db.write") as span:
+                            span.set_attribute("db.operation", "insert_screen")
+                            for n, (viewport, image_url, emulation, tiles) in enumerate(captured):
+                                metadata = {"viewport": viewport_metadata(viewport), "emulation": emulation}
+                                if tiles:
+                                    metadata["tiles"] = tiles
+                                # merge() keeps this idempotent if the row was written but the checkpoint was not.
+                                # Page text is indexed once per step (on the first breakpoint), not per variant.
+                                db.merge(Screen(
+                                    id=_screen_id(mcp_job_id, i, viewport), swipe_file_id=swipe_file.id, image_url=image_url, order_index=i, alt_text=alt_text,
+                                    screen_metadata=metadata,
+                                    **(page_content if n == 0 else {}),
+                                ))
+                            job.completed_steps = i + 1
+                            db.commit()
+                        for viewport, image_url, _, tiles in captured:
+                            publish_job_event(mcp_job_id, "screen", order_index=i, viewport=viewport, image_url=image_url, alt_text=alt_text,
+                                              tiles=[tile["url"] for tile in tiles["tiles"]] if tiles else None) # Push each screen as soon as it exists
+                            if tiles and CAPTURE_STITCH_TILES:
+                                send_stitch_screen(_screen_id(mcp_job_id, i, viewport))
+                        host_limiter.renew(host, lease)
+                finally:
+                    browser.close()
+
+            with tracer.start_as_current_span("db.write") as span:
+                span.set_attribute("db.operation", "complete_job")
+                if swipe_file.title is None:
+                    # Title the swipe from the landing page so it is searchable by name
+                    swipe_file.title = db.query(Screen.page_title).filter(
+                        Screen.swipe_file_id == swipe_file.id, Screen.order_index == 0, Screen.page_title.isnot(None),
+                    ).limit(1).scalar() # One row per breakpoint; only the first carries page text
+                    bump_version(swipe_file)
+                job.status = "completed"
+                job.swipe_file_id = swipe_file.id
+                job.error_message = None
+                db.commit()
+            screen_count = job.completed_steps
+            swipe_file_id = swipe_file.id
+
+        circuit_breaker.record_success(host, holder=mcp_job_id)
+        logger.info(f"[MCP Job {mcp_job_id}] Successfully generated {screen_count} screenshots. SwipeFile ID: {swipe_file_id}. Status updated to 'completed'.")
+        publish_job_event(mcp_job_id, "completed", swipe_file_id=swipe_file_id, screen_count=screen_count)
+
+        return {"status": "completed", "mcp_job_id": mcp_job_id, "swipe_file_id": swipe_file_id, "screen_count": screen_count, "message": f"Screenshots for {target_url} generated."}
 
     except Exception as e:
-        logger.error(f"[MCP Job {mcp_job_id} - Task ID: {self.request.id}] Error during screenshot generation for {target_url}: {e}", exc_info=True)
-        # Placeholder for database interaction to update job status to \'failed\'
-        # db.update_mcp_job_status(mcp_job_id, "failed", error_message=str(e))
-        try:
-            # Retry the task if it is a retryable error and retries are left
-            logger.warning(f"[MCP Job {mcp_job_id}] Retrying task {self.request.id} due to error: {e}. Retries left: {self.request.retries}/{self.max_retries}")
-            raise self.retry(exc=e)
-        except self.MaxRetriesExceededError:
+        classification = classify_capture_error(e)
+        logger.error(f"[MCP Job {mcp_job_id} - Task ID: {self.request.id}] Error during screenshot generation for {target_url} ({classification.reason}): {e}", exc_info=not isinstance(e, CircuitOpenError))
+        if classification.host_fault:
+            circuit_breaker.record_failure(host)
+
+        if classification.retryable and self.request.retries < self.max_retries:
+            countdown = backoff_delay(self.request.retries)
+            logger.warning(f"[MCP Job {mcp_job_id}] Retrying task {self.request.id} in {countdown:.0f}s ({classification.reason}). Retry {self.request.retries + 1}/{self.max_retries}")
+            publish_job_event(mcp_job_id, "retrying", error=str(e), reason=classification.reason, attempt=self.request.retries + 1, retry_in_seconds=round(countdown))
+            raise self.retry(exc=e, countdown=countdown) # The job keeps its checkpoint
+
+        if classification.retryable:
             logger.error(f"[MCP Job {mcp_job_id}] Max retries exceeded for task {self.request.id}. Marking as failed.")
-            # Final failure update in DB
-            return {"status": "failed", "mcp_job_id": mcp_job_id, "message": f"Failed to generate screenshots for {target_url} after multiple retries: {e}"}
-        except Exception as retry_exc: # Catch other exceptions during retry attempt
-            logger.error(f"[MCP Job {mcp_job_id}] Unexpected error during retry logic for task {self.request.id}: {retry_exc}")
-            return {"status": "failed", "mcp_job_id": mcp_job_id, "message": f"Unexpected error during retry logic for {target_url}: {retry_exc}"}
-
-# Example of how to call the task (from main.py or other services):
-# from tasks import generate_screenshots_task
-# task_info = generate_screenshots_task.delay(target_url="https://example.com", mcp_job_id="some_job_id")
+            message = f"Failed to generate screenshots for {target_url} after multiple retries: {e}"
+        else:
+            logger.error(f"[MCP Job {mcp_job_id}] Permanent failure ({classification.reason}), not retrying.")
+            message = f"Failed to generate screenshots for {target_url}: {e}"
+        _mark_job_failed(mcp_job_id, message)
+        publish_job_event(mcp_job_id, "failed", error=str(e), reason=classification.reason)
+        return {"status": "failed", "mcp_job_id": mcp_job_id, "reason": classification.reason, "message": message}
+
+    finally:
+        if lease is not None:
+            host_limiter.release(host, lease)
+
+@celery_app.task(name=EXPORT_COLLECTION_TASK, bind=True, max_retries=2, ignore_result=True)
+def export_collection_task(self, export_id: str, collection_id: str, export_format: str, swipe_file_id: str = None):
+    """Builds a large collection export straight into S3 (multipart) and records a download link.
+
+    The screen list (archive names and image URLs) is read first and the session closed, so no
+    transaction stays open while images download; the archive is uploaded part by part, so the
+    images themselves never accumulate in memory.
+    """
+    logger.info(f"[Export {export_id}] Building {export_format} export of collection {collection_id} (swipe file: {swipe_file_id or 'all'})")
+    set_export_state(export_id, status="processing")
+    key = export_object_key(export_id, export_format)
+    try:
+        with read_session() as db: # A replica if available
+            items = list(iter_export_items(db, collection_id, swipe_file_id))
+        with MultipartUpload(key, EXPORT_MEDIA_TYPES[export_format]) as upload:
+            for chunk in iter_export(items, export_format):
+                upload.write(chunk)
+        download_url = presigned_download_url(key, EXPORT_LINK_EXPIRES_SECONDS, filename=f"{collection_id}.{export_format}")
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            logger.warning(f"[Export {export_id}] Failed, retrying: {e}")
+            raise self.retry(exc=e, countdown=backoff_delay(self.request.retries))
+        logger.error(f"[Export {export_id}] Failed: {e}", exc_info=True)
+        set_export_state(export_id, status="failed", error=str(e))
+        return {"status": "failed", "export_id": export_id}
+
+    set_export_state(export_id, status="completed", download_url=download_url, size_bytes=upload.bytes_written, expires_in_seconds=EXPORT_LINK_EXPIRES_SECONDS)
+    logger.info(f"[Export {export_id}] Completed ({upload.bytes_written} bytes).")
+    return {"status": "completed", "export_id": export_id}
+
+@celery_app.task(name=PURGE_DELETED_TASK, bind=True, max_retries=5, ignore_result=True) # Routed to the maintenance queue
+def purge_deleted_task(self, purge_job_id: str):
+    """Removes a soft-deleted user, team or collection a bounded slice at a time (see purge.py).
+
+    Runs up to PURGE_BATCHES_PER_TASK batches, then re-enqueues itself until the plan is done;
+    the job's checkpoint makes every invocation (and retry) resume where the last one stopped.
+    """
+    if runtime_settings.get("maintenance_mode"):
+        self.apply_async(kwargs={"purge_job_id": purge_job_id}, countdown=MAINTENANCE_DEFER_SECONDS, retries=self.request.retries)
+        return
+    with SessionLocal() as db:
+        job = db.get(PurgeJob, purge_job_id)
+        if job is None or job.status == "completed":
+            return
+        try:
+            done = run_purge_batches(db, job)
+        except Exception as e:
+            db.rollback()
+            if self.request.retries < self.max_retries:
+                logger.warning(f"[Purge {purge_job_id}] Batch failed, retrying: {e}")
+                raise self.retry(exc=e, countdown=backoff_delay(self.request.retries))
+            logger.error(f"[Purge {purge_job_id}] Failed: {e}", exc_info=True)
+            job.status = "failed"
+            job.error_message = str(e)
+            db.commit()
+            return
+        if done:
+            logger.info(f"[Purge {purge_job_id}] {job.entity_type} {job.entity_id} purged: {job.progress}")
+            return
+    self.apply_async(kwargs={"purge_job_id": purge_job_id}) # Next slice; other maintenance work can run in between
+
+@celery_app.task(name=STITCH_SCREEN_TASK, bind=True, max_retries=2, ignore_result=True)
+def stitch_screen_task(self, screen_id: str):
+    """Stitches a tiled capture into one PNG at the screen's main key and points image_url at it.
+
+    Tiles are downloaded one at a time and the PNG is encoded and uploaded (multipart) as it is
+    produced, so this is as memory-bounded as the tiled capture itself.
+    """
+    with SessionLocal() as db:
+        screen = db.get(Screen, screen_id)
+        manifest = (screen.screen_metadata or {}).get("tiles") if screen is not None else None
+        if not manifest or manifest.get("stitched"):
+            return {"status": "skipped", "screen_id": screen_id}
+        try:
+            with MultipartUpload(manifest["stitched_key"], "image/png") as upload:
+                tiles = (get_object_bytes(tile["key"]) for tile in manifest["tiles"])
+                for chunk in iter_stitched_png(tiles, manifest["pixel_width"], manifest["pixel_height"]):
+                    upload.write(chunk)
+        except Exception as e:
+            logger.warning(f"Stitching {screen_id} failed, retrying: {e}")
+            raise self.retry(exc=e, countdown=backoff_delay(self.request.retries))
+        # Reassign (not mutate) so the JSON column change is detected
+        screen.screen_metadata = {**screen.screen_metadata, "tiles": {**manifest, "stitched": True}}
+        screen.image_url = public_url(manifest["stitched_key"])
+        db.commit()
+    logger.info(f"Stitched {len(manifest['tiles'])} tiles of {screen_id} ({upload.bytes_written} bytes).")
+    return {"status": "completed", "screen_id": screen_id}
+
+# --- Monitoring: scheduled recapture of tracked swipe files --- #
+
+@celery_app.task(name=SCHEDULE_RECAPTURES_TASK, ignore_result=True)
+def schedule_recaptures_task():
+    """Beat tick: dispatches tracked swipe files whose slot falls before the next tick.
+
+    Each is sent with a countdown to its exact slot, so recaptures stay spread out rather than
+    arriving in per-tick bursts. Rows are claimed with SKIP LOCKED and advanced to their next
+    slot in the same transaction, so an overlapping tick never dispatches a file twice.
+    """
+    if runtime_settings.get("maintenance_mode"):
+        return # Due files stay due; the first tick after maintenance sends them
+    now = utcnow()
+    horizon = now + timedelta(seconds=RECAPTURE_SCHEDULER_TICK_SECONDS)
+    with SessionLocal() as db:
+        due = (
+            db.query(SwipeFile)
+            .filter(SwipeFile.is_tracked.is_(True), SwipeFile.next_recapture_at < horizon)
+            .order_by(SwipeFile.next_recapture_at)
+            .limit(RECAPTURE_MAX_PER_TICK)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        dispatch = []
+        for swipe_file in due:
+            dispatch.append((swipe_file.id, max(0.0, (swipe_file.next_recapture_at - now).total_seconds())))
+            interval = swipe_file.recapture_interval_hours or RECAPTURE_DEFAULT_INTERVAL_HOURS
+            swipe_file.next_recapture_at = next_recapture_at(swipe_file.id, interval, max(swipe_file.next_recapture_at, now))
+        db.commit()
+    for swipe_file_id, countdown in dispatch:
+        send_recapture_swipe_file(swipe_file_id, countdown=countdown)
+    if dispatch:
+        logger.info(f"Scheduled {len(dispatch)} recaptures over the next {RECAPTURE_SCHEDULER_TICK_SECONDS}s.")
+
+def _screen_viewport(screen) -> str:
+    return ((screen.screen_metadata or {}).get("viewport") or {}).get("name") or PRIMARY_VIEWPORT
+
+def _recapture_swipe_file(swipe_file_id: str, host: str, lease: str) -> dict:
+    # Imported here so only processes that actually capture pay for loading Playwright
+    from playwright.sync_api import sync_playwright
+
+    with SessionLocal() as db:
+        swipe_file = db.get(SwipeFile, swipe_file_id)
+        screens = db.query(Screen).filter(Screen.swipe_file_id == swipe_file_id).order_by(Screen.order_index, Screen.id).all()
+        by_step = {}
+        for screen in screens:
+            by_step.setdefault(screen.order_index, {})[_screen_viewport(screen)] = screen
+        # Same steps as the original capture; links added to the site since are not followed
+        plan = (swipe_file.source_job.capture_plan if swipe_file.source_job else None) or [swipe_file.original_url]
+        key_base = swipe_file.mcp_job_id or swipe_file.id
+        new_version = swipe_file.capture_version + 1
+        changed = [] # (screen, image_url, metadata, page text or {}, alt_text)
+        changes = []
+
+        with sync_playwright() as p:
+            with tracer.start_as_current_span("capture.browser_launch"):
+                browser = p.chromium.launch(headless=True)
+                page = browser.new_page(viewport=CAPTURE_VIEWPORT)
+            device_pages = {}
+            cdp = None
+            try:
+                for i, step_url in enumerate(plan):
+                    step_screens = by_step.get(i)
+                    if not step_screens:
+                        continue
+                    with tracer.start_as_current_span("capture.navigate"):
+                        host_limiter.wait_for_turn(host)
+                        response = page.goto(step_url, wait_until="networkidle", timeout=NAVIGATION_TIMEOUT_MS)
+                        check_navigation(response, page, step_url)
+                    page_content = _extract_page_text(page)
+                    alt_text = f"{page_content['page_title'] or 'Screenshot'} ({step_url})"
+                    emulated = False
+                    for n, viewport in enumerate(normalize_viewports(step_screens)):
+                        screen = step_screens[viewport]
+                        shot_page = page
+                        # Shoot each breakpoint the way it was first shot, so the images are comparable
+                        if (screen.screen_metadata or {}).get("emulation") == "separate_context":
+                            if viewport not in device_pages:
+                                device_pages[viewport] = _new_device_page(browser, VIEWPORT_PRESETS[viewport])
+                            shot_page = device_pages[viewport]
+                            with tracer.start_as_current_span("capture.navigate"):
+                                host_limiter.wait_for_turn(host)
+                                response = shot_page.goto(step_url, wait_until="networkidle", timeout=NAVIGATION_TIMEOUT_MS)
+                                check_navigation(response, shot_page, step_url)
+                        elif viewport != PRIMARY_VIEWPORT:
+                            if cdp is None:
+                                cdp = page.context.new_cdp_session(page)
+                            _emulate_viewport(page, cdp, VIEWPORT_PRESETS[viewport])
+                            emulated = True
+
+                        spool = RecaptureSpool(screen_units(screen.image_url, screen.screen_metadata))
+                        try:
+                            with tracer.start_as_current_span("capture.screenshot") as span:
+                                span.set_attribute("capture.order_index", i)
+                                span.set_attribute("capture.viewport", viewport)
+                                image_url, tiles = capture_full_page(shot_page, screen_object_key(key_base, i, viewport, new_version), spool)
+                            if spool.changed:
+                                spool.flush(_upload_png)
+                                metadata = {key: value for key, value in (screen.screen_metadata or {}).items() if key not in ("tiles", "fingerprint")}
+                                if tiles:
+                                    metadata["tiles"] = tiles
+                                metadata["capture_version"] = new_version
+                                changed.append((screen, image_url, with_fingerprints(metadata, spool.fingerprints), page_content if n == 0 else {}, alt_text))
+                                changes.append({"screen_id": screen.id, "order_index": i, "viewport": viewport, **spool.summary()})
+                            elif spool.previous_fingerprints != [unit["fingerprint"] for unit in screen_units(screen.image_url, screen.screen_metadata)]:
+                                # Unchanged: only remember fingerprints computed for the stored images (a DB write, no storage)
+                                screen.screen_metadata = with_fingerprints(screen.screen_metadata, spool.previous_fingerprints)
+                        finally:
+                            spool.close()
+                    if emulated:
+                        _reset_emulation(page, cdp)
+                    host_limiter.renew(host, lease)
+            finally:
+                browser.close()
+
+        now = utcnow()
+        if changed:
+            with tracer.start_as_current_span("db.write") as span:
+                span.set_attribute("db.operation", "new_capture_version")
+                db.add(SwipeFileVersion(
+                    id=f"sfv_{uuid.uuid4().hex[:12]}", swipe_file_id=swipe_file.id, version=swipe_file.capture_version, changes=changes,
+                    screens=[{"screen_id": screen.id, "order_index": screen.order_index, "viewport": _screen_viewport(screen),
+                              "image_url": screen.image_url, "metadata": screen.screen_metadata} for screen in screens],
+                ))
+                for screen, image_url, metadata, content, alt_text in changed:
+                    screen.image_url = image_url
+                    screen.screen_metadata = metadata
+                    screen.alt_text = alt_text
+                    screen.thumbnail_url = None # Generated from the previous image
+                    for column, value in content.items():
+                        setattr(screen, column, value)
+                swipe_file.capture_version = new_version
+                swipe_file.last_changed_at = now
+                bump_version(swipe_file)
+        swipe_file.last_recaptured_at = now
+        db.commit()
+
+    if CAPTURE_STITCH_TILES:
+        for screen, _, metadata, _, _ in changed:
+            if metadata.get("tiles"):
+                send_stitch_screen(screen.id)
+    if changed:
+        logger.info(f"[Recapture {swipe_file_id}] {len(changed)} of {len(screens)} screens changed; stored as version {new_version}.")
+        return {"status": "changed", "swipe_file_id": swipe_file_id, "version": new_version, "changed_screens": len(changed)}
+    logger.info(f"[Recapture {swipe_file_id}] No visual changes across {len(screens)} screens.")
+    return {"status": "unchanged", "swipe_file_id": swipe_file_id}
+
+@celery_app.task(name=RECAPTURE_SWIPE_FILE_TASK, bind=True, max_retries=2, ignore_result=True)
+def recapture_swipe_file_task(self, swipe_file_id: str, deferrals: int = 0):
+    """Re-shoots a tracked swipe file and stores a new version only if a screen changed.
+
+    Walks the original job's capture plan at the breakpoints it was captured at. Every image is
+    compared with the stored one before anything is uploaded (monitoring.RecaptureSpool):
+    unchanged screens cost the capture only; changed ones are uploaded under the next version's
+    keys, replace the current Screen rows, and the screens they replace are archived in
+    SwipeFileVersion. Goes through the same circuit breaker and host limiter as first captures.
+    """
+    with SessionLocal() as db:
+        swipe_file = db.get(SwipeFile, swipe_file_id)
+        if swipe_file is None or not swipe_file.is_tracked:
+            return {"status": "skipped", "swipe_file_id": swipe_file_id}
+        host = target_host(swipe_file.original_url)
+
+    if not circuit_breaker.allow(host, holder=f"recapture:{swipe_file_id}"):
+        logger.info(f"[Recapture {swipe_file_id}] Circuit open for {host}; skipping until the next scheduled run.")
+        return {"status": "skipped", "swipe_file_id": swipe_file_id, "reason": "circuit_open"}
+    lease = host_limiter.try_acquire(host)
+    if lease is None:
+        if deferrals >= HOST_MAX_DEFERRALS:
+            logger.warning(f"[Recapture {swipe_file_id}] {host} stayed busy; skipping until the next scheduled run.")
+            return {"status": "skipped", "swipe_file_id": swipe_file_id, "reason": "host_busy"}
+        self.apply_async(kwargs={"swipe_file_id": swipe_file_id, "deferrals": deferrals + 1},
+                         countdown=host_limiter.defer_delay(deferrals), retries=self.request.retries)
+        return {"status": "deferred", "swipe_file_id": swipe_file_id}
+
+    try:
+        result = _recapture_swipe_file(swipe_file_id, host, lease)
+        circuit_breaker.record_success(host, holder=f"recapture:{swipe_file_id}")
+        return result
+    except Exception as e:
+        classification = classify_capture_error(e)
+        if classification.host_fault:
+            circuit_breaker.record_failure(host)
+        if classification.retryable and self.request.retries < self.max_retries:
+            logger.warning(f"[Recapture {swipe_file_id}] Failed ({classification.reason}), retrying: {e}")
+            raise self.retry(exc=e, countdown=backoff_delay(self.request.retries))
+        # Nothing was replaced; the next scheduled run tries again
+        logger.error(f"[Recapture {swipe_file_id}] Failed ({classification.reason}): {e}", exc_info=True)
+        return {"status": "failed", "swipe_file_id": swipe_file_id, "reason": classification.reason}
+    finally:
+        host_limiter.release(host, lease)
+
+# Example of how to call the task (from main.py or other services), without importing this module:
+# from celery_client import send_generate_screenshots
+# task_info = send_generate_screenshots(target_url="https://example.com", mcp_job_id="some_job_id")
 
@@ -0,0 +1,105 @@
+"""
+Shared test setup: the repository root on sys.path, like the benchmarks, and defaults for the
+environment the app reads at import time. Nothing connects to Postgres or Redis on import.
+
+Tests that need Postgres use the `db` fixture and are skipped unless TEST_DATABASE_URL points
+at a scratch database on a local host: its public schema is dropped and rebuilt with
+`alembic upgrade head`, and every table is emptied after each test. Likewise `redis_db` needs
+TEST_REDIS_URL (app Redis and Celery broker), a local Redis database that is flushed after each test.
+"""
+import os
+import sys
+import tempfile
+from urllib.parse import urlparse
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "postgres", "db"}
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL # Before models (and its engine) are imported
+TEST_REDIS_URL = os.environ.get("TEST_REDIS_URL")
+if TEST_REDIS_URL:
+    os.environ["REDIS_URL"] = os.environ["CELERY_BROKER_URL"] = TEST_REDIS_URL
+os.environ.setdefault("DATABASE_URL", "postgresql://postgres@localhost:5432/flowvault_test")
+os.environ.setdefault("TRACING_ENABLED", "false")
+os.environ.setdefault("OBJECT_STORE_DIR", tempfile.mkdtemp(prefix="flowvault-objects-")) # storage.LocalObjectStore, never S3
+
+
+@pytest.fixture(scope="session")
+def database() -> str:
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    if urlparse(TEST_DATABASE_URL).hostname not in LOCAL_HOSTS:
+        pytest.fail(f"Refusing to wipe a non-local database: {TEST_DATABASE_URL}")
+    from sqlalchemy import create_engine, text
+    from alembic import command
+    from alembic.config import Config
+
+    engine = create_engine(TEST_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    engine.dispose()
+    alembic_cfg = Config(os.path.join(REPO_ROOT, "alembic.ini"))
+    alembic_cfg.set_main_option("script_location", os.path.join(REPO_ROOT, "migrations"))
+    alembic_cfg.set_main_option("sqlalchemy.url", TEST_DATABASE_URL.replace("%", "%%"))
+    command.upgrade(alembic_cfg, "head")
+    return TEST_DATABASE_URL
+
+
+@pytest.fixture
+def db(database):
+    """A session on the primary (models.SessionLocal); every table is emptied afterwards."""
+    from sqlalchemy import text
+    from models import Base, SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.execute(text(f"TRUNCATE {', '.join(Base.metadata.tables)} CASCADE"))
+        session.commit()
+        session.close()
+
+
+@pytest.fixture
+def redis_db():
+    if not TEST_REDIS_URL:
+        pytest.skip("TEST_REDIS_URL is not set")
+    if urlparse(TEST_REDIS_URL).hostname not in LOCAL_HOSTS:
+        pytest.fail(f"Refusing to flush a non-local Redis: {TEST_REDIS_URL}")
+    from redis_client import get_redis
+    client = get_redis()
+    client.flushdb()
+    yield client
+    client.flushdb()
+
+
+@pytest.fixture
+def client_as(db, redis_db):
+    """client_as(user) -> a started TestClient for main.app that authenticates every request as `user`."""
+    from fastapi.testclient import TestClient
+    import http_cache
+    import redis_client
+    from auth import get_current_user
+    import main
+
+    clients = []
+
+    def client_for(user):
+        main.app.dependency_overrides[get_current_user] = lambda: user
+        if not clients:
+            clients.append(TestClient(main.app).__enter__()) # One event loop for the test, like one API process
+        return clients[0]
+    yield client_for
+    main.app.dependency_overrides.clear()
+    for client in clients:
+        client.__exit__(None, None, None)
+    # Asyncio clients are bound to the loop that just closed
+    redis_client._async_client = None
+    http_cache._cache_set_script = None
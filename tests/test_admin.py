@@ -0,0 +1,113 @@
+"""
+Admin listings (routers/admin_router.py) against the migrated schema, through the app: both the
+pydantic path and the orjson path (FAST_JSON_RESPONSES) return the same documents.
+"""
+from datetime import datetime
+
+import pytest
+
+from routers import admin_router
+
+
+def _seed(db):
+    from models import User, McpJob, SwipeFile
+    admin = User(id="user_admin", email="ops@flowvaultadmin.com", name="Ops")
+    db.add_all([admin, User(id="user_a", email="a@example.com", name="A"), User(id="user_gone", email="gone@example.com")])
+    db.flush()
+    db.add(McpJob(id="job_1", target_url="https://a.example.com", status="completed", submitted_by_user_id="user_a"))
+    db.flush()
+    db.add_all([
+        SwipeFile(id="sf_1", title="Pricing", original_url="https://a.example.com/pricing", owner_user_id="user_a", mcp_job_id="job_1"),
+        SwipeFile(id="sf_2", original_url="https://a.example.com/start", owner_user_id="user_a"),
+    ])
+    db.get(User, "user_gone").deleted_at = datetime(2026, 1, 1)
+    db.commit()
+    return admin
+
+
+def _normalized(documents, *datetime_fields):
+    # pydantic writes UTC as "Z", orjson as "+00:00"
+    return [{**doc, **{field: datetime.fromisoformat(doc[field]) for field in datetime_fields}} for doc in documents]
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+def test_admin_listings(db, client_as, monkeypatch, fast_json):
+    monkeypatch.setattr(admin_router, "FAST_JSON_RESPONSES", fast_json)
+    client = client_as(_seed(db))
+
+    response = client.get("/api/v1/admin/users")
+    assert response.status_code == 200, response.text
+    users = {user["id"]: user for user in _normalized(response.json(), "createdAt")}
+    assert set(users) == {"user_admin", "user_a", "user_gone"}
+    assert users["user_admin"]["role"] == "admin" and users["user_a"]["role"] == "user"
+    assert users["user_a"]["swipeFilesCount"] == 2 and users["user_admin"]["swipeFilesCount"] == 0
+    assert users["user_gone"]["is_active"] is False and users["user_a"]["is_active"] is True
+
+    response = client.get("/api/v1/admin/swipefiles", params={"limit": 1})
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 1
+    swipe_files = {sf["id"]: sf for sf in _normalized(client.get("/api/v1/admin/swipefiles").json(), "created_at")}
+    assert swipe_files["sf_1"]["url"] == "https://a.example.com/pricing" and swipe_files["sf_1"]["user_id"] == "user_a"
+    assert swipe_files["sf_1"]["status"] == "completed" and swipe_files["sf_2"]["title"] is None
+
+
+def test_admin_listings_match(db, client_as, monkeypatch):
+    client = client_as(_seed(db))
+    for path, datetime_field in (("/api/v1/admin/users", "createdAt"), ("/api/v1/admin/swipefiles", "created_at")):
+        monkeypatch.setattr(admin_router, "FAST_JSON_RESPONSES", False)
+        validated = client.get(path).json()
+        monkeypatch.setattr(admin_router, "FAST_JSON_RESPONSES", True)
+        fast = client.get(path).json()
+        assert _normalized(fast, datetime_field) == _normalized(validated, datetime_field)
+
+
+def test_admin_listings_require_an_admin(db, client_as):
+    from models import User
+    _seed(db)
+    client = client_as(db.get(User, "user_a"))
+    assert client.get("/api/v1/admin/users").status_code == 403
+    assert client.get("/api/v1/admin/users/user_a").status_code == 403
+
+
+def test_admin_swipe_file_etag_and_delete(db, client_as, redis_db):
+    from models import Collection, CollectionSwipeFile, Screen, SwipeFile
+    client = client_as(_seed(db))
+    db.add(Collection(id="coll_1", name="Shared", owner_user_id="user_a", is_private=False))
+    db.flush()
+    db.add_all([CollectionSwipeFile(collection_id="coll_1", swipe_file_id="sf_1"),
+                Screen(id="scr_1", swipe_file_id="sf_1", image_url="https://cdn.example.com/1.png", order_index=0)])
+    db.commit()
+
+    response = client.get("/api/v1/admin/swipefiles/sf_1")
+    assert response.status_code == 200 and response.json()["status"] == "completed"
+    assert response.headers["ETag"] == 'W/"swipe-file-sf_1-1"'
+    assert client.get("/api/v1/admin/swipefiles/sf_1", headers={"If-None-Match": 'W/"swipe-file-sf_1-1"'}).status_code == 304
+
+    assert client.delete("/api/v1/admin/swipefiles/sf_1").status_code == 204
+    assert client.get("/api/v1/admin/swipefiles/sf_1").status_code == 404
+    db.expire_all()
+    assert db.get(Screen, "scr_1") is None and db.get(SwipeFile, "sf_2") is not None
+    assert db.get(Collection, "coll_1").version == 2 # Its content changed
+    assert int(redis_db.hget("flowvault:http_cache:collection:coll_1", "version")) == 2
+
+
+def test_admin_update_user(db, client_as, redis_db, monkeypatch):
+    import purge
+    from models import PurgeJob, User
+    queued = []
+    monkeypatch.setattr(purge, "send_purge_deleted", queued.append)
+    client = client_as(_seed(db))
+
+    response = client.put("/api/v1/admin/users/user_a", json={"name": "Alice"})
+    assert response.status_code == 200, response.text
+    assert response.json()["name"] == "Alice" and response.json()["is_active"] is True
+    db.expire_all()
+    assert db.get(User, "user_a").name == "Alice"
+    assert client.put("/api/v1/admin/users/user_a", json={"role": "admin"}).status_code == 422
+
+    response = client.put("/api/v1/admin/users/user_a", json={"is_active": False})
+    assert response.status_code == 200 and response.json()["is_active"] is False
+    assert db.query(PurgeJob).one().entity_id == "user_a" and len(queued) == 1
+    assert client.put("/api/v1/admin/users/user_a", json={"name": "A"}).status_code == 404
+    assert client.put("/api/v1/admin/users/user_missing", json={"name": "A"}).status_code == 404
+    assert client_as(db.get(User, "user_admin")).put("/api/v1/admin/users/user_gone", json={"is_active": True}).status_code == 404
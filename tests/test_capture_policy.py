@@ -0,0 +1,221 @@
+"""
+Capture failure policy (capture_policy.py): the error taxonomy, backoff, and the per-domain
+circuit breaker against an in-memory Redis with a controllable clock.
+"""
+import random
+from types import SimpleNamespace
+
+import pytest
+import redis
+
+import capture_policy
+from capture_policy import (
+    BotProtectionError, CircuitOpenError, DomainCircuitBreaker, HostBusyError, HttpStatusError,
+    backoff_delay, check_navigation, classify_capture_error, target_host,
+)
+
+
+# --- Taxonomy --- #
+
+def _playwright_error(name: str, message: str) -> Exception:
+    # Classified by module and name, so Playwright itself needn't be loaded
+    return type(name, (Exception,), {"__module__": "playwright._impl._errors"})(message)
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (CircuitOpenError("open"), (False, "circuit_open", False)),
+    (HostBusyError("busy"), (True, "host_busy", False)),
+    (BotProtectionError("challenge"), (False, "bot_protection", True)),
+    (HttpStatusError(503, "https://a.example.com"), (True, "http_503", True)),
+    (HttpStatusError(429, "https://a.example.com"), (True, "http_429", True)),
+    (HttpStatusError(404, "https://a.example.com"), (False, "http_404", False)),
+    (_playwright_error("TimeoutError", "Timeout 30000ms exceeded."), (True, "timeout", True)),
+    (_playwright_error("Error", "net::ERR_NAME_NOT_RESOLVED at https://nope.example"), (False, "dns", True)),
+    (_playwright_error("Error", "net::ERR_CERT_DATE_INVALID at https://a.example.com"), (False, "tls", True)),
+    (_playwright_error("Error", "net::ERR_CONNECTION_RESET at https://a.example.com"), (True, "connection", True)),
+    (_playwright_error("Error", "Target page, context or browser has been closed"), (True, "browser_crash", False)),
+    (_playwright_error("Error", "Something else"), (True, "browser_error", False)),
+    (redis.ConnectionError("Connection refused"), (True, "infrastructure", False)),
+    (ValueError("MCP job does not exist"), (False, "invalid_job", False)),
+    (RuntimeError("?"), (True, "unknown", False)),
+])
+def test_classify_capture_error(exc, expected):
+    assert tuple(classify_capture_error(exc)) == expected
+
+
+def _response(status, headers=None):
+    return SimpleNamespace(status=status, headers=headers or {})
+
+
+def test_check_navigation():
+    page = SimpleNamespace(title=lambda: "Just a moment...")
+    check_navigation(None, page, "https://a.example.com") # Same-document navigation
+    check_navigation(_response(200), page, "https://a.example.com")
+    with pytest.raises(BotProtectionError):
+        check_navigation(_response(200, {"cf-mitigated": "challenge"}), page, "https://a.example.com")
+    with pytest.raises(BotProtectionError):
+        check_navigation(_response(403), page, "https://a.example.com")
+    with pytest.raises(HttpStatusError) as raised:
+        check_navigation(_response(403), SimpleNamespace(title=lambda: "Forbidden"), "https://a.example.com")
+    assert raised.value.status == 403
+
+
+def test_backoff_delay(monkeypatch):
+    monkeypatch.setattr(random, "uniform", lambda low, high: high)
+    assert backoff_delay(0) == capture_policy.RETRY_BACKOFF_BASE_SECONDS
+    assert backoff_delay(2) == capture_policy.RETRY_BACKOFF_BASE_SECONDS * 4
+    assert backoff_delay(30) == capture_policy.RETRY_BACKOFF_MAX_SECONDS # Capped
+    monkeypatch.setattr(random, "uniform", lambda low, high: low)
+    assert backoff_delay(2) == capture_policy.RETRY_BACKOFF_BASE_SECONDS * 2 # At least half the delay
+
+
+def test_target_host():
+    assert target_host("https://WWW.Example.com:8443/pricing?a=1") == "www.example.com"
+    assert target_host("not a url") == ""
+
+
+# --- Circuit breaker --- #
+
+class FakeRedis:
+    """The commands DomainCircuitBreaker uses, with expiry on the test's clock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data, self.expires_at = {}, {}
+
+    def _live(self, key):
+        if key in self.expires_at and self.clock.now >= self.expires_at[key]:
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+        return self.data.get(key)
+
+    def get(self, key):
+        return self._live(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and self._live(key) is not None:
+            return None
+        self.data[key] = str(value).encode()
+        self.expires_at.pop(key, None)
+        if ex:
+            self.expires_at[key] = self.clock.now + ex
+        return True
+
+    def hget(self, key, field):
+        return (self._live(key) or {}).get(field)
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = str(value).encode()
+
+    def expire(self, key, seconds):
+        if self._live(key) is not None:
+            self.expires_at[key] = self.clock.now + seconds
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+
+    def zremrangebyscore(self, key, low, high):
+        members = self._live(key) or {}
+        for member in [member for member, score in members.items() if score <= high]:
+            del members[member]
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def zcard(self, key):
+        return len(self._live(key) or {})
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client, self.calls = client, []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(capture_policy, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return DomainCircuitBreaker(FakeRedis(clock))
+
+
+def _open(breaker, host="a.example.com"):
+    for _ in range(capture_policy.CIRCUIT_FAILURE_THRESHOLD):
+        breaker.record_failure(host)
+
+
+def test_opens_after_threshold_failures_in_the_window(breaker, clock):
+    host = "a.example.com"
+    for _ in range(capture_policy.CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.record_failure(host)
+    clock.now += capture_policy.CIRCUIT_FAILURE_WINDOW_SECONDS + 1 # Those fall out of the window
+    breaker.record_failure(host)
+    assert breaker.allow(host, "job_1")
+
+    _open(breaker)
+    assert not breaker.allow(host, "job_1") and breaker.allow("b.example.com", "job_1")
+
+
+def test_only_the_probe_closes_the_circuit(breaker, clock):
+    host = "a.example.com"
+    _open(breaker)
+    breaker.record_success(host, "job_old") # Started before the circuit opened
+    assert not breaker.allow(host, "job_1")
+
+    clock.now += capture_policy.CIRCUIT_COOLDOWN_SECONDS
+    assert breaker.allow(host, "job_probe") # Half-open: one probe
+    assert not breaker.allow(host, "job_2")
+    assert breaker.allow(host, "job_probe") # Back after a deferral
+    breaker.record_success(host, "job_2")
+    assert not breaker.allow(host, "job_3")
+    breaker.record_success(host, "job_probe")
+    assert breaker.allow(host, "job_3") and breaker.allow(host, "job_4")
+
+
+def test_probe_failure_reopens(breaker, clock):
+    host = "a.example.com"
+    _open(breaker)
+    clock.now += capture_policy.CIRCUIT_COOLDOWN_SECONDS
+    assert breaker.allow(host, "job_probe")
+    breaker.record_failure(host)
+    assert not breaker.allow(host, "job_probe")
+    clock.now += capture_policy.CIRCUIT_COOLDOWN_SECONDS
+    assert breaker.allow(host, "job_2")
+
+
+def test_dead_probe_is_replaced_and_the_circuit_stays_open(breaker, clock):
+    host = "a.example.com"
+    _open(breaker)
+    clock.now += capture_policy.CIRCUIT_COOLDOWN_SECONDS
+    assert breaker.allow(host, "job_probe") # ...and its worker dies
+    clock.now += capture_policy.CIRCUIT_PROBE_TIMEOUT_SECONDS + capture_policy.CIRCUIT_COOLDOWN_SECONDS * 2
+    breaker.record_success(host, "job_old")
+    assert breaker.allow(host, "job_2") # A new probe, not a closed circuit
+    assert not breaker.allow(host, "job_3")
+
+
+def test_redis_errors_fail_open(clock):
+    class Down:
+        def __getattr__(self, name):
+            def fail(*args, **kwargs):
+                raise redis.ConnectionError("Connection refused")
+            return fail
+    breaker = DomainCircuitBreaker(Down())
+    assert breaker.allow("a.example.com", "job_1")
+    breaker.record_failure("a.example.com")
+    breaker.record_success("a.example.com", "job_1")
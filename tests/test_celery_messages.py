@@ -0,0 +1,45 @@
+"""
+Celery task messages (celery_client.py): what the API puts on the broker is msgpack and
+round-trips the task's kwargs, and JSON messages from before the switch are still accepted.
+"""
+import base64
+import json
+
+from kombu.serialization import dumps, loads, prepare_accept_content
+
+from celery_client import (
+    DEFAULT_QUEUE, GENERATE_SCREENSHOTS_TASK, MAINTENANCE_QUEUE, celery_app, send_generate_screenshots, send_purge_deleted,
+)
+
+ACCEPT = prepare_accept_content(celery_app.conf.accept_content) # As the worker resolves it
+VIEWPORTS = [{"name": "desktop", "width": 1440, "height": 900}, {"name": "mobile", "width": 390, "height": 844}]
+
+
+def _queued_message(redis_db, queue):
+    envelope = json.loads(redis_db.lpop(queue))
+    body = base64.b64decode(envelope["body"]) # The Redis transport base64-encodes bodies
+    return envelope, body
+
+
+def test_task_messages_are_msgpack(redis_db):
+    send_generate_screenshots("https://a.example.com", "job_1", viewports=VIEWPORTS)
+    envelope, body = _queued_message(redis_db, DEFAULT_QUEUE)
+    assert envelope["content-type"] == "application/x-msgpack"
+    assert envelope["headers"]["task"] == GENERATE_SCREENSHOTS_TASK
+    args, kwargs, _ = loads(body, envelope["content-type"], envelope["content-encoding"], accept=ACCEPT)
+    assert args == [] and kwargs == {"target_url": "https://a.example.com", "mcp_job_id": "job_1", "viewports": VIEWPORTS}
+
+    send_purge_deleted("purge_1")
+    envelope, body = _queued_message(redis_db, MAINTENANCE_QUEUE)
+    assert loads(body, envelope["content-type"], envelope["content-encoding"], accept=ACCEPT)[1] == {"purge_job_id": "purge_1"}
+
+
+def test_json_messages_are_still_accepted():
+    content_type, encoding, body = dumps([[], {"target_url": "https://a.example.com", "mcp_job_id": "job_1"}, {}], serializer="json")
+    assert loads(body, content_type, encoding, accept=ACCEPT)[1]["mcp_job_id"] == "job_1"
+
+
+def test_capture_results_are_not_stored():
+    import tasks
+    assert celery_app.conf.result_serializer == "msgpack"
+    assert tasks.generate_screenshots_task.ignore_result and tasks.export_collection_task.ignore_result
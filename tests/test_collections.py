@@ -0,0 +1,112 @@
+"""
+Collections (routers/collections_router.py) through the app: permissions, version-based ETags,
+and the shared Redis cache for public collections.
+"""
+from sqlalchemy.orm import Session
+
+from http_cache import PUBLIC_COLLECTION_CACHE_KEY_PREFIX
+
+
+def _seed(db):
+    from models import User, Team, TeamMember, SwipeFile
+    db.add_all([User(id=f"user_{name}", email=f"{name}@example.com") for name in ("owner", "admin", "member", "outsider")])
+    db.flush()
+    db.add(Team(id="team_1", name="Design", owner_user_id="user_owner"))
+    db.flush()
+    db.add_all([
+        TeamMember(team_id="team_1", user_id="user_owner", role="owner"),
+        TeamMember(team_id="team_1", user_id="user_admin", role="admin"),
+        TeamMember(team_id="team_1", user_id="user_member", role="member"),
+        SwipeFile(id="sf_1", original_url="https://example.com", owner_user_id="user_owner"),
+    ])
+    db.commit()
+    return {name: db.get(User, f"user_{name}") for name in ("owner", "admin", "member", "outsider")}
+
+
+def test_etag_follows_the_version(db, client_as):
+    users = _seed(db)
+    client = client_as(users["owner"])
+    created = client.post("/api/v1/collections/", json={"name": "Onboarding"}).json()
+    url = f"/api/v1/collections/{created['collection_id']}"
+
+    response = client.get(url)
+    assert response.status_code == 200 and response.json()["name"] == "Onboarding"
+    etag = response.headers["ETag"]
+    assert etag == f'W/"collection-{created["collection_id"]}-1"'
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.put(url, json={"name": "Checkout"}).status_code == 200
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["name"] == "Checkout"
+    assert response.headers["ETag"] == f'W/"collection-{created["collection_id"]}-2"'
+
+    assert client.post(f"{url}/swipefiles", json={"swipe_file_id": "sf_1"}).status_code == 201
+    assert client.post(f"{url}/swipefiles", json={"swipe_file_id": "sf_1"}).status_code == 400
+    assert client.get(url).headers["ETag"].endswith('-3"')
+    assert client.delete(f"{url}/swipefiles/sf_1").status_code == 204
+    assert client.get(url).headers["ETag"].endswith('-4"')
+
+
+def test_concurrent_writers_both_apply(db):
+    # version = version + 1 in the UPDATE itself: no compare-and-set, so no StaleDataError
+    from models import Collection, bump_version
+    _seed(db)
+    db.add(Collection(id="coll_1", name="A", owner_user_id="user_owner"))
+    db.commit()
+    first, second = Session(bind=db.get_bind()), Session(bind=db.get_bind())
+    try:
+        a, b = first.get(Collection, "coll_1"), second.get(Collection, "coll_1")
+        a.name = "From A"
+        bump_version(a)
+        first.commit()
+        b.description = "From B" # b still has version 1 loaded
+        bump_version(b)
+        second.commit()
+        assert b.version == 3
+    finally:
+        first.close()
+        second.close()
+    db.expire_all()
+    collection = db.get(Collection, "coll_1")
+    assert (collection.name, collection.description, collection.version) == ("From A", "From B", 3)
+
+
+def test_public_collection_cache(db, client_as, redis_db):
+    users = _seed(db)
+    owner = client_as(users["owner"])
+    created = owner.post("/api/v1/collections/", json={"name": "Public", "is_private": False}).json()
+    url = f"/api/v1/collections/{created['collection_id']}"
+    key = f"{PUBLIC_COLLECTION_CACHE_KEY_PREFIX}{created['collection_id']}"
+
+    response = client_as(users["outsider"]).get(url) # Public: anyone signed in may read it
+    assert response.status_code == 200 and response.headers["Cache-Control"] == "public, no-cache"
+    assert redis_db.hget(key, "etag").decode() == response.headers["ETag"]
+
+    owner = client_as(users["owner"])
+    assert owner.put(url, json={"name": "Renamed"}).status_code == 200
+    assert redis_db.hget(key, "body") is None and int(redis_db.hget(key, "version")) == 2 # Invalidated on write
+    assert owner.get(url).json()["name"] == "Renamed"
+    assert int(redis_db.hget(key, "version")) == 2 and redis_db.hget(key, "body") is not None
+
+    assert owner.put(url, json={"is_private": True}).status_code == 200
+    assert client_as(users["outsider"]).get(url).status_code == 404 # Not served from the cache any more
+
+
+def test_team_collection_permissions(db, client_as):
+    users = _seed(db)
+    created = client_as(users["member"]).post("/api/v1/collections/", json={"name": "Team", "team_id": "team_1"})
+    assert created.status_code == 201 and created.json()["user_id"] is None
+    url = f"/api/v1/collections/{created.json()['collection_id']}"
+
+    assert client_as(users["outsider"]).post("/api/v1/collections/", json={"name": "X", "team_id": "team_1"}).status_code == 404
+    assert client_as(users["outsider"]).get(url).status_code == 404
+    assert client_as(users["outsider"]).put(url, json={"name": "X"}).status_code == 404
+    assert client_as(users["member"]).get(url).status_code == 200
+    assert client_as(users["member"]).put(url, json={"name": "X"}).status_code == 403
+    assert client_as(users["admin"]).put(url, json={"name": "Renamed"}).status_code == 200
+    assert client_as(users["admin"]).put(url, json={"team_id": None}).status_code == 400
+
+    listed = client_as(users["member"]).get("/api/v1/collections/").json()
+    assert [collection["name"] for collection in listed] == ["Renamed"]
+    assert client_as(users["outsider"]).get("/api/v1/collections/").json() == []
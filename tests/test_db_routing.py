@@ -0,0 +1,82 @@
+"""
+Read-replica routing (db_routing.py). The primary stands in for a replica here: it is not in
+recovery, so it never looks behind.
+"""
+import os
+import sys
+import time
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+import db_routing
+from conftest import REPO_ROOT
+
+
+def test_database_url_is_required():
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    result = subprocess.run([sys.executable, "-c", "import db_routing"], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode != 0 and "DATABASE_URL is not set" in result.stderr
+
+
+def test_reads_only_use_the_last_check(monkeypatch):
+    replica = db_routing.Replica("postgresql://replica.invalid/flowvault", 1)
+    monkeypatch.setattr(replica, "refresh", lambda: pytest.fail("Checked on the request path"))
+    assert not replica.usable(0) # Never checked: the primary serves
+    replica.healthy, replica.replay_lsn = True, 100
+    replica.checked_at = time.monotonic()
+
+    assert replica.usable(100) and not replica.usable(101) # Behind the user's write: the primary serves them
+    replica.checked_at = time.monotonic() - db_routing.REPLICA_CHECK_STALE_SECONDS - 1
+    assert not replica.usable(0) # The monitor stopped checking: don't trust the old result
+    replica.engine.dispose()
+
+
+def test_unreachable_replicas_fail_their_check_quickly():
+    # Nothing listens on port 1: refused at once. The timeout bounds hosts that drop packets.
+    replica = db_routing.Replica("postgresql://postgres@127.0.0.1:1/flowvault", 1)
+    connect_params = {}
+    event.listen(replica.engine, "do_connect", lambda dialect, record, cargs, cparams: connect_params.update(cparams))
+    replica.healthy = True
+    replica.refresh()
+    assert not replica.healthy and not replica.usable(0)
+    assert connect_params["connect_timeout"] == db_routing.REPLICA_CONNECT_TIMEOUT_SECONDS
+
+
+def test_one_monitor_thread_per_process(monkeypatch):
+    started = []
+    monkeypatch.setattr(db_routing, "_monitor_pid", None)
+    monkeypatch.setattr(db_routing.threading, "Thread", lambda **kwargs: SimpleNamespace(start=lambda: started.append(kwargs["name"])))
+    monkeypatch.setattr(db_routing, "_replicas", [SimpleNamespace(usable=lambda lsn: False)])
+    db_routing.read_engine()
+    db_routing.read_engine()
+    assert started == ["replica-monitor"]
+    monkeypatch.setattr(db_routing, "_monitor_pid", -1) # As seen from a forked child
+    db_routing.read_engine()
+    assert started == ["replica-monitor"] * 2
+
+
+def test_write_position_is_read_on_the_committing_connection(db, redis_db, monkeypatch):
+    from models import SessionLocal, User
+    replica = db_routing.Replica(os.environ["DATABASE_URL"], 1)
+    monkeypatch.setattr(db_routing, "_replicas", [replica])
+    checkouts = []
+    count_checkout = lambda *args: checkouts.append(args)
+    event.listen(db_routing.primary_engine, "checkout", count_checkout)
+    session = SessionLocal(info={"user_id": "user_a"})
+    try:
+        session.add(User(id="user_a", email="a@example.com"))
+        session.commit()
+    finally:
+        session.close()
+        event.remove(db_routing.primary_engine, "checkout", count_checkout)
+    assert len(checkouts) == 1
+
+    lsn = db_routing.parse_lsn(redis_db.get(f"{db_routing.WRITE_LSN_KEY_PREFIX}user_a").decode())
+    assert lsn > 0 and db_routing._required_lsn("user_a") == lsn
+    replica.refresh() # What the monitor thread does
+    assert db_routing.read_engine("user_a") is replica.engine
+    replica.engine.dispose()
@@ -0,0 +1,41 @@
+"""
+Readiness checks (routers/health_router.py): blocking checks run on the health executor, with
+their own timeouts, so a hung dependency neither delays the probe nor ties up request threads.
+"""
+import asyncio
+import threading
+
+from routers import health_router
+
+
+def _run(name, check):
+    return asyncio.run(health_router._run_check(name, check))[1]
+
+
+def test_database_check(database):
+    result = _run("database", health_router._check_database)
+    assert result["status"] == "ok" and result["pool_size"] >= 1
+
+
+def test_database_check_times_out(database, monkeypatch):
+    # A query that outlives the probe is cancelled by the server, freeing the health thread
+    monkeypatch.setattr(health_router, "DATABASE_CHECK_SQL", "SELECT pg_sleep(30)")
+    future = health_router._executor.submit(health_router._check_database_sync)
+    exception = future.exception(timeout=health_router.HEALTH_CHECK_TIMEOUT_SECONDS + 5)
+    assert "statement timeout" in str(exception)
+
+
+def test_hung_check_stays_on_the_health_executor(monkeypatch):
+    release, threads = threading.Event(), []
+
+    def hung():
+        threads.append(threading.current_thread().name)
+        release.wait(10)
+        return {}
+    monkeypatch.setattr(health_router, "_check_database_sync", hung)
+    monkeypatch.setattr(health_router, "HEALTH_CHECK_TIMEOUT_SECONDS", 0.2)
+    try:
+        assert _run("database", health_router._check_database)["status"] == "timeout"
+        assert threads[0].startswith("health-check")
+    finally:
+        release.set()
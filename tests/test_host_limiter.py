@@ -0,0 +1,80 @@
+"""
+Per-host leases and request spacing (host_limiter.py): the Lua scripts against a real Redis,
+with the clock the scripts are given under the test's control.
+"""
+from types import SimpleNamespace
+
+import pytest
+import redis
+
+import host_limiter as host_limiter_module
+from host_limiter import HOST_LEASE_SECONDS, HOST_SLOTS_KEY_PREFIX, HostLimiter
+
+HOST = "a.example.com"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1_000_000.0, slept=[])
+    monkeypatch.setattr(host_limiter_module, "time", SimpleNamespace(time=lambda: clock.now, sleep=clock.slept.append))
+    # Runtime overrides unset: the limiter's own limit and spacing apply
+    monkeypatch.setattr(host_limiter_module, "runtime_settings", SimpleNamespace(get=lambda key: None))
+    return clock
+
+
+@pytest.fixture
+def limiter(redis_db, clock):
+    return HostLimiter(limit=2, min_interval=1.0)
+
+
+def test_leases_up_to_the_limit(limiter, redis_db):
+    first, second = limiter.try_acquire(HOST), limiter.try_acquire(HOST)
+    assert first and second and first != second
+    assert limiter.try_acquire(HOST) is None
+    assert limiter.try_acquire("b.example.com") # Limits are per host
+    assert limiter.try_acquire(HOST, limit=3) # An explicit limit wins
+
+    limiter.release(HOST, first)
+    assert limiter.try_acquire(HOST, limit=3) and limiter.try_acquire(HOST, limit=3) is None
+    assert 0 < redis_db.ttl(f"{HOST_SLOTS_KEY_PREFIX}{HOST}") <= HOST_LEASE_SECONDS + 60 # Idle hosts don't linger
+
+
+def test_expired_leases_are_reclaimed_and_renewed_ones_kept(limiter, clock):
+    held, abandoned = limiter.try_acquire(HOST), limiter.try_acquire(HOST)
+    clock.now += HOST_LEASE_SECONDS - 1
+    limiter.renew(HOST, held)
+    assert limiter.try_acquire(HOST) is None
+    clock.now += 2 # The abandoned lease expired; the renewed one has not
+    assert limiter.try_acquire(HOST)
+    assert limiter.try_acquire(HOST) is None
+
+    limiter.release(HOST, abandoned)
+    limiter.renew(HOST, abandoned) # Renewing a lost lease doesn't take a slot back
+    assert limiter.try_acquire(HOST) is None
+
+
+def test_requests_to_a_host_are_spaced_fleet_wide(limiter, clock):
+    other_worker = HostLimiter(limit=2, min_interval=1.0)
+    limiter.wait_for_turn(HOST)
+    other_worker.wait_for_turn(HOST)
+    limiter.wait_for_turn(HOST)
+    other_worker.wait_for_turn("b.example.com")
+    assert clock.slept == [1.0, 2.0]
+
+    clock.now += 10 # Reservations in the past don't delay anyone
+    limiter.wait_for_turn(HOST)
+    assert clock.slept == [1.0, 2.0]
+    HostLimiter(limit=2, min_interval=0).wait_for_turn(HOST)
+    assert clock.slept == [1.0, 2.0]
+
+
+def test_redis_errors_fail_open(clock, monkeypatch):
+    def redis_down():
+        raise redis.ConnectionError("Connection refused")
+    monkeypatch.setattr(host_limiter_module, "get_redis", redis_down)
+    limiter = HostLimiter(limit=1, min_interval=1.0)
+    assert limiter.try_acquire(HOST) and limiter.try_acquire(HOST)
+    limiter.wait_for_turn(HOST)
+    limiter.renew(HOST, "token")
+    limiter.release(HOST, "token")
+    assert clock.slept == []
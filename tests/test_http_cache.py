@@ -0,0 +1,23 @@
+"""
+Conditional GET helpers (http_cache.py).
+"""
+from starlette.requests import Request
+
+from http_cache import make_etag, etag_matches
+
+
+def _request(if_none_match=None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_etag_matches():
+    etag = make_etag("collection", "c1", 3)
+    assert etag == 'W/"collection-c1-3"'
+    assert etag_matches(_request(etag), etag)
+    assert etag_matches(_request('"collection-c1-3"'), etag) # Weak comparison
+    assert etag_matches(_request('W/"other", W/"collection-c1-3"'), etag)
+    assert etag_matches(_request("*"), etag)
+    assert not etag_matches(_request('W/"collection-c1-2"'), etag)
+    assert not etag_matches(_request(), etag)
+
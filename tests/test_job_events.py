@@ -0,0 +1,44 @@
+"""
+Job progress events (job_events.py): the per-process hub survives Redis being down at startup
+and connects once a client subscribes.
+"""
+import asyncio
+
+import redis.asyncio as aioredis
+
+import job_events
+import redis_client
+from job_events import JobEventHub, publish_job_event
+
+
+def _unreachable_redis():
+    return aioredis.Redis.from_url("redis://127.0.0.1:1/0", socket_connect_timeout=0.5)
+
+
+def test_hub_starts_without_redis_and_connects_on_first_use(redis_db, monkeypatch):
+    async def scenario():
+        hub = JobEventHub()
+        monkeypatch.setattr(job_events, "get_async_redis", _unreachable_redis)
+        await hub.start() # Logged, not raised
+        assert hub._pubsub is None
+
+        client = aioredis.Redis.from_url(redis_client.REDIS_URL) # Redis is back
+        monkeypatch.setattr(job_events, "get_async_redis", lambda: client)
+        publish_job_event("job_1", "processing")
+        stream = hub.stream("job_1", heartbeat_seconds=1)
+        assert (await stream.__anext__())["type"] == "processing" # Snapshot
+        await asyncio.sleep(0.1) # The hub is subscribed to the job's channel by now
+        publish_job_event("job_1", "completed")
+        assert (await asyncio.wait_for(stream.__anext__(), 5))["type"] == "completed"
+        await stream.aclose()
+        await hub.stop()
+        await client.close()
+    asyncio.run(scenario())
+
+
+def test_app_starts_while_redis_is_down(redis_db, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    monkeypatch.setattr(job_events, "get_async_redis", _unreachable_redis)
+    with TestClient(main.app) as client:
+        assert client.get("/api/v1/health").status_code == 200
@@ -0,0 +1,100 @@
+"""
+Job status and progress streams (main.py) through the app: only the job's submitter sees them,
+and the status falls back to the job row once the Redis snapshot is gone.
+"""
+import jwt
+import pytest
+import redis
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from job_events import publish_job_event
+
+
+def _seed(db):
+    from models import User, McpJob
+    db.add_all([User(id="user_a", email="a@example.com"), User(id="user_b", email="b@example.com")])
+    db.flush()
+    db.add(McpJob(id="job_1", target_url="https://a.example.com", status="processing", completed_steps=2,
+                  submitted_by_user_id="user_a"))
+    db.commit()
+    return db.get(User, "user_a"), db.get(User, "user_b")
+
+
+def _token(user_id: str) -> str:
+    return jwt.encode({"sub": user_id}, "test", algorithm="HS256") # Signatures aren't verified yet (auth.py)
+
+
+def test_job_status_is_only_for_the_submitter(db, client_as):
+    owner, other = _seed(db)
+    assert client_as(other).get("/api/v1/job-status/job_1").status_code == 404
+    assert client_as(owner).get("/api/v1/job-status/job_missing").status_code == 404
+    client = client_as(owner)
+    main.app.dependency_overrides.clear() # No credentials at all
+    assert client.get("/api/v1/job-status/job_1").status_code == 403
+
+
+def test_job_status_from_the_snapshot_then_the_database(db, client_as, redis_db):
+    owner, _ = _seed(db)
+    client = client_as(owner)
+    response = client.get("/api/v1/job-status/job_1") # No events yet
+    assert response.json() == {"mcp_job_id": "job_1", "status": "processing", "completed_steps": 2, "error_message": None}
+    assert "ETag" not in response.headers
+
+    publish_job_event("job_1", "screen", order_index=0)
+    publish_job_event("job_1", "completed")
+    response = client.get("/api/v1/job-status/job_1")
+    assert response.json()["status"] == "completed" and len(response.json()["screens"]) == 1
+    assert response.headers["ETag"] == 'W/"job-job_1-2"'
+    assert client.get("/api/v1/job-status/job_1", headers={"If-None-Match": 'W/"job-job_1-2"'}).status_code == 304
+
+    redis_db.flushdb() # Snapshot expired
+    assert client.get("/api/v1/job-status/job_1").json()["status"] == "processing"
+
+
+def test_job_status_without_redis(db, client_as, monkeypatch):
+    owner, _ = _seed(db)
+
+    async def unavailable(mcp_job_id):
+        raise redis.ConnectionError("Connection refused")
+
+    async def snapshot(mcp_job_id):
+        return [{"type": "screen", "seq": 1, "order_index": 0}, {"type": "completed", "seq": 2}]
+
+    monkeypatch.setattr(main, "get_job_seq", unavailable)
+    monkeypatch.setattr(main, "get_job_snapshot", snapshot)
+    client = client_as(owner)
+    response = client.get("/api/v1/job-status/job_1", headers={"If-None-Match": 'W/"job-job_1-2"'})
+    assert response.status_code == 200 and "ETag" not in response.headers
+    assert response.json()["status"] == "completed"
+
+    monkeypatch.setattr(main, "get_job_snapshot", unavailable)
+    assert client.get("/api/v1/job-status/job_1").json()["completed_steps"] == 2
+
+
+def test_sse_stream_is_only_for_the_submitter(db, client_as):
+    owner, other = _seed(db)
+    publish_job_event("job_1", "completed")
+    assert client_as(other).get("/api/v1/job-events/job_1").status_code == 404
+    response = client_as(owner).get("/api/v1/job-events/job_1")
+    assert response.status_code == 200 and "event: completed" in response.text
+
+
+def test_websocket_needs_a_token_for_the_submitter(db, client_as):
+    owner, _ = _seed(db)
+    publish_job_event("job_1", "completed")
+    client = client_as(owner)
+    with client.websocket_connect(f"/api/v1/ws/job-events/job_1?token={_token('user_a')}") as websocket:
+        assert websocket.receive_json()["type"] == "completed"
+
+    client.cookies.set("__session", _token("user_a")) # Clerk's cookie works too
+    with client.websocket_connect("/api/v1/ws/job-events/job_1") as websocket:
+        assert websocket.receive_json()["type"] == "completed"
+    client.cookies.clear()
+
+    for url in ("/api/v1/ws/job-events/job_1", f"/api/v1/ws/job-events/job_1?token={_token('user_b')}",
+                "/api/v1/ws/job-events/job_1?token=not-a-jwt"):
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect(url) as websocket:
+                websocket.receive_json()
+        assert closed.value.code == 1008
@@ -0,0 +1,80 @@
+"""
+Change detection (monitoring.py): previous captures are read back from the bucket by key
+(storage.LocalObjectStore here, via OBJECT_STORE_DIR), never through their public URL.
+"""
+import io
+
+from PIL import Image, ImageDraw
+
+import storage
+from monitoring import RecaptureSpool, screen_units, next_recapture_at, recapture_phase_seconds
+
+
+def _png(draw_box=None, size=(200, 120)) -> bytes:
+    image = Image.new("RGB", size, (255, 255, 255))
+    if draw_box:
+        ImageDraw.Draw(image).rectangle(draw_box, fill=(0, 0, 0))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def test_object_key_inverts_public_url(monkeypatch):
+    key = "mcp_jobs/job_1/screen_1.png"
+    assert storage.object_key(storage.public_url(key)) == key
+    monkeypatch.setattr(storage, "S3_PUBLIC_BASE_URL", "https://cdn.example.com/")
+    assert storage.public_url(key) == f"https://cdn.example.com/{key}"
+    assert storage.object_key(f"https://cdn.example.com/{key}") == key
+    # Stored before the CDN was set up
+    assert storage.object_key(f"https://{storage.S3_BUCKET_NAME}.s3.{storage.S3_REGION}.amazonaws.com/{key}") == key
+    assert storage.object_key(f"https://elsewhere.example.com/{key}") is None
+
+
+def _recapture(previous_url: str, metadata, data: bytes) -> RecaptureSpool:
+    spool = RecaptureSpool(screen_units(previous_url, metadata))
+    spool("mcp_jobs/job_1/v2/screen_1.png", data, "image/png")
+    return spool
+
+
+def test_unchanged_capture_is_compared_with_the_stored_object():
+    data = _png((10, 10, 60, 40))
+    url = storage.upload_bytes("mcp_jobs/job_1/screen_1.png", data, "image/png")
+    spool = _recapture(url, None, data) # No fingerprint yet: the stored object is read
+    assert not spool.changed and spool.previous_fingerprints[0]["sha256"] == spool.fingerprints[0]["sha256"]
+    spool.close()
+
+
+def test_changed_capture():
+    url = storage.upload_bytes("mcp_jobs/job_2/screen_1.png", _png((10, 10, 60, 40)), "image/png")
+    spool = _recapture(url, None, _png((10, 10, 60, 40), size=(200, 140)))
+    assert spool.changed and spool.changes[0]["method"] == "size"
+    spool.close()
+
+    spool = _recapture(url, None, _png((10, 10, 64, 40))) # A few columns of pixels: only the pixel diff sees it
+    assert spool.changed and spool.changes[0]["method"] == "pixels" and spool.changes[0]["bbox"] == [61, 10, 65, 41]
+    spool.close()
+
+
+def test_tiles_are_read_by_their_keys():
+    data = _png((0, 0, 20, 20))
+    url = storage.upload_bytes("mcp_jobs/job_3/screen_1_tile_01.png", data, "image/png")
+    metadata = {"tiles": {"stitched": False, "tiles": [{"key": "mcp_jobs/job_3/screen_1_tile_01.png", "url": "https://unreachable.invalid/tile"}]}}
+    assert screen_units(url, metadata)[0]["key"] == "mcp_jobs/job_3/screen_1_tile_01.png"
+    spool = _recapture(url, metadata, data)
+    assert not spool.changed
+    spool.close()
+
+
+def test_missing_previous_counts_as_changed():
+    spool = _recapture("https://elsewhere.example.com/screen.png", None, _png())
+    assert spool.changed and spool.changes[0]["method"] == "missing_previous"
+    spool.close()
+
+
+def test_recapture_slots_are_stable():
+    from datetime import datetime, timezone
+    after = datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc)
+    slot = next_recapture_at("sf_1", 24, after)
+    assert after < slot <= after.replace(day=6)
+    assert int(slot.timestamp()) % 86400 == recapture_phase_seconds("sf_1", 86400)
+    assert next_recapture_at("sf_1", 24, slot) == slot.replace(day=slot.day + 1)
@@ -0,0 +1,126 @@
+"""
+Tiled full-page capture and stitching (page_capture.py) against a fake Playwright page whose
+screenshots paint every pixel row with its own position, so stitched output can be checked row
+by row.
+"""
+import io
+
+import pytest
+from PIL import Image
+
+import page_capture
+from page_capture import HIDE_FIXED_JS, PAGE_HEIGHT_JS, RESTORE_FIXED_JS, capture_full_page, iter_stitched_png, png_size
+
+
+def _png(width: int, rows: list) -> bytes:
+    """An RGB PNG whose pixel row n is (rows[n] % 251, 0, 0) across the whole width."""
+    image = Image.new("RGB", (width, len(rows)))
+    image.putdata([(row % 251, 0, 0) for row in rows for _ in range(width)])
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def _row_values(data: bytes) -> list:
+    with Image.open(io.BytesIO(data)) as image:
+        return [image.getpixel((0, row))[0] for row in range(image.height)]
+
+
+class FakePage:
+    def __init__(self, height, width=20, scale=2, grows_to=None):
+        self.height, self.width, self.scale, self.grows_to = height, width, scale, grows_to
+        self.calls = []
+
+    def evaluate(self, script, arg=None):
+        self.calls.append(script)
+        if script == PAGE_HEIGHT_JS:
+            return self.height
+        if script.startswith("() => document.documentElement.clientWidth"):
+            return self.width
+        if script.startswith("y =>") and arg and self.grows_to: # Scrolled: lazy content loads
+            self.height = self.grows_to
+
+    def wait_for_timeout(self, ms):
+        pass
+
+    def screenshot(self, full_page=False, clip=None):
+        y, height = (clip["y"], clip["height"]) if clip else (0, self.height)
+        self.calls.append(("screenshot", y, height))
+        return _png(self.width * self.scale, list(range(y * self.scale, (y + height) * self.scale)))
+
+
+@pytest.fixture
+def uploads():
+    stored = {}
+    def upload(key, data, content_type):
+        stored[key] = data
+        return f"https://cdn.example.com/{key}"
+    upload.stored = stored
+    return upload
+
+
+def test_short_pages_are_one_screenshot(uploads):
+    page = FakePage(height=3000)
+    assert capture_full_page(page, "mcp_jobs/job_1/screen_1.png", uploads, threshold=3000) == (
+        "https://cdn.example.com/mcp_jobs/job_1/screen_1.png", None)
+    assert png_size(uploads.stored["mcp_jobs/job_1/screen_1.png"]) == (40, 6000)
+
+
+def test_tall_pages_are_captured_in_tiles(uploads):
+    page = FakePage(height=5000)
+    url, manifest = capture_full_page(page, "mcp_jobs/job_1/screen_1.png", uploads, threshold=3000, tile_height=2000)
+    assert url == "https://cdn.example.com/mcp_jobs/job_1/screen_1_tile_01.png"
+    assert [(tile["key"], tile["y"], tile["height"], tile["pixel_height"]) for tile in manifest["tiles"]] == [
+        ("mcp_jobs/job_1/screen_1_tile_01.png", 0, 2000, 4000),
+        ("mcp_jobs/job_1/screen_1_tile_02.png", 2000, 2000, 4000),
+        ("mcp_jobs/job_1/screen_1_tile_03.png", 4000, 1000, 2000), # The last band is what's left
+    ]
+    assert {key: value for key, value in manifest.items() if key != "tiles"} == {
+        "width": 20, "height": 5000, "tile_height": 2000, "pixel_width": 40, "pixel_height": 10000,
+        "truncated": False, "stitched": False, "stitched_key": "mcp_jobs/job_1/screen_1.png",
+    }
+    # Fixed elements are hidden from the second tile on, and everything is put back afterwards
+    shots = [index for index, call in enumerate(page.calls) if isinstance(call, tuple)]
+    assert shots[0] < page.calls.index(HIDE_FIXED_JS) < shots[1]
+    assert page.calls[-2:] == [RESTORE_FIXED_JS, "() => window.scrollTo(0, 0)"]
+
+
+def test_pages_that_grow_while_scrolling_get_more_tiles(uploads):
+    page = FakePage(height=4000, grows_to=7000)
+    _, manifest = capture_full_page(page, "screen.png", uploads, threshold=3000, tile_height=3000)
+    assert [(tile["y"], tile["height"]) for tile in manifest["tiles"]] == [(0, 3000), (3000, 3000), (6000, 1000)]
+    assert manifest["height"] == 7000
+
+
+def test_endless_pages_are_truncated(uploads, monkeypatch):
+    monkeypatch.setattr(page_capture, "CAPTURE_MAX_PAGE_HEIGHT_PX", 4500)
+    page = FakePage(height=4000, grows_to=1_000_000)
+    _, manifest = capture_full_page(page, "screen.png", uploads, threshold=3000, tile_height=2000)
+    assert [(tile["y"], tile["height"]) for tile in manifest["tiles"]] == [(0, 2000), (2000, 2000), (4000, 500)]
+    assert manifest["height"] == 4500 and manifest["truncated"]
+
+
+def test_stitched_tiles_match_a_single_screenshot(uploads):
+    page = FakePage(height=700)
+    _, manifest = capture_full_page(page, "screen.png", uploads, threshold=300, tile_height=300)
+    tiles = (uploads.stored[tile["key"]] for tile in manifest["tiles"])
+    stitched = b"".join(iter_stitched_png(tiles, manifest["pixel_width"], manifest["pixel_height"]))
+    assert png_size(stitched) == (40, 1400)
+    assert _row_values(stitched) == _row_values(page.screenshot(full_page=True))
+
+
+def test_stitching_two_tiles():
+    stitched = b"".join(iter_stitched_png([_png(4, [10, 11, 12]), _png(4, [13, 14])], 4, 5))
+    with Image.open(io.BytesIO(stitched)) as image:
+        assert image.size == (4, 5) and image.mode == "RGB"
+        assert [image.getpixel((x, 3)) for x in range(4)] == [(13, 0, 0)] * 4
+    assert _row_values(stitched) == [10, 11, 12, 13, 14]
+    # The manifest height wins over extra rows in the last tile
+    assert _row_values(b"".join(iter_stitched_png([_png(4, [10, 11, 12]), _png(4, [13, 14])], 4, 4))) == [10, 11, 12, 13]
+
+
+def test_stitching_checks_the_manifest():
+    with pytest.raises(ValueError, match="Tile width 3"):
+        b"".join(iter_stitched_png([_png(4, [1]), _png(3, [2])], 4, 2))
+    with pytest.raises(ValueError, match="Tiles cover 2 rows, manifest says 3"):
+        b"".join(iter_stitched_png([_png(4, [1]), _png(4, [2])], 4, 3))
@@ -0,0 +1,120 @@
+"""
+Soft delete and purge (purge.py) through the delete endpoints: what is hidden and invalidated
+right away, and what the purge task (run inline here) removes afterwards.
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+import purge
+import storage
+from http_cache import DELETED_VERSION, PUBLIC_COLLECTION_CACHE_KEY_PREFIX
+
+
+@pytest.fixture
+def purge_jobs(monkeypatch):
+    """Purge job ids the API queued; run them with run_purges()."""
+    queued = []
+    monkeypatch.setattr(purge, "send_purge_deleted", queued.append)
+    return queued
+
+
+def run_purges(queued):
+    import tasks
+    while queued:
+        tasks.purge_deleted_task(purge_job_id=queued.pop(0))
+
+
+def _seed(db):
+    from models import User, Team, TeamMember, Collection, CollectionSwipeFile, McpJob, SwipeFile, Screen
+    db.add_all([User(id="user_a", email="a@example.com"), User(id="user_b", email="b@example.com"),
+                User(id="user_admin", email="ops@flowvaultadmin.com")])
+    db.flush()
+    db.add_all([
+        Team(id="team_1", name="Design", owner_user_id="user_a"),
+        McpJob(id="job_1", target_url="https://a.example.com", status="completed", submitted_by_user_id="user_a"),
+    ])
+    db.flush()
+    db.add_all([
+        TeamMember(team_id="team_1", user_id="user_a", role="owner"),
+        TeamMember(team_id="team_1", user_id="user_b", role="member"),
+        Collection(id="coll_team", name="Team", team_id="team_1", is_private=False),
+        Collection(id="coll_a", name="Mine", owner_user_id="user_a", is_private=False),
+        Collection(id="coll_b", name="Theirs", owner_user_id="user_b", is_private=False),
+        SwipeFile(id="sf_a", original_url="https://a.example.com", owner_user_id="user_a", mcp_job_id="job_1",
+                  is_tracked=True, next_recapture_at=datetime(2026, 1, 1, tzinfo=timezone.utc)),
+    ])
+    db.flush()
+    db.add_all([
+        CollectionSwipeFile(collection_id="coll_team", swipe_file_id="sf_a"),
+        CollectionSwipeFile(collection_id="coll_b", swipe_file_id="sf_a"),
+        Screen(id="scr_1", swipe_file_id="sf_a", image_url=storage.upload_bytes("mcp_jobs/job_1/screen_1.png", b"png", "image/png"),
+               order_index=0),
+    ])
+    db.commit()
+    return {user_id: db.get(User, user_id) for user_id in ("user_a", "user_b", "user_admin")}
+
+
+def _cached_version(redis_db, collection_id):
+    version = redis_db.hget(f"{PUBLIC_COLLECTION_CACHE_KEY_PREFIX}{collection_id}", "version")
+    return int(version) if version else None
+
+
+def test_delete_team(db, client_as, redis_db, purge_jobs):
+    from models import Collection, PurgeJob, Team, TeamMember
+    users = _seed(db)
+    assert client_as(users["user_b"]).get("/api/v1/collections/coll_team").status_code == 200 # Cached: public
+    assert client_as(users["user_b"]).delete("/api/v1/teams/team_1").status_code == 403
+
+    client = client_as(users["user_a"])
+    assert client.delete("/api/v1/teams/team_1").status_code == 204
+    db.expire_all()
+    assert db.get(Team, "team_1").version == 2 and db.get(Collection, "coll_team").version == 2
+    assert _cached_version(redis_db, "coll_team") == DELETED_VERSION
+    assert redis_db.hget(f"{PUBLIC_COLLECTION_CACHE_KEY_PREFIX}coll_team", "body") is None
+    assert client.get("/api/v1/teams/team_1").status_code == 404
+    assert client_as(users["user_b"]).get("/api/v1/collections/coll_team").status_code == 404
+
+    run_purges(purge_jobs)
+    db.expire_all()
+    assert db.get(Team, "team_1") is None and db.get(Collection, "coll_team") is None
+    assert db.query(TeamMember).count() == 0
+    assert db.query(PurgeJob).one().status == "completed"
+
+
+def test_delete_collection(db, client_as, redis_db, purge_jobs):
+    from models import Collection
+    users = _seed(db)
+    client = client_as(users["user_b"])
+    assert client.get("/api/v1/collections/coll_b").status_code == 200
+    assert client.delete("/api/v1/collections/coll_b").status_code == 204
+    assert _cached_version(redis_db, "coll_b") == DELETED_VERSION
+    assert client.get("/api/v1/collections/coll_b").status_code == 404
+
+    run_purges(purge_jobs)
+    db.expire_all()
+    assert db.get(Collection, "coll_b") is None and db.get(Collection, "coll_a") is not None
+
+
+def test_admin_delete_user(db, client_as, redis_db, purge_jobs):
+    from models import Collection, McpJob, Screen, SwipeFile, Team, User
+    users = _seed(db)
+    assert client_as(users["user_b"]).get("/api/v1/collections/coll_b").status_code == 200
+
+    response = client_as(users["user_admin"]).delete("/api/v1/admin/users/user_a")
+    assert response.status_code == 202 and response.json()["status"] == "pending"
+    db.expire_all()
+    assert db.get(Collection, "coll_a").version == 2 and db.get(Team, "team_1").version == 2
+    swipe_file = db.get(SwipeFile, "sf_a")
+    assert (swipe_file.is_tracked, swipe_file.next_recapture_at, swipe_file.version) == (False, None, 2)
+    assert _cached_version(redis_db, "coll_a") == _cached_version(redis_db, "coll_team") == DELETED_VERSION
+    assert client_as(users["user_admin"]).delete("/api/v1/admin/users/user_a").status_code == 404
+
+    run_purges(purge_jobs)
+    db.expire_all()
+    assert db.get(User, "user_a") is None and db.get(SwipeFile, "sf_a") is None and db.get(Screen, "scr_1") is None
+    assert db.get(McpJob, "job_1") is None and db.get(Team, "team_1") is None
+    assert not storage.object_exists("mcp_jobs/job_1/screen_1.png")
+    # user_b's collection lost sf_a: new version, cached copy dropped
+    assert db.get(Collection, "coll_b").version == 2 and _cached_version(redis_db, "coll_b") == 2
+    assert redis_db.hget(f"{PUBLIC_COLLECTION_CACHE_KEY_PREFIX}coll_b", "body") is None
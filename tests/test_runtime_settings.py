@@ -0,0 +1,118 @@
+"""
+Runtime settings (runtime_settings.py) and the admin endpoints that change them, through the app:
+maintenance mode turns every non-exempt request into a 503 until an admin switches it off.
+"""
+from types import SimpleNamespace
+
+import pytest
+import redis
+
+import runtime_settings as runtime_settings_module
+from runtime_settings import DEFAULT_SETTINGS, runtime_settings
+
+
+@pytest.fixture
+def settings(redis_db):
+    # The process-wide copy outlives each test's Redis and tables: start every test from the defaults
+    runtime_settings._values, runtime_settings._version = dict(DEFAULT_SETTINGS), 0
+    yield runtime_settings
+    runtime_settings._values, runtime_settings._version = dict(DEFAULT_SETTINGS), 0
+
+
+def _seed(db):
+    from models import User
+    db.add_all([User(id="user_admin", email="ops@flowvaultadmin.com"), User(id="user_a", email="a@example.com")])
+    db.commit()
+    return db.get(User, "user_admin"), db.get(User, "user_a")
+
+
+def test_maintenance_mode(db, client_as, settings):
+    from models import RuntimeSetting
+    admin, user = _seed(db)
+    client = client_as(user)
+    assert client.get("/api/v1/collections/").status_code == 200
+
+    client = client_as(admin)
+    response = client.post("/api/v1/admin/settings/maintenance", params={"enable": True, "message": "Back soon"})
+    assert response.status_code == 200, response.text
+    assert response.json()["settings"]["maintenance_mode"] is True and response.json()["version"] == 1
+    assert db.get(RuntimeSetting, "maintenance_mode").updated_by == "user_admin"
+
+    client = client_as(user)
+    response = client.get("/api/v1/collections/")
+    assert response.status_code == 503 and response.headers["Retry-After"]
+    assert response.json() == {"detail": "Back soon", "maintenance_mode": True}
+    assert client.get("/api/v1/health").status_code == 200
+
+    client = client_as(admin) # Admin stays reachable to switch it back off
+    assert client.get("/api/v1/admin/settings").json()["settings"]["maintenance_mode"] is True
+    assert client.post("/api/v1/admin/settings/maintenance", params={"enable": False}).status_code == 200
+    assert client_as(user).get("/api/v1/collections/").status_code == 200
+
+
+def test_update_settings(db, client_as, settings, redis_db):
+    admin, user = _seed(db)
+    client = client_as(admin)
+    response = client.put("/api/v1/admin/settings", json={"settings": {"feature_flags": {"search": True}}})
+    assert response.status_code == 200 and response.json()["settings"]["feature_flags"] == {"search": True}
+    assert settings.flag("search")
+    assert client.put("/api/v1/admin/settings", json={"settings": {"maintenance_mode": "yes"}}).status_code == 422
+    assert client.put("/api/v1/admin/settings", json={"settings": {"unknown": 1}}).status_code == 422
+    assert client_as(user).get("/api/v1/admin/settings").status_code == 403
+
+    # Redis lost its copy: rebuilt from Postgres
+    redis_db.delete("flowvault:settings")
+    settings._values = dict(DEFAULT_SETTINGS)
+    settings.reload()
+    assert settings.flag("search") and redis_db.hget("flowvault:settings", "feature_flags") == b'{"search": true}'
+
+
+def test_reload_keeps_current_values_when_postgres_fails(settings, monkeypatch):
+    def unreachable():
+        raise RuntimeError("could not connect to server")
+    monkeypatch.setattr(runtime_settings_module, "_load_from_db", unreachable)
+    settings._values = {**DEFAULT_SETTINGS, "maintenance_mode": True}
+
+    settings.reload() # Redis copy missing (flushed): needs Postgres
+    assert settings.get("maintenance_mode") is True
+
+    def redis_down():
+        raise redis.ConnectionError("Connection refused")
+    monkeypatch.setattr(runtime_settings_module, "get_redis", redis_down)
+    settings.reload()
+    assert settings.get("maintenance_mode") is True
+
+
+def test_first_read_in_a_process_does_not_block(settings, monkeypatch):
+    import threading
+    loaded = threading.Event()
+    release = threading.Event()
+    def slow_listener():
+        release.wait(5)
+        settings._values = {**DEFAULT_SETTINGS, "maintenance_mode": True}
+        loaded.set()
+    monkeypatch.setattr(settings, "_listen", slow_listener)
+    monkeypatch.setattr(settings, "_pid", -1) # As seen from a freshly forked process
+
+    assert settings.get("maintenance_mode") is False # The defaults, at once
+    release.set()
+    assert loaded.wait(5) and settings.get("maintenance_mode") is True
+
+
+def test_quotas_are_unlimited_until_set(db, client_as, settings, monkeypatch):
+    import main
+    from models import McpJob
+    admin, user = _seed(db)
+    monkeypatch.setattr(main, "send_generate_screenshots", lambda **kwargs: SimpleNamespace(id="task_1"))
+    assert settings.quota("free", "captures_per_day") is None and settings.quota("pro", "captures_per_day") is None
+    client = client_as(user)
+    for _ in range(3):
+        assert client.post("/api/v1/generate-swipe", json={"url": "https://a.example.com"}).status_code == 202
+
+    quotas = {"free": {"captures_per_day": 4}, "pro": {"captures_per_day": None}}
+    assert client_as(admin).put("/api/v1/admin/settings", json={"settings": {"tier_quotas": quotas}}).status_code == 200
+    client = client_as(user)
+    assert client.post("/api/v1/generate-swipe", json={"url": "https://a.example.com"}).status_code == 202
+    response = client.post("/api/v1/generate-swipe", json={"url": "https://a.example.com"})
+    assert response.status_code == 429 and "4 per 24 hours" in response.json()["detail"]
+    assert db.query(McpJob).count() == 4
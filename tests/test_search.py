@@ -0,0 +1,92 @@
+"""
+Search (routers/search_router.py): the query text, and with TEST_DATABASE_URL set, the query
+itself against the migrated schema (full-text and trigram indexes, visibility scoping).
+"""
+from routers import search_router
+from routers.search_router import SEARCH_SQL, BEST_SCREENS_SQL, _escape_like, search_swipe_files
+
+
+def test_router_is_mounted():
+    import main
+    assert "/api/v1/search" in {route.path for route in main.app.routes}
+    assert search_router.router.prefix == "/api/v1/search"
+
+
+def test_search_sql():
+    sql = " ".join(SEARCH_SQL.text.split())
+    assert set(SEARCH_SQL._bindparams) == {"q", "like", "user_id", "limit", "offset"}
+    assert "websearch_to_tsquery('english', :q)" in sql # Never to_tsquery: user input isn't tsquery syntax
+    assert "sf.owner_user_id = :user_id" in sql
+    assert "WHERE tm.user_id = :user_id AND t.deleted_at IS NULL" in sql
+    assert "WHERE c.deleted_at IS NULL AND owner.deleted_at IS NULL" in sql
+    # Both ranking CTEs are restricted to the visible set, not just the final join
+    assert sql.count("IN (SELECT id FROM visible)") == 2
+    assert "sf.title % :q" in sql and "sf.original_url ILIKE :like" in sql
+    assert sql.endswith("LIMIT :limit OFFSET :offset")
+
+
+def test_best_screens_sql():
+    sql = " ".join(BEST_SCREENS_SQL.text.split())
+    assert BEST_SCREENS_SQL._bindparams["ids"].expanding
+    assert "SELECT DISTINCT ON (s.swipe_file_id)" in sql and "ts_headline('english'" in sql
+
+
+def test_escape_like():
+    assert _escape_like("50%_off\\") == "50\\%\\_off\\\\"
+    assert _escape_like("pricing") == "pricing"
+
+
+def _seed(db):
+    from models import User, Team, TeamMember, Collection, CollectionSwipeFile, SwipeFile, Screen
+    db.add_all([
+        User(id="user_a", email="a@example.com"),
+        User(id="user_b", email="b@example.com"),
+        Team(id="team_b", name="B", owner_user_id="user_b"),
+    ])
+    db.flush()
+    db.add_all([
+        TeamMember(team_id="team_b", user_id="user_a", role="member"),
+        Collection(id="coll_b", name="Shared", team_id="team_b"),
+        SwipeFile(id="sf_own", title="Pricing page", original_url="https://a.example.com/pricing", owner_user_id="user_a"),
+        SwipeFile(id="sf_team", title="Onboarding", original_url="https://b.example.com/start", owner_user_id="user_b"),
+        SwipeFile(id="sf_private", title="Pricing table", original_url="https://b.example.com/pricing", owner_user_id="user_b"),
+    ])
+    db.flush()
+    db.add_all([
+        CollectionSwipeFile(collection_id="coll_b", swipe_file_id="sf_team"),
+        Screen(id="scr_team", swipe_file_id="sf_team", image_url="https://cdn.example.com/1.png", order_index=0,
+               page_title="Welcome", page_text="Choose a pricing plan to finish onboarding"),
+    ])
+    db.commit()
+    return db.get(User, "user_a")
+
+
+def test_search_is_scoped_to_visible_swipe_files(db):
+    user = _seed(db)
+    response = search_swipe_files(q="pricing", limit=20, offset=0, current_user=user, db=db)
+    hits = {hit["swipe_file_id"]: hit for hit in response["results"]}
+    assert set(hits) == {"sf_own", "sf_team"} # sf_private belongs to user_b and isn't shared
+    assert response["total"] == 2
+    assert hits["sf_team"]["screen_id"] == "scr_team" and "<mark>pricing</mark>" in hits["sf_team"]["snippet"]
+    assert hits["sf_own"]["screen_id"] is None # Matched on the title, not page content
+
+
+def test_search_matches_typos_and_url_fragments(db):
+    user = _seed(db)
+    assert [hit["swipe_file_id"] for hit in search_swipe_files(q="Pricng page", limit=20, offset=0, current_user=user, db=db)["results"]] == ["sf_own"]
+    assert [hit["swipe_file_id"] for hit in search_swipe_files(q="a.example.com", limit=20, offset=0, current_user=user, db=db)["results"]] == ["sf_own"]
+
+
+def test_search_hides_soft_deleted_sharing(db):
+    from datetime import datetime, timezone
+    from models import Collection, Team, User
+    user = _seed(db)
+    search = lambda: {hit["swipe_file_id"] for hit in search_swipe_files(q="pricing", limit=20, offset=0, current_user=user, db=db)["results"]}
+    for model, entity_id in ((Collection, "coll_b"), (Team, "team_b"), (User, "user_b")):
+        entity = db.get(model, entity_id)
+        entity.deleted_at = datetime.now(timezone.utc)
+        db.commit()
+        assert search() == {"sf_own"}, model.__name__
+        entity.deleted_at = None
+        db.commit()
+        assert search() == {"sf_own", "sf_team"}
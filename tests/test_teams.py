@@ -0,0 +1,84 @@
+"""
+Teams (routers/teams_router.py) through the app: membership management and the team version
+that covers both the team and its member list (ETags).
+"""
+
+
+def _users(db):
+    from models import User
+    db.add_all([User(id=f"user_{name}", email=f"{name}@example.com") for name in ("owner", "second", "third", "outsider")])
+    db.commit()
+    return {name: db.get(User, f"user_{name}") for name in ("owner", "second", "third", "outsider")}
+
+
+def test_membership_moves_the_team_version(db, client_as):
+    users = _users(db)
+    owner = client_as(users["owner"])
+    team = owner.post("/api/v1/teams/", json={"name": "Design"}).json()
+    url = f"/api/v1/teams/{team['team_id']}"
+
+    response = owner.get(f"{url}/members")
+    assert response.json() == [{"user_id": "user_owner", "role": "owner"}]
+    etag = response.headers["ETag"]
+    assert owner.get(f"{url}/members", headers={"If-None-Match": etag}).status_code == 304
+
+    assert owner.post(f"{url}/members", json={"user_id": "user_second", "role": "member"}).status_code == 201
+    assert owner.post(f"{url}/members", json={"user_id": "user_second", "role": "member"}).status_code == 400
+    assert owner.post(f"{url}/members", json={"user_id": "user_third", "role": "owner"}).status_code == 400
+    assert owner.post(f"{url}/members", json={"user_id": "user_missing", "role": "member"}).status_code == 404
+    response = owner.get(f"{url}/members", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and len(response.json()) == 2
+    assert response.headers["ETag"] == f'W/"team-members-{team["team_id"]}-2"'
+    assert owner.get(url).headers["ETag"] == f'W/"team-{team["team_id"]}-2"'
+
+
+def test_roles_and_ownership(db, client_as):
+    users = _users(db)
+    owner = client_as(users["owner"])
+    team_id = owner.post("/api/v1/teams/", json={"name": "Design"}).json()["team_id"]
+    url = f"/api/v1/teams/{team_id}"
+    owner.post(f"{url}/members", json={"user_id": "user_second", "role": "member"})
+
+    assert client_as(users["outsider"]).get(url).status_code == 404
+    second = client_as(users["second"])
+    assert second.get(url).status_code == 200
+    assert second.put(url, json={"name": "Mine"}).status_code == 403
+    assert second.post(f"{url}/members", json={"user_id": "user_third", "role": "member"}).status_code == 403
+
+    owner = client_as(users["owner"])
+    assert owner.put(f"{url}/members/user_second", json={"role": "admin"}).json() == {"user_id": "user_second", "role": "admin"}
+    assert owner.put(f"{url}/members/user_owner", json={"role": "member"}).status_code == 400
+    second = client_as(users["second"])
+    assert second.post(f"{url}/members", json={"user_id": "user_third", "role": "member"}).status_code == 201
+    assert second.put(url, json={"owner_user_id": "user_second"}).status_code == 403 # Only the owner transfers
+    assert second.delete(f"{url}/members/user_owner").status_code == 400
+
+    owner = client_as(users["owner"])
+    response = owner.put(url, json={"owner_user_id": "user_second", "name": "Design team"})
+    assert response.json() == {"team_id": team_id, "name": "Design team", "owner_user_id": "user_second"}
+    roles = {member["user_id"]: member["role"] for member in owner.get(f"{url}/members").json()}
+    assert roles == {"user_owner": "admin", "user_second": "owner", "user_third": "member"}
+
+    third = client_as(users["third"])
+    assert third.delete(f"{url}/members/user_owner").status_code == 403
+    assert third.delete(f"{url}/members/user_third").status_code == 204 # Leaving
+    assert third.get(url).status_code == 404
+    assert [team["team_id"] for team in client_as(users["owner"]).get("/api/v1/teams/").json()] == [team_id]
+
+
+def test_team_deleted_after_its_version_was_read(db, client_as, monkeypatch):
+    from datetime import datetime, timezone
+    from models import Team
+    from routers import teams_router
+    users = _users(db)
+    owner = client_as(users["owner"])
+    team_id = owner.post("/api/v1/teams/", json={"name": "Design"}).json()["team_id"]
+
+    read_version = teams_router._team_version
+    def deleted_concurrently(session, team_id, user_id):
+        version = read_version(session, team_id, user_id)
+        db.get(Team, team_id).deleted_at = datetime.now(timezone.utc)
+        db.commit()
+        return version
+    monkeypatch.setattr(teams_router, "_team_version", deleted_concurrently)
+    assert owner.get(f"/api/v1/teams/{team_id}").status_code == 404
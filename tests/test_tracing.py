@@ -0,0 +1,96 @@
+"""
+Tracing (tracing.py): the API's server span, its context carried in Celery message headers, and
+the worker's queue-wait and run spans continuing the same trace.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind, StatusCode
+
+import tracing
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+TRACE_ID = 0x0af7651916cd43dd8448eb211c80319c
+
+
+@pytest.fixture(scope="module")
+def exporter():
+    # The global provider can only be installed once per process; tracing.tracer proxies to it
+    exporter = InMemorySpanExporter()
+    trace.set_tracer_provider(TracerProvider())
+    provider = trace.get_tracer_provider()
+    if not isinstance(provider, TracerProvider):
+        pytest.skip("A non-SDK tracer provider is installed")
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return exporter
+
+
+@pytest.fixture
+def spans(exporter):
+    exporter.clear()
+    yield exporter.get_finished_spans
+    exporter.clear()
+
+
+def test_server_span_continues_the_incoming_trace(spans):
+    app = FastAPI()
+    app.middleware("http")(tracing.tracing_middleware)
+
+    @app.get("/jobs/{job_id}")
+    def get_job(job_id: str):
+        return {"job_id": job_id}
+
+    with TestClient(app) as client:
+        assert client.get("/jobs/job_1", headers={"traceparent": TRACEPARENT}).status_code == 200
+    span = next(span for span in spans() if span.kind == SpanKind.SERVER)
+    assert span.name == "GET /jobs/{job_id}" # The route template, not the job id
+    assert span.context.trace_id == TRACE_ID and span.parent.span_id == 0xb7ad6b7169203331
+    assert span.attributes["http.status_code"] == 200
+
+
+def test_publish_carries_the_trace_to_the_task(spans):
+    headers = {}
+    with tracing.tracer.start_as_current_span("POST /api/v1/swipe") as api_span:
+        tracing._inject_trace_headers(headers=headers)
+    assert headers["traceparent"].split("-")[1] == format(api_span.get_span_context().trace_id, "032x")
+    assert tracing.ENQUEUED_AT_HEADER in headers
+
+    # Protocol 2 merges custom headers into the request itself
+    task = SimpleNamespace(name="tasks.capture", request=SimpleNamespace(retries=1, **headers))
+    tracing._start_task_span(task_id="task_1", task=task)
+    assert trace.get_current_span().get_span_context().trace_id == api_span.get_span_context().trace_id
+    tracing._end_task_span(task_id="task_1", state="FAILURE")
+
+    wait, run = [span for span in spans() if span.name.startswith("celery.")]
+    assert wait.name == "celery.queue_wait" and run.name == "celery.run tasks.capture"
+    assert wait.start_time <= run.start_time
+    assert {wait.parent.span_id, run.parent.span_id} == {api_span.get_span_context().span_id}
+    assert run.attributes["celery.retries"] == 1 and run.status.status_code == StatusCode.ERROR
+    assert trace.get_current_span() is trace.INVALID_SPAN # The task's context was detached
+    assert "task_1" not in tracing._active_task_spans
+
+
+def test_task_headers_in_request_headers(spans):
+    task = SimpleNamespace(name="tasks.capture", request=SimpleNamespace(retries=0, headers={"traceparent": TRACEPARENT}))
+    tracing._start_task_span(task_id="task_2", task=task)
+    tracing._end_task_span(task_id="task_2", state="SUCCESS")
+    (run,) = spans()
+    assert run.context.trace_id == TRACE_ID and run.status.status_code == StatusCode.UNSET
+
+
+def test_json_lines_exporter(spans, tmp_path):
+    with tracing.tracer.start_as_current_span("export me"):
+        pass
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.JsonLinesFileExporter(str(path))
+    exporter.export(spans())
+    exporter.export(spans())
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2 and json.loads(lines[0])["name"] == "export me"
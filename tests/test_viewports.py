@@ -0,0 +1,38 @@
+"""
+Capture breakpoints (viewports.py): how requested viewports are validated and ordered, and what
+a screen records about the breakpoint it was shot at.
+"""
+import pytest
+from pydantic import ValidationError
+
+from viewports import DEFAULT_VIEWPORTS, normalize_viewports, viewport_metadata
+
+
+@pytest.mark.parametrize("requested, expected", [
+    (None, DEFAULT_VIEWPORTS),
+    ([], DEFAULT_VIEWPORTS),
+    (["mobile"], ["mobile"]),
+    (["mobile", "desktop", "tablet"], ["desktop", "tablet", "mobile"]), # Widest first
+    (["mobile", "mobile", "desktop"], ["desktop", "mobile"]),
+    ((name for name in ("tablet", "desktop")), ["desktop", "tablet"]),
+    ({"mobile": "screen", "desktop": "screen"}, ["desktop", "mobile"]), # A step's screens by viewport
+])
+def test_normalize_viewports(requested, expected):
+    assert normalize_viewports(requested) == expected
+
+
+def test_unknown_viewports_are_rejected():
+    with pytest.raises(ValueError, match="Unknown viewport\\(s\\): phone, watch. Choose from desktop, tablet, mobile."):
+        normalize_viewports(["desktop", "watch", "phone"])
+
+
+def test_capture_requests_are_validated():
+    from main import ScreenshotRequest
+    assert ScreenshotRequest(url="https://a.example.com", viewports=["mobile", "desktop"]).viewports == ["desktop", "mobile"]
+    assert ScreenshotRequest(url="https://a.example.com").viewports is None # The worker applies the default
+    with pytest.raises(ValidationError):
+        ScreenshotRequest(url="https://a.example.com", viewports=["phone"])
+
+
+def test_viewport_metadata():
+    assert viewport_metadata("mobile") == {"name": "mobile", "width": 390, "height": 844, "device_scale_factor": 2, "is_mobile": True}
@@ -0,0 +1,170 @@
+"""
+Distributed tracing for FlowVault (API request -> Celery enqueue -> capture task).
+
+Spans are exported to a local OTLP collector when OTEL_EXPORTER_OTLP_ENDPOINT is set,
+otherwise they are appended as JSON lines to TRACE_EXPORT_FILE so tracing works offline.
+Sampling is parent-based with a configurable ratio, so a trace is either kept end to end
+(API and worker) or dropped end to end.
+"""
+import os
+import time
+import logging
+from opentelemetry import trace, propagate, context as otel_context
+from opentelemetry.propagators.textmap import Getter
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from celery import signals
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "true").lower() == "true"
+TRACE_SAMPLE_RATIO = float(os.environ.get("TRACE_SAMPLE_RATIO", "0.05")) # Keep ~5% of traces at production rates
+OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT") # e.g., http://localhost:4318 for a local collector
+TRACE_EXPORT_FILE = os.environ.get("TRACE_EXPORT_FILE", "/tmp/flowvault_traces.jsonl")
+
+# Message header used to measure how long a task sat in the broker queue
+ENQUEUED_AT_HEADER = "flowvault_enqueued_at"
+
+# ProxyTracer: safe to use before setup_tracing() runs (spans are no-ops until then)
+tracer = trace.get_tracer("flowvault")
+
+_configured = False
+_active_task_spans = {} # celery task id -> (span, context token)
+
+
+class JsonLinesFileExporter(SpanExporter):
+    """Appends finished spans to a local file, one JSON document per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans):
+        try:
+            with open(self.path, "a") as f:
+                for span in spans:
+                    f.write(span.to_json(indent=None) + "\n")
+        except OSError as e:
+            logger.error(f"Failed to write spans to {self.path}: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def setup_tracing(service_name: str):
+    """Install the global tracer provider. Call once per process (after fork for Celery workers)."""
+    global _configured
+    if _configured or not TRACING_ENABLED:
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO)),
+    )
+    if OTLP_ENDPOINT:
+        # Imported lazily so the file exporter path has no extra dependencies at runtime
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter(endpoint=f"{OTLP_ENDPOINT.rstrip('/')}/v1/traces")
+    else:
+        exporter = JsonLinesFileExporter(TRACE_EXPORT_FILE)
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _configured = True
+    logger.info(f"Tracing enabled for {service_name} (sample ratio {TRACE_SAMPLE_RATIO}, exporter {type(exporter).__name__}).")
+
+
+# --- FastAPI --- #
+
+async def tracing_middleware(request, call_next):
+    """HTTP middleware creating a server span per request, continuing any incoming trace context."""
+    parent_ctx = propagate.extract(request.headers)
+    with tracer.start_as_current_span(
+        f"{request.method} {request.url.path}", context=parent_ctx, kind=SpanKind.SERVER
+    ) as span:
+        span.set_attribute("http.method", request.method)
+        span.set_attribute("http.target", request.url.path)
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            # Use the route template so spans group by endpoint rather than by job ID
+            span.update_name(f"{request.method} {route.path}")
+            span.set_attribute("http.route", route.path)
+        span.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            span.set_status(Status(StatusCode.ERROR))
+        return response
+
+
+# --- Celery --- #
+
+class _CeleryRequestGetter(Getter):
+    """Reads propagated headers from a Celery task request (protocol 2 merges custom headers into it)."""
+
+    def get(self, carrier, key):
+        value = getattr(carrier, key, None)
+        if value is None:
+            value = (getattr(carrier, "headers", None) or {}).get(key)
+        if value is None:
+            return None
+        return [value] if isinstance(value, str) else list(value)
+
+    def keys(self, carrier):
+        return list((getattr(carrier, "headers", None) or {}).keys())
+
+
+_celery_getter = _CeleryRequestGetter()
+
+
+@signals.before_task_publish.connect
+def _inject_trace_headers(headers=None, **kwargs):
+    """Carry the current trace context (and the enqueue time) in the Celery message headers."""
+    if headers is None:
+        return
+    propagate.inject(headers)
+    headers[ENQUEUED_AT_HEADER] = time.time()
+
+
+@signals.task_prerun.connect
+def _start_task_span(task_id=None, task=None, **kwargs):
+    parent_ctx = propagate.extract(task.request, getter=_celery_getter)
+
+    enqueued_at = getattr(task.request, ENQUEUED_AT_HEADER, None)
+    if enqueued_at is None:
+        enqueued_at = (getattr(task.request, "headers", None) or {}).get(ENQUEUED_AT_HEADER)
+    if enqueued_at is not None:
+        # Retroactive span covering the time the message spent in the broker
+        wait_span = tracer.start_span(
+            "celery.queue_wait", context=parent_ctx, kind=SpanKind.CONSUMER, start_time=int(float(enqueued_at) * 1e9)
+        )
+        wait_span.set_attribute("celery.task_name", task.name)
+        wait_span.end()
+
+    span = tracer.start_span(f"celery.run {task.name}", context=parent_ctx, kind=SpanKind.CONSUMER)
+    span.set_attribute("celery.task_id", task_id)
+    span.set_attribute("celery.task_name", task.name)
+    span.set_attribute("celery.retries", task.request.retries or 0)
+    token = otel_context.attach(trace.set_span_in_context(span, parent_ctx))
+    _active_task_spans[task_id] = (span, token)
+
+
+@signals.task_postrun.connect
+def _end_task_span(task_id=None, state=None, **kwargs):
+    span, token = _active_task_spans.pop(task_id, (None, None))
+    if span is None:
+        return
+    if state:
+        span.set_attribute("celery.state", state)
+        if state == "FAILURE":
+            span.set_status(Status(StatusCode.ERROR))
+    span.end()
+    otel_context.detach(token)
+
+
+@signals.worker_process_init.connect
+def _setup_worker_tracing(**kwargs):
+    # BatchSpanProcessor starts a thread, so it must be created in each forked pool process
+    setup_tracing("flowvault-worker")
@@ -0,0 +1,40 @@
+"""
+Capture breakpoints shared by the API (request validation) and the capture workers.
+
+Each flow step is navigated once at desktop size; other breakpoints are shot from the same
+loaded page by re-emulating the device in place (viewport, DPR, mobile/touch). Only sites that
+serve different markup by User-Agent get a separate device context with its own navigation.
+"""
+from typing import Iterable, List, Optional
+
+# Ordered widest first: the step is loaded at the first (desktop) size and narrowed from there
+VIEWPORT_PRESETS = {
+    "desktop": {"width": 1440, "height": 900, "device_scale_factor": 1, "is_mobile": False, "has_touch": False, "user_agent": None},
+    "tablet": {
+        "width": 834, "height": 1194, "device_scale_factor": 2, "is_mobile": True, "has_touch": True,
+        "user_agent": "Mozilla/5.0 (iPad; CPU OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1",
+    },
+    "mobile": {
+        "width": 390, "height": 844, "device_scale_factor": 2, "is_mobile": True, "has_touch": True,
+        "user_agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1",
+    },
+}
+DEFAULT_VIEWPORTS = ["desktop"]
+PRIMARY_VIEWPORT = "desktop" # Keeps the original screen ids and object keys
+
+
+def normalize_viewports(viewports: Optional[Iterable[str]]) -> List[str]:
+    """Dedupes and orders requested breakpoints (widest first); raises ValueError on unknown names."""
+    requested = set(viewports or ()) # Read once: `viewports` may be a generator
+    if not requested:
+        return list(DEFAULT_VIEWPORTS)
+    unknown = requested - set(VIEWPORT_PRESETS)
+    if unknown:
+        raise ValueError(f"Unknown viewport(s): {', '.join(sorted(unknown))}. Choose from {', '.join(VIEWPORT_PRESETS)}.")
+    return [name for name in VIEWPORT_PRESETS if name in requested]
+
+
+def viewport_metadata(name: str) -> dict:
+    """What a Screen records about the breakpoint it was captured at (stored under metadata["viewport"])."""
+    preset = VIEWPORT_PRESETS[name]
+    return {"name": name, **{key: preset[key] for key in ("width", "height", "device_scale_factor", "is_mobile")}}